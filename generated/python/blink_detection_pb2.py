@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x15\x62link_detection.proto\x12\x0f\x62link_detection\"b\n\x0c\x42linkRequest\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12\x10\n\x08track_id\x18\x02 \x01(\t\x12,\n\tlandmarks\x18\x03 \x03(\x0b\x32\x19.blink_detection.Landmark\":\n\x08Landmark\x12\r\n\x05index\x18\x01 \x01(\x05\x12\t\n\x01x\x18\x02 \x01(\x02\x12\t\n\x01y\x18\x03 \x01(\x02\x12\t\n\x01z\x18\x04 \x01(\x02\"\x8a\x01\n\rBlinkResponse\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12)\n\x05\x62link\x18\x02 \x01(\x0b\x32\x1a.blink_detection.BlinkInfo\x12\x1a\n\x12processing_time_ms\x18\x03 \x01(\x02\x12\x0f\n\x07success\x18\x04 \x01(\x08\x12\r\n\x05\x65rror\x18\x05 \x01(\t\"\xa3\x01\n\tBlinkInfo\x12\x10\n\x08left_ear\x18\x01 \x01(\x02\x12\x11\n\tright_ear\x18\x02 \x01(\x02\x12\x0f\n\x07\x61vg_ear\x18\x03 \x01(\x02\x12\x0f\n\x07perclos\x18\x04 \x01(\x02\x12\x13\n\x0bis_blinking\x18\x05 \x01(\x08\x12\x11\n\tis_drowsy\x18\x06 \x01(\x08\x12\x13\n\x0b\x62link_count\x18\x07 \x01(\x05\x12\x12\n\nblink_rate\x18\x08 \x01(\x02\" \n\x0cResetRequest\x12\x10\n\x08track_id\x18\x01 \x01(\t\" \n\rResetResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"\x0f\n\rHealthRequest\"2\n\x0eHealthResponse\x12\x0f\n\x07healthy\x18\x01 \x01(\x08\x12\x0f\n\x07version\x18\x02 \x01(\t2\xd2\x02\n\x15\x42linkDetectionService\x12M\n\x0c\x41nalyzeBlink\x12\x1d.blink_detection.BlinkRequest\x1a\x1e.blink_detection.BlinkResponse\x12R\n\rStreamAnalyze\x12\x1d.blink_detection.BlinkRequest\x1a\x1e.blink_detection.BlinkResponse(\x01\x30\x01\x12K\n\nResetTrack\x12\x1d.blink_detection.ResetRequest\x1a\x1e.blink_detection.ResetResponse\x12I\n\x06Health\x12\x1e.blink_detection.HealthRequest\x1a\x1f.blink_detection.HealthResponseBFZDgithub.com/attention-detection/api-gateway/pkg/proto/blink_detectionb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x15\x62link_detection.proto\x12\x0f\x62link_detection\"v\n\x0c\x42linkRequest\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12\x10\n\x08track_id\x18\x02 \x01(\t\x12,\n\tlandmarks\x18\x03 \x03(\x0b\x32\x19.blink_detection.Landmark\x12\x12\n\nmeeting_id\x18\x04 \x01(\t\":\n\x08Landmark\x12\r\n\x05index\x18\x01 \x01(\x05\x12\t\n\x01x\x18\x02 \x01(\x02\x12\t\n\x01y\x18\x03 \x01(\x02\x12\t\n\x01z\x18\x04 \x01(\x02\"\x8a\x01\n\rBlinkResponse\x12\x12\n\nrequest_id\x18\x01 \x01(\t\x12)\n\x05\x62link\x18\x02 \x01(\x0b\x32\x1a.blink_detection.BlinkInfo\x12\x1a\n\x12processing_time_ms\x18\x03 \x01(\x02\x12\x0f\n\x07success\x18\x04 \x01(\x08\x12\r\n\x05\x65rror\x18\x05 \x01(\t\"\xa3\x01\n\tBlinkInfo\x12\x10\n\x08left_ear\x18\x01 \x01(\x02\x12\x11\n\tright_ear\x18\x02 \x01(\x02\x12\x0f\n\x07\x61vg_ear\x18\x03 \x01(\x02\x12\x0f\n\x07perclos\x18\x04 \x01(\x02\x12\x13\n\x0bis_blinking\x18\x05 \x01(\x08\x12\x11\n\tis_drowsy\x18\x06 \x01(\x08\x12\x13\n\x0b\x62link_count\x18\x07 \x01(\x05\x12\x12\n\nblink_rate\x18\x08 \x01(\x02\"4\n\x0cResetRequest\x12\x10\n\x08track_id\x18\x01 \x01(\t\x12\x12\n\nmeeting_id\x18\x02 \x01(\t\" \n\rResetResponse\x12\x0f\n\x07success\x18\x01 \x01(\x08\"\x0f\n\rHealthRequest\"2\n\x0eHealthResponse\x12\x0f\n\x07healthy\x18\x01 \x01(\x08\x12\x0f\n\x07version\x18\x02 \x01(\t2\xd2\x02\n\x15\x42linkDetectionService\x12M\n\x0c\x41nalyzeBlink\x12\x1d.blink_detection.BlinkRequest\x1a\x1e.blink_detection.BlinkResponse\x12R\n\rStreamAnalyze\x12\x1d.blink_detection.BlinkRequest\x1a\x1e.blink_detection.BlinkResponse(\x01\x30\x01\x12K\n\nResetTrack\x12\x1d.blink_detection.ResetRequest\x1a\x1e.blink_detection.ResetResponse\x12I\n\x06Health\x12\x1e.blink_detection.HealthRequest\x1a\x1f.blink_detection.HealthResponseBFZDgithub.com/attention-detection/api-gateway/pkg/proto/blink_detectionb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -33,21 +33,21 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['DESCRIPTOR']._loaded_options = None
   _globals['DESCRIPTOR']._serialized_options = b'ZDgithub.com/attention-detection/api-gateway/pkg/proto/blink_detection'
   _globals['_BLINKREQUEST']._serialized_start=42
-  _globals['_BLINKREQUEST']._serialized_end=140
-  _globals['_LANDMARK']._serialized_start=142
-  _globals['_LANDMARK']._serialized_end=200
-  _globals['_BLINKRESPONSE']._serialized_start=203
-  _globals['_BLINKRESPONSE']._serialized_end=341
-  _globals['_BLINKINFO']._serialized_start=344
-  _globals['_BLINKINFO']._serialized_end=507
-  _globals['_RESETREQUEST']._serialized_start=509
-  _globals['_RESETREQUEST']._serialized_end=541
-  _globals['_RESETRESPONSE']._serialized_start=543
-  _globals['_RESETRESPONSE']._serialized_end=575
-  _globals['_HEALTHREQUEST']._serialized_start=577
-  _globals['_HEALTHREQUEST']._serialized_end=592
-  _globals['_HEALTHRESPONSE']._serialized_start=594
-  _globals['_HEALTHRESPONSE']._serialized_end=644
-  _globals['_BLINKDETECTIONSERVICE']._serialized_start=647
-  _globals['_BLINKDETECTIONSERVICE']._serialized_end=985
+  _globals['_BLINKREQUEST']._serialized_end=160
+  _globals['_LANDMARK']._serialized_start=162
+  _globals['_LANDMARK']._serialized_end=220
+  _globals['_BLINKRESPONSE']._serialized_start=223
+  _globals['_BLINKRESPONSE']._serialized_end=361
+  _globals['_BLINKINFO']._serialized_start=364
+  _globals['_BLINKINFO']._serialized_end=527
+  _globals['_RESETREQUEST']._serialized_start=529
+  _globals['_RESETREQUEST']._serialized_end=581
+  _globals['_RESETRESPONSE']._serialized_start=583
+  _globals['_RESETRESPONSE']._serialized_end=615
+  _globals['_HEALTHREQUEST']._serialized_start=617
+  _globals['_HEALTHREQUEST']._serialized_end=632
+  _globals['_HEALTHRESPONSE']._serialized_start=634
+  _globals['_HEALTHRESPONSE']._serialized_end=684
+  _globals['_BLINKDETECTIONSERVICE']._serialized_start=687
+  _globals['_BLINKDETECTIONSERVICE']._serialized_end=1025
 # @@protoc_insertion_point(module_scope)
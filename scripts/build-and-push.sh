@@ -41,8 +41,8 @@ for service_info in "${SERVICES[@]}"; do
     
     echo "📦 Building $name from $path..."
     
-    # Build image
-    docker build -t $REGISTRY/$PROJECT/$name:$TAG $path
+    # Build image (Python services copy shared helpers and protos from named contexts)
+    docker build --build-context common=services/common --build-context proto=proto -t $REGISTRY/$PROJECT/$name:$TAG $path
     
     if [ $? -ne 0 ]; then
         echo "❌ Failed to build $name"
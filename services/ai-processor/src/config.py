@@ -16,6 +16,27 @@ class FaceDetectionConfig(BaseSettings):
     max_faces: int = Field(default=20, ge=1)
     input_size: tuple[int, int] = Field(default=(640, 640))
     device: str = Field(default="cpu", description="Device to use: cuda or cpu")
+    # Detection resolution: frames are downscaled before inference and
+    # detections mapped back to the original frame (ultralytics backend;
+    # the onnx backend always runs at the exported input_size)
+    detection_size: int = Field(default=0, ge=0, description="Longest side of the detector input; 0 = full frame")
+    letterbox: bool = Field(default=False, description="Pad the downscaled frame to a square detector input")
+    auto_resolution: bool = Field(default=False, description="Pick the scale from min_face_size instead")
+    min_face_size: int = Field(default=64, ge=1, description="Smallest face to detect, in original pixels")
+    detector_min_face_size: int = Field(default=16, ge=1, description="Smallest face the model finds at its input")
+    # Inference backend: ultralytics runs the model as is; onnx exports it
+    # once at input_size and runs it with ONNX Runtime on the CPU, ignoring
+    # the detection resolution settings above
+    backend: str = Field(default="ultralytics", pattern="^(ultralytics|onnx)$", description="ultralytics or onnx")
+    onnx_model_path: str = Field(default="", description="Exported ONNX model; empty = export model_path")
+    onnx_intra_op_threads: int = Field(default=0, ge=0, description="Threads within an operator; 0 = ORT default")
+    onnx_inter_op_threads: int = Field(default=0, ge=0, description="Threads across operators; 0 = ORT default")
+    onnx_int8: bool = Field(default=False, description="Run a statically quantized int8 model")
+    onnx_calibration_dir: str = Field(default="", description="Frames used to calibrate the int8 model")
+    # Micro-batching: detect() calls of concurrent callers are collected
+    # and run as one detect_batch (one predict over the whole batch)
+    micro_batch_max_size: int = Field(default=8, ge=1, description="Frames per batch at most; 1 = no batching")
+    micro_batch_max_wait_ms: float = Field(default=2.0, ge=0.0, description="Longest wait for a batch to fill")
 
 
 class TrackerConfig(BaseSettings):
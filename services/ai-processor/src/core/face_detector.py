@@ -2,15 +2,20 @@
 Face Detection Module using YOLOv8-face.
 
 This module provides GPU-accelerated face detection with support for
-multiple faces in a single frame.
+multiple faces in a single frame, and an ONNX Runtime backend for
+CPU-only nodes.
 """
 
+from itertools import repeat
+
 import numpy as np
 from typing import Optional
 from loguru import logger
 
 from ..config import FaceDetectionConfig, settings
 from ..models.detection import Detection, BoundingBox
+from ..utils.batching import MicroBatcher
+from ..utils.scaling import STRIDE, FrameTransform, detection_scale, resize_for_detection
 
 
 class FaceDetector:
@@ -21,6 +26,10 @@ class FaceDetector:
     - GPU acceleration with CUDA
     - Multi-face detection
     - Configurable confidence threshold
+    - Configurable detection resolution (fixed, letterboxed or derived
+      from the minimum face size), results in original frame coordinates
+    - ultralytics or ONNX Runtime (optionally int8) inference backend
+    - Micro-batching of concurrent detect() calls into one batched predict
     - Returns bounding boxes and 5 keypoints
     """
     
@@ -33,6 +42,7 @@ class FaceDetector:
         """
         self.config = config or settings.face_detection
         self._model = None
+        self._batcher: Optional[MicroBatcher] = None
         self._initialized = False
         
     def initialize(self) -> None:
@@ -41,20 +51,35 @@ class FaceDetector:
             return
             
         try:
-            from ultralytics import YOLO
-            
             logger.info(f"Loading face detection model: {self.config.model_path}")
-            logger.info(f"Using device: {self.config.device}")
+            dummy_input = np.zeros((640, 640, 3), dtype=np.uint8)
             
-            self._model = YOLO(self.config.model_path)
+            if self.config.backend == "onnx":
+                from .onnx_detector import OnnxFaceModel
+                
+                logger.info("Using ONNX Runtime CPU backend" + (" (int8)" if self.config.onnx_int8 else ""))
+                self._model = OnnxFaceModel.from_config(self.config)
+                self._model.predict([dummy_input])
+            else:
+                from ultralytics import YOLO
+                
+                logger.info(f"Using device: {self.config.device}")
+                self._model = YOLO(self.config.model_path)
+                
+                # Warm up the model
+                self._model.predict(
+                    dummy_input,
+                    device=self.config.device,
+                    verbose=False
+                )
             
-            # Warm up the model
-            dummy_input = np.zeros((640, 640, 3), dtype=np.uint8)
-            self._model.predict(
-                dummy_input,
-                device=self.config.device,
-                verbose=False
-            )
+            if self.config.micro_batch_max_size > 1:
+                self._batcher = MicroBatcher(
+                    self.detect_batch,
+                    max_batch_size=self.config.micro_batch_max_size,
+                    max_wait_ms=self.config.micro_batch_max_wait_ms,
+                    name="face-detector-batcher"
+                )
             
             self._initialized = True
             logger.info("Face detector initialized successfully")
@@ -67,6 +92,10 @@ class FaceDetector:
         """
         Detect faces in a frame.
         
+        With micro-batching enabled the frame waits (up to
+        micro_batch_max_wait_ms) for frames of concurrent callers and all
+        of them go through one detect_batch.
+        
         Args:
             frame: BGR image as numpy array (H, W, 3)
             
@@ -76,46 +105,21 @@ class FaceDetector:
         if not self._initialized:
             self.initialize()
         
+        if self._batcher is not None:
+            return self._batcher.submit(frame)
+        
         detections = []
         
         try:
+            image, transform = self.prepare(frame)
+
             # Run inference
-            results = self._model.predict(
-                frame,
-                conf=self.config.conf_threshold,
-                iou=self.config.iou_threshold,
-                max_det=self.config.max_faces,
-                device=self.config.device,
-                verbose=False
-            )
+            outputs = self._infer([image], [transform])
             
-            if not results or len(results) == 0:
+            if not outputs:
                 return detections
             
-            result = results[0]
-            
-            # Extract detections
-            if result.boxes is not None and len(result.boxes) > 0:
-                boxes = result.boxes.xyxy.cpu().numpy()
-                confs = result.boxes.conf.cpu().numpy()
-                
-                # Get keypoints if available
-                keypoints = None
-                if hasattr(result, 'keypoints') and result.keypoints is not None:
-                    keypoints = result.keypoints.xy.cpu().numpy()
-                
-                for i in range(len(boxes)):
-                    x1, y1, x2, y2 = map(int, boxes[i])
-                    confidence = float(confs[i])
-                    
-                    kpts = keypoints[i] if keypoints is not None else None
-                    
-                    detection = Detection.from_xyxy(
-                        x1=x1, y1=y1, x2=x2, y2=y2,
-                        confidence=confidence,
-                        keypoints=kpts
-                    )
-                    detections.append(detection)
+            detections = self._to_detections(*outputs[0], transform)
             
             logger.debug(f"Detected {len(detections)} faces")
             
@@ -140,39 +144,14 @@ class FaceDetector:
         all_detections = []
         
         try:
-            results = self._model.predict(
-                frames,
-                conf=self.config.conf_threshold,
-                iou=self.config.iou_threshold,
-                max_det=self.config.max_faces,
-                device=self.config.device,
-                verbose=False
-            )
+            prepared = [self.prepare(frame) for frame in frames]
+            images = [image for image, _ in prepared]
+            transforms = [transform for _, transform in prepared]
+
+            outputs = self._infer(images, transforms)
             
-            for result in results:
-                frame_detections = []
-                
-                if result.boxes is not None and len(result.boxes) > 0:
-                    boxes = result.boxes.xyxy.cpu().numpy()
-                    confs = result.boxes.conf.cpu().numpy()
-                    
-                    keypoints = None
-                    if hasattr(result, 'keypoints') and result.keypoints is not None:
-                        keypoints = result.keypoints.xy.cpu().numpy()
-                    
-                    for i in range(len(boxes)):
-                        x1, y1, x2, y2 = map(int, boxes[i])
-                        confidence = float(confs[i])
-                        kpts = keypoints[i] if keypoints is not None else None
-                        
-                        detection = Detection.from_xyxy(
-                            x1=x1, y1=y1, x2=x2, y2=y2,
-                            confidence=confidence,
-                            keypoints=kpts
-                        )
-                        frame_detections.append(detection)
-                
-                all_detections.append(frame_detections)
+            for output, transform in zip(outputs, transforms):
+                all_detections.append(self._to_detections(*output, transform))
         
         except Exception as e:
             logger.error(f"Batch face detection failed: {e}")
@@ -180,8 +159,108 @@ class FaceDetector:
         
         return all_detections
     
+    def prepare(self, frame: np.ndarray) -> tuple[np.ndarray, FrameTransform]:
+        """
+        Downscale a frame to the configured detection resolution.
+        
+        The ONNX backend gets the full frame: its model letterboxes every
+        input to the exported input_size in one resize, which already sets
+        the detection resolution.
+        
+        Args:
+            frame: BGR image as numpy array (H, W, 3)
+            
+        Returns:
+            Detector input and the transform back to frame coordinates
+        """
+        height, width = frame.shape[:2]
+        if self.config.backend == "onnx":
+            return frame, FrameTransform(width=width, height=height)
+        scale = detection_scale(
+            width, height,
+            detection_size=self.config.detection_size,
+            auto=self.config.auto_resolution,
+            min_face_size=self.config.min_face_size,
+            detector_min_face_size=self.config.detector_min_face_size
+        )
+        return resize_for_detection(frame, scale, letterbox=self.config.letterbox)
+    
+    def _infer(
+        self,
+        images: list[np.ndarray],
+        transforms: list[FrameTransform]
+    ) -> list[tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]]:
+        """
+        Run the backend on detector inputs.
+        
+        Returns:
+            Per image: boxes (N, 4) xyxy, confidences (N,) and keypoints
+            (N, K, 2) or None, in detector input coordinates
+        """
+        if self.config.backend == "onnx":
+            return self._model.predict(images)
+        
+        results = self._model.predict(
+            images,
+            conf=self.config.conf_threshold,
+            iou=self.config.iou_threshold,
+            max_det=self.config.max_faces,
+            device=self.config.device,
+            verbose=False,
+            **self._predict_size(images, transforms)
+        )
+        return [self._result_arrays(result) for result in results]
+    
+    @staticmethod
+    def _predict_size(images: list[np.ndarray], transforms: list[FrameTransform]) -> dict:
+        """imgsz for predict: the downscaled size, so the model does not scale it back up."""
+        if all(t.is_identity for t in transforms):
+            return {}
+        longest = max(max(image.shape[:2]) for image in images)
+        return {'imgsz': -(-longest // STRIDE) * STRIDE}
+    
+    @staticmethod
+    def _result_arrays(result) -> tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """Boxes, confidences and keypoints of an ultralytics predict result."""
+        if result.boxes is None or len(result.boxes) == 0:
+            return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), None
+        
+        # Get keypoints if available
+        keypoints = None
+        if hasattr(result, 'keypoints') and result.keypoints is not None:
+            keypoints = result.keypoints.xy.cpu().numpy()
+        return result.boxes.xyxy.cpu().numpy(), result.boxes.conf.cpu().numpy(), keypoints
+    
+    @staticmethod
+    def _to_detections(
+        boxes: np.ndarray,
+        confs: np.ndarray,
+        keypoints: Optional[np.ndarray],
+        transform: FrameTransform
+    ) -> list[Detection]:
+        """Detections from backend outputs, in original frame coordinates."""
+        if len(boxes) == 0:
+            return []
+        
+        # Map all boxes and keypoints at once; only the objects are built per face
+        boxes = transform.boxes_to_original(boxes).astype(np.int64).tolist()
+        confs = np.asarray(confs, dtype=np.float64).tolist()
+        keypoints = transform.points_to_original(keypoints) if keypoints is not None else repeat(None)
+        
+        return [
+            Detection.from_xyxy(x1=x1, y1=y1, x2=x2, y2=y2, confidence=conf, keypoints=kpts)
+            for (x1, y1, x2, y2), conf, kpts in zip(boxes, confs, keypoints)
+        ]
+    
+    def get_batch_stats(self) -> Optional[dict]:
+        """Micro-batch counters and occupancy, None without batching."""
+        return self._batcher.get_stats() if self._batcher is not None else None
+    
     def release(self) -> None:
         """Release model resources."""
+        if self._batcher is not None:
+            self._batcher.close()
+            self._batcher = None
         self._model = None
         self._initialized = False
         logger.info("Face detector released")
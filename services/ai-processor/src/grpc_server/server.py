@@ -67,7 +67,10 @@ class AttentionServicer:
             'version': self.version,
             'device': self.pipeline.device,
             'gpu_memory_used_mb': 0.0,
-            'active_sessions': self.active_sessions
+            'active_sessions': self.active_sessions,
+            'face_detection_batching': (
+                self.pipeline.face_detector.get_batch_stats() if self.pipeline.face_detector else None
+            )
         }
     
     def _convert_results(self, results):
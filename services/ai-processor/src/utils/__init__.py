@@ -4,7 +4,8 @@ Utility modules.
 
 from .visualization import Visualizer
 from .video import VideoCapture
-from .performance import FPSCounter, LatencyTracker, PerformanceMetrics, ConnectionPool
+from .performance import FPSCounter, LatencyTracker, QuantileSketch, PerformanceMetrics, ConnectionPool
+from .batching import MicroBatcher
 from .gpu import check_gpu_availability, get_optimal_device, optimize_torch_settings
 
 __all__ = [
@@ -12,8 +13,10 @@ __all__ = [
     "VideoCapture",
     "FPSCounter",
     "LatencyTracker",
+    "QuantileSketch",
     "PerformanceMetrics",
     "ConnectionPool",
+    "MicroBatcher",
     "check_gpu_availability",
     "get_optimal_device",
     "optimize_torch_settings",
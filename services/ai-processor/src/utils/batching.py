@@ -0,0 +1,132 @@
+"""
+Cross-request micro-batching.
+
+Concurrent callers hand their input to a ``MicroBatcher`` and block until
+their result is ready. A single worker thread collects inputs until
+``max_batch_size`` are queued or ``max_wait_ms`` have passed since the
+oldest one arrived, runs them through the batch function in one call and
+scatters the results back to the waiting callers, so a backend with a
+batched call (one YOLO ``predict`` over several frames) pays its per-call
+overhead once per batch instead of once per frame.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Generic, List, Sequence, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Collects inputs of concurrent callers into batches for one worker.
+
+    Args:
+        fn: Batch function; returns one result per input, in order. A
+            returned Exception instance fails only that input's caller; an
+            exception raised by ``fn`` fails the whole batch.
+        max_batch_size: Inputs run together at most
+        max_wait_ms: Longest time the oldest queued input waits for company
+        name: Worker thread name
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[List[T]], Sequence[R]],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 2.0,
+        name: str = "batcher"
+    ):
+        self.fn = fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+
+        self._queue: deque = deque()  # (input, future, enqueued at)
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.batches = 0
+        self.inputs = 0
+        self._recent: deque = deque(maxlen=100)  # sizes of the latest batches
+
+        self._thread = threading.Thread(target=self._run, daemon=True, name=name)
+        self._thread.start()
+
+    def submit(self, item: T) -> R:
+        """Queue an input and wait for its result (re-raising its error)."""
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Batcher is closed")
+            self._queue.append((item, future, time.monotonic()))
+            self._cond.notify()
+        return future.result()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                # Wait for more inputs, but never longer than max_wait past the oldest
+                flush_at = self._queue[0][2] + self.max_wait
+                while len(self._queue) < self.max_batch_size and not self._closed:
+                    left = flush_at - time.monotonic()
+                    if left <= 0:
+                        break
+                    self._cond.wait(left)
+                batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch_size))]
+            self._execute(batch)
+
+    def _execute(self, batch: list) -> None:
+        self.batches += 1
+        self.inputs += len(batch)
+        self._recent.append(len(batch))
+        futures = [future for _, future, _ in batch]
+        try:
+            results = list(self.fn([item for item, _, _ in batch]))
+            if len(results) != len(batch):
+                raise RuntimeError(f"Batch function returned {len(results)} results for {len(batch)} inputs")
+        except Exception as e:
+            for future in futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(futures, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    @property
+    def pending(self) -> int:
+        return len(self._queue)
+
+    @property
+    def occupancy(self) -> float:
+        """Mean fill of the latest batches, as a fraction of max_batch_size."""
+        recent = list(self._recent)
+        if not recent:
+            return 0.0
+        return sum(recent) / len(recent) / self.max_batch_size
+
+    def get_stats(self) -> dict:
+        """Batch counters and occupancy."""
+        return {
+            'batches': self.batches,
+            'inputs': self.inputs,
+            'mean_batch_size': self.inputs / self.batches if self.batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'occupancy': round(self.occupancy, 4),
+            'pending': self.pending,
+        }
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Run what is queued, then stop the worker."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
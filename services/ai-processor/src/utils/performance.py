@@ -2,10 +2,11 @@
 Performance optimization utilities for AI processing.
 """
 
+import math
 import time
 import functools
 import threading
-from typing import Any, Callable, TypeVar, Optional
+from typing import Any, Callable, Dict, TypeVar, Optional
 from collections import deque
 from dataclasses import dataclass, field
 import logging
@@ -58,37 +59,161 @@ class FPSCounter:
             self._timestamps.clear()
 
 
+class QuantileSketch:
+    """Mergeable streaming quantile sketch with relative-error guarantees.
+
+    Values are counted in logarithmic buckets (bucket ``k`` holds values in
+    ``(gamma^(k-1), gamma^k]``), so recording is O(1) and every reported
+    quantile is within ``relative_accuracy`` of the true value. Two sketches
+    with the same accuracy merge by adding bucket counts, which makes them
+    combinable across threads, processes and replicas (see ``to_dict``).
+    """
+
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+
+    def add(self, value: float) -> None:
+        """Record a (non-negative) value."""
+        if value <= self.MIN_VALUE:
+            self.zero_count += 1
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self._bins[key] = self._bins.get(key, 0) + 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """Add the values of another sketch of the same accuracy."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for key, n in other._bins.items():
+            self._bins[key] = self._bins.get(key, 0) + n
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """Estimated value at quantile ``q`` in [0, 1] (0 when empty)."""
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return max(self.min, 0.0)
+        for key in sorted(self._bins):
+            seen += self._bins[key]
+            if rank < seen:
+                value = 2 * self._gamma ** key / (self._gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form, for merging sketches from other processes."""
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'bins': {str(key): n for key, n in self._bins.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "QuantileSketch":
+        sketch = cls(data['relative_accuracy'])
+        sketch._bins = {int(key): int(n) for key, n in data['bins'].items()}
+        sketch.zero_count = int(data['zero_count'])
+        sketch.count = int(data['count'])
+        sketch.sum = float(data['sum'])
+        if sketch.count:
+            sketch.min = float(data['min'])
+            sketch.max = float(data['max'])
+        return sketch
+
+
 class LatencyTracker:
-    """Thread-safe latency tracking with statistics."""
-    
-    def __init__(self, window_size: int = 100):
-        self.window_size = window_size
-        self._latencies: deque = deque(maxlen=window_size)
+    """Thread-safe latency tracking with streaming quantiles over a sliding time window.
+
+    The window is split into ``num_slices`` time slices, each with its own
+    ``QuantileSketch``; recording touches only the current slice, and
+    statistics merge the slices that fall inside the requested window.
+    """
+
+    QUANTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99, 'p999': 0.999}
+
+    def __init__(self, window_seconds: float = 60.0, num_slices: int = 6,
+                 relative_accuracy: float = 0.01):
+        if window_seconds <= 0 or num_slices < 1:
+            raise ValueError("window_seconds and num_slices must be positive")
+        self.window_seconds = window_seconds
+        self.num_slices = num_slices
+        self.slice_seconds = window_seconds / num_slices
+        self.relative_accuracy = relative_accuracy
+        self._slices: deque = deque(maxlen=num_slices)  # (slice index, sketch)
         self._lock = threading.Lock()
-    
-    def record(self, latency_ms: float) -> None:
+
+    def _slice_index(self, now: float) -> int:
+        return int(now // self.slice_seconds)
+
+    def record(self, latency_ms: float, now: Optional[float] = None) -> None:
         """Record a latency measurement."""
+        index = self._slice_index(time.monotonic() if now is None else now)
         with self._lock:
-            self._latencies.append(latency_ms)
-    
-    def get_stats(self) -> dict:
-        """Get latency statistics."""
+            if not self._slices or self._slices[-1][0] != index:
+                self._slices.append((index, QuantileSketch(self.relative_accuracy)))
+            self._slices[-1][1].add(latency_ms)
+
+    def sketch(self, window_seconds: Optional[float] = None, now: Optional[float] = None) -> QuantileSketch:
+        """Merged sketch of the last ``window_seconds`` (default: the whole window).
+
+        Windows are rounded up to whole slices.
+        """
+        window = self.window_seconds if window_seconds is None else min(window_seconds, self.window_seconds)
+        slices = max(1, math.ceil(window / self.slice_seconds - 1e-9))
+        oldest = self._slice_index(time.monotonic() if now is None else now) - slices + 1
+        merged = QuantileSketch(self.relative_accuracy)
         with self._lock:
-            if not self._latencies:
-                return {'avg': 0, 'min': 0, 'max': 0, 'count': 0}
-            
-            latencies = list(self._latencies)
-            return {
-                'avg': sum(latencies) / len(latencies),
-                'min': min(latencies),
-                'max': max(latencies),
-                'count': len(latencies)
-            }
-    
+            for index, sketch in self._slices:
+                if index >= oldest:
+                    merged.merge(sketch)
+        return merged
+
+    def get_stats(self, window_seconds: Optional[float] = None, now: Optional[float] = None) -> dict:
+        """Get latency statistics (avg, min, max, count and p50/p90/p99/p999)."""
+        sketch = self.sketch(window_seconds, now)
+        if not sketch.count:
+            return {'avg': 0, 'min': 0, 'max': 0, 'count': 0, **{name: 0 for name in self.QUANTILES}}
+        return {
+            'avg': sketch.sum / sketch.count,
+            'min': sketch.min,
+            'max': sketch.max,
+            'count': sketch.count,
+            **{name: sketch.quantile(q) for name, q in self.QUANTILES.items()}
+        }
+
     def reset(self) -> None:
         """Reset the tracker."""
         with self._lock:
-            self._latencies.clear()
+            self._slices.clear()
 
 
 def measure_time(func: Callable[..., T]) -> Callable[..., T]:
@@ -0,0 +1,130 @@
+"""
+Detection resolution utilities.
+
+Face detection cost grows with the number of input pixels, while the faces
+we need are usually large. These helpers shrink a frame before inference
+(optionally letterboxed to a square detector input) and map detections
+back to original frame coordinates.
+"""
+
+import math
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+
+# Smallest detector input that is still worth running
+MIN_DETECTION_SIZE = 160
+
+# Letterboxed inputs are padded to a multiple of the detector stride
+STRIDE = 32
+
+# Padding color of letterboxed inputs (YOLO convention)
+PAD_VALUE = 114
+
+
+@dataclass
+class FrameTransform:
+    """Maps detector input coordinates back to the original frame."""
+    scale: float = 1.0
+    pad_x: float = 0.0
+    pad_y: float = 0.0
+    width: int = 0   # original frame size
+    height: int = 0
+
+    @property
+    def is_identity(self) -> bool:
+        return self.scale == 1.0 and self.pad_x == 0 and self.pad_y == 0
+
+    def points_to_original(self, points: np.ndarray) -> np.ndarray:
+        """Map (..., 2) x/y points to the original frame."""
+        points = np.asarray(points, dtype=np.float32)
+        if self.is_identity:
+            return points
+        mapped = points.copy()
+        mapped[..., 0] = (points[..., 0] - self.pad_x) / self.scale
+        mapped[..., 1] = (points[..., 1] - self.pad_y) / self.scale
+        return mapped
+
+    def boxes_to_original(self, boxes: np.ndarray) -> np.ndarray:
+        """Map (N, 4) xyxy boxes to the original frame, clipped to its bounds."""
+        boxes = self.points_to_original(np.asarray(boxes, dtype=np.float32).reshape(-1, 2, 2)).reshape(-1, 4)
+        if self.width and self.height:
+            boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, self.width)
+            boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, self.height)
+        return boxes
+
+
+def detection_scale(
+    width: int,
+    height: int,
+    detection_size: int = 0,
+    auto: bool = False,
+    min_face_size: int = 64,
+    detector_min_face_size: int = 16
+) -> float:
+    """
+    Scale factor (at most 1) to apply to a frame before detection.
+
+    Args:
+        width: Frame width
+        height: Frame height
+        detection_size: Longest side of the detector input; 0 keeps the full frame
+        auto: Derive the scale from the face sizes instead of detection_size
+        min_face_size: Smallest face (pixels, original frame) that must be found
+        detector_min_face_size: Smallest face the detector reliably finds at its input
+
+    Returns:
+        Scale factor; frames are never upscaled or shrunk below MIN_DETECTION_SIZE
+    """
+    longest = max(width, height)
+    if longest <= 0:
+        return 1.0
+    if auto:
+        scale = detector_min_face_size / max(1, min_face_size)
+    elif detection_size > 0:
+        scale = detection_size / longest
+    else:
+        return 1.0
+    scale = max(scale, MIN_DETECTION_SIZE / longest)
+    return min(1.0, scale)
+
+
+def resize_for_detection(
+    frame: np.ndarray,
+    scale: float,
+    letterbox: bool = False
+) -> tuple[np.ndarray, FrameTransform]:
+    """
+    Downscale a frame for detection.
+
+    Args:
+        frame: Image (H, W, C)
+        scale: Factor from detection_scale
+        letterbox: Center the scaled frame on a square, stride-aligned canvas
+
+    Returns:
+        Detector input and the transform mapping its coordinates back
+    """
+    height, width = frame.shape[:2]
+    if scale >= 1.0 and not letterbox:
+        return frame, FrameTransform(width=width, height=height)
+
+    new_w = max(1, round(width * scale))
+    new_h = max(1, round(height * scale))
+    image = frame if (new_w, new_h) == (width, height) else cv2.resize(
+        frame, (new_w, new_h), interpolation=cv2.INTER_AREA
+    )
+    # Actual scale after rounding to whole pixels
+    scale = new_w / width
+    if not letterbox:
+        return image, FrameTransform(scale=scale, width=width, height=height)
+
+    side = math.ceil(max(new_w, new_h) / STRIDE) * STRIDE
+    pad_x = (side - new_w) // 2
+    pad_y = (side - new_h) // 2
+    image = cv2.copyMakeBorder(
+        image, pad_y, side - new_h - pad_y, pad_x, side - new_w - pad_x,
+        cv2.BORDER_CONSTANT, value=(PAD_VALUE,) * (image.shape[2] if image.ndim == 3 else 1)
+    )
+    return image, FrameTransform(scale=scale, pad_x=pad_x, pad_y=pad_y, width=width, height=height)
@@ -0,0 +1,76 @@
+"""
+Tests for cross-request micro-batching.
+"""
+
+import threading
+
+import numpy as np
+import pytest
+
+from src.config import FaceDetectionConfig
+from src.core.face_detector import FaceDetector
+from src.utils.batching import MicroBatcher
+
+
+class TestMicroBatcher:
+    def test_failed_input_fails_only_its_caller(self):
+        batcher = MicroBatcher(lambda items: [ValueError(i) if i < 0 else i * 2 for i in items], max_wait_ms=0)
+
+        assert batcher.submit(3) == 6
+        with pytest.raises(ValueError):
+            batcher.submit(-1)
+        batcher.close()
+
+    def test_concurrent_inputs_share_a_batch(self):
+        calls = []
+
+        def fn(items):
+            calls.append(list(items))
+            return [i * 2 for i in items]
+
+        batcher = MicroBatcher(fn, max_batch_size=4, max_wait_ms=500)
+        results = {}
+        threads = [threading.Thread(target=lambda i=i: results.update({i: batcher.submit(i)})) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        batcher.close()
+
+        assert results == {0: 0, 1: 2, 2: 4, 3: 6}
+        assert len(calls) == 1 and sorted(calls[0]) == [0, 1, 2, 3]
+        assert batcher.occupancy == 1.0
+        assert batcher.get_stats()['mean_batch_size'] == 4
+
+
+class TestFaceDetectorBatching:
+    def test_concurrent_detects_run_as_one_predict(self):
+        """Frames of concurrent detect() calls go through the model in one call, each caller gets its own boxes."""
+        class FakeOnnx:
+            calls = []
+
+            def predict(self, images):
+                self.calls.append(len(images))
+                return [(np.array([[image[0, 0, 0], 0, 10, 10]], dtype=np.float32),
+                         np.array([0.9], dtype=np.float32), None) for image in images]
+
+        detector = FaceDetector(FaceDetectionConfig(backend="onnx"))
+        detector._model = FakeOnnx()
+        detector._initialized = True
+        detector._batcher = MicroBatcher(detector.detect_batch, max_batch_size=3, max_wait_ms=500)
+        results = {}
+
+        def call(i):
+            frame = np.full((48, 64, 3), i, dtype=np.uint8)
+            results[i] = detector.detect(frame)
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert detector._model.calls == [3]
+        assert {i: results[i][0].bbox.x for i in range(3)} == {0: 0, 1: 1, 2: 2}
+        assert detector.get_batch_stats()['batches'] == 1
+        detector.release()
@@ -0,0 +1,133 @@
+"""
+Tests for the ONNX Runtime face detection backend.
+"""
+
+import numpy as np
+import pytest
+
+from src.config import FaceDetectionConfig
+from src.core.face_detector import FaceDetector
+from src.core.onnx_detector import OnnxFaceModel, letterbox, to_blob
+
+
+def _model(num_classes=1, num_keypoints=5, **config):
+    """OnnxFaceModel with its decoding state only (no session)."""
+    model = OnnxFaceModel.__new__(OnnxFaceModel)
+    model.config = FaceDetectionConfig(**config)
+    model.input_size = (640, 640)
+    model.num_classes = num_classes
+    model.num_keypoints, model.keypoint_dims = (num_keypoints, 3) if num_keypoints else (0, 0)
+    return model
+
+
+def _raw_output(rows):
+    """Raw (channels, anchors) output from per-anchor rows."""
+    return np.asarray(rows, dtype=np.float32).T
+
+
+class TestPreprocessing:
+    def test_letterbox_centers_and_pads(self):
+        image, ratio, pad_x, pad_y = letterbox(np.zeros((720, 1280, 3), dtype=np.uint8), (640, 640))
+
+        assert image.shape == (640, 640, 3)
+        assert (ratio, pad_x, pad_y) == (0.5, 0, 140)
+        assert image[0, 0, 0] == 114 and image[320, 320, 0] == 0
+
+    def test_blob_is_rgb_nchw(self):
+        image = np.zeros((4, 4, 3), dtype=np.uint8)
+        image[..., 0] = 255  # blue
+
+        blob = to_blob([image, image])
+
+        assert blob.shape == (2, 3, 4, 4) and blob.dtype == np.float32
+        assert blob[0, 2].max() == 1.0 and blob[0, 0].max() == 0.0
+
+
+class TestDecode:
+    def test_pose_output_filtered_suppressed_and_mapped(self):
+        keypoints = [300, 300, 1.0] * 5
+        output = _raw_output([
+            [320, 320, 100, 100, 0.9] + keypoints,
+            [325, 322, 100, 100, 0.8] + keypoints,  # overlaps the first: suppressed
+            [100, 200, 50, 50, 0.1] + keypoints,    # below conf_threshold
+        ])
+
+        boxes, confs, kpts = _model()._decode(output, 0.5, 0, 140)
+
+        assert boxes.tolist() == [[540, 260, 740, 460]]
+        assert confs == pytest.approx([0.9])
+        assert kpts.shape == (1, 5, 2) and kpts[0, 0].tolist() == [600, 320]
+
+    def test_detect_output_uses_best_class(self):
+        output = _raw_output([
+            [320, 320, 100, 100, 0.1, 0.7],
+            [100, 100, 40, 40, 0.2, 0.3],
+        ])
+
+        boxes, confs, kpts = _model(num_classes=2, num_keypoints=0)._decode(output, 1.0, 0, 0)
+
+        assert boxes.tolist() == [[270, 270, 370, 370]]
+        assert confs == pytest.approx([0.7]) and kpts is None
+
+    def test_no_faces(self):
+        output = _raw_output([[320, 320, 100, 100, 0.1] + [0] * 15])
+
+        boxes, confs, kpts = _model()._decode(output, 1.0, 0, 0)
+
+        assert boxes.shape == (0, 4) and len(confs) == 0 and kpts.shape == (0, 5, 2)
+
+    def test_max_faces(self):
+        rows = [[50 + 100 * i, 50, 40, 40, 0.9] + [0] * 15 for i in range(6)]
+
+        boxes, _, _ = _model(max_faces=4)._decode(_raw_output(rows), 1.0, 0, 0)
+
+        assert len(boxes) == 4
+
+
+class TestFaceDetectorOnnxBackend:
+    def test_detections_from_onnx_outputs(self):
+        """The model gets the full frame (it letterboxes to its own input size), so detection_size is ignored."""
+        class FakeOnnx:
+            shapes = []
+
+            def predict(self, images):
+                self.shapes += [image.shape for image in images]
+                return [(np.array([[100, 50, 200, 150]], dtype=np.float32), np.array([0.9], dtype=np.float32),
+                         np.array([[[120, 80]] * 5], dtype=np.float32)) for _ in images]
+
+        detector = FaceDetector(FaceDetectionConfig(backend="onnx", detection_size=640))
+        detector._model = FakeOnnx()
+        detector._initialized = True
+
+        detection = detector.detect(np.zeros((1080, 1920, 3), dtype=np.uint8))[0]
+
+        assert detector._model.shapes == [(1080, 1920, 3)]
+        assert (detection.bbox.x, detection.bbox.y, detection.bbox.width) == (100, 50, 100)
+        assert detection.confidence == pytest.approx(0.9)
+        assert detection.keypoints[0].tolist() == [120, 80]
+
+    def test_backend_validated(self):
+        with pytest.raises(ValueError):
+            FaceDetectionConfig(backend="tensorrt")
+
+
+def test_session_thread_options(tmp_path):
+    """Thread settings reach the session (needs onnxruntime and onnx)."""
+    ort = pytest.importorskip("onnxruntime")
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper
+
+    # Identity graph standing in for an exported model: (1, 3, 64, 64) -> (1, 3, 64, 64)
+    graph = helper.make_graph(
+        [helper.make_node('Identity', ['images'], ['output0'])], 'g',
+        [helper.make_tensor_value_info('images', TensorProto.FLOAT, [1, 3, 64, 64])],
+        [helper.make_tensor_value_info('output0', TensorProto.FLOAT, [1, 3, 64, 64])]
+    )
+    path = tmp_path / "identity.onnx"
+    onnx.save(helper.make_model(graph), str(path))
+
+    model = OnnxFaceModel(str(path), FaceDetectionConfig(onnx_intra_op_threads=2, onnx_inter_op_threads=1))
+
+    assert model.input_size == (64, 64) and not model.dynamic_batch
+    assert model.session.get_session_options().intra_op_num_threads == 2
+    assert isinstance(model.session, ort.InferenceSession)
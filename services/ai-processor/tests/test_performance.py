@@ -0,0 +1,101 @@
+"""
+Tests for performance utilities.
+"""
+
+import json
+
+import numpy as np
+import pytest
+
+from src.utils.performance import LatencyTracker, QuantileSketch
+
+
+class TestQuantileSketch:
+    def test_empty(self):
+        sketch = QuantileSketch()
+        assert sketch.count == 0
+        assert sketch.quantile(0.99) == 0.0
+
+    def test_relative_accuracy(self):
+        values = np.random.default_rng(0).lognormal(mean=3.0, sigma=1.0, size=20000)
+        sketch = QuantileSketch(relative_accuracy=0.01)
+        for v in values:
+            sketch.add(float(v))
+
+        for q in (0.5, 0.9, 0.99, 0.999):
+            exact = float(np.quantile(values, q, method='lower'))
+            assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+        assert sketch.quantile(0.0) == pytest.approx(values.min())
+        assert sketch.quantile(1.0) == pytest.approx(values.max())
+
+    def test_zero_values(self):
+        sketch = QuantileSketch()
+        for v in [0.0, 0.0, 0.0, 10.0]:
+            sketch.add(v)
+        assert sketch.quantile(0.5) == 0.0
+        assert sketch.quantile(1.0) == 10.0
+
+    def test_merge_matches_single_sketch(self):
+        values = np.random.default_rng(1).exponential(scale=20.0, size=5000)
+        whole, a, b = QuantileSketch(), QuantileSketch(), QuantileSketch()
+        for i, v in enumerate(values):
+            whole.add(float(v))
+            (a if i % 2 else b).add(float(v))
+
+        a.merge(b)
+        assert a.count == whole.count
+        assert a.sum == pytest.approx(whole.sum)
+        for q in (0.5, 0.99):
+            assert a.quantile(q) == whole.quantile(q)
+
+    def test_merge_rejects_other_accuracy(self):
+        with pytest.raises(ValueError):
+            QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+    def test_dict_roundtrip_through_json(self):
+        sketch = QuantileSketch()
+        for v in range(1, 101):
+            sketch.add(float(v))
+        restored = QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+        assert restored.count == 100
+        assert restored.quantile(0.9) == sketch.quantile(0.9)
+        assert restored.min == 1.0 and restored.max == 100.0
+
+
+class TestLatencyTracker:
+    def test_empty_stats(self):
+        stats = LatencyTracker().get_stats()
+        assert stats['count'] == 0
+        assert stats['p99'] == 0
+
+    def test_stats_include_tail_quantiles(self):
+        tracker = LatencyTracker()
+        for v in range(1, 1001):
+            tracker.record(float(v), now=100.0)
+
+        stats = tracker.get_stats(now=100.0)
+        assert stats['count'] == 1000
+        assert stats['min'] == 1.0 and stats['max'] == 1000.0
+        assert stats['avg'] == pytest.approx(500.5)
+        assert stats['p50'] == pytest.approx(500, rel=0.02)
+        assert stats['p90'] == pytest.approx(900, rel=0.02)
+        assert stats['p99'] == pytest.approx(990, rel=0.02)
+        assert stats['p999'] == pytest.approx(999, rel=0.02)
+
+    def test_sliding_window(self):
+        tracker = LatencyTracker(window_seconds=60.0, num_slices=6)
+        tracker.record(500.0, now=0.0)
+        tracker.record(10.0, now=55.0)
+
+        assert tracker.get_stats(now=55.0)['count'] == 2
+        # Narrower window only sees the last slice
+        assert tracker.get_stats(window_seconds=10.0, now=55.0)['max'] == 10.0
+        # The first slice has slid out of the window
+        assert tracker.get_stats(now=65.0)['count'] == 1
+        assert tracker.get_stats(now=200.0)['count'] == 0
+
+    def test_reset(self):
+        tracker = LatencyTracker()
+        tracker.record(5.0)
+        tracker.reset()
+        assert tracker.get_stats()['count'] == 0
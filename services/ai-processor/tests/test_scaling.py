@@ -0,0 +1,116 @@
+"""
+Tests for detection resolution scaling and FaceDetector coordinate remapping.
+"""
+
+import numpy as np
+import pytest
+
+from src.config import FaceDetectionConfig
+from src.core.face_detector import FaceDetector
+from src.utils.scaling import MIN_DETECTION_SIZE, detection_scale, resize_for_detection
+
+
+class _Tensor:
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class _Result:
+    def __init__(self, boxes, confs, keypoints):
+        self.boxes = type('Boxes', (), {'xyxy': _Tensor(boxes), 'conf': _Tensor(confs),
+                                        '__len__': lambda s: len(boxes)})()
+        self.keypoints = type('Keypoints', (), {'xy': _Tensor(keypoints)})()
+
+
+class _FakeModel:
+    """Returns one face at fixed detector-input coordinates and records the inputs."""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, image, **kwargs):
+        images = image if isinstance(image, list) else [image]
+        self.calls.append(([i.shape for i in images], kwargs))
+        return [_Result([[100, 50, 200, 150]], [0.9], [[[120, 80], [180, 80], [150, 100], [130, 130], [170, 130]]])
+                for _ in images]
+
+
+def _detector(**config):
+    detector = FaceDetector(FaceDetectionConfig(**config))
+    detector._model = _FakeModel()
+    detector._initialized = True
+    return detector
+
+
+class TestDetectionScale:
+    def test_full_frame_by_default(self):
+        assert detection_scale(1920, 1080) == 1.0
+
+    def test_fixed_size_scales_longest_side(self):
+        assert detection_scale(1920, 1080, detection_size=640) == pytest.approx(1 / 3)
+
+    def test_never_upscales(self):
+        assert detection_scale(320, 240, detection_size=640) == 1.0
+
+    def test_auto_from_min_face_size(self):
+        # 16 px detector minimum for 128 px faces: an eighth
+        assert detection_scale(1920, 1080, auto=True, min_face_size=128, detector_min_face_size=16) == \
+            pytest.approx(1 / 8)
+        # Huge faces would allow a tiny input; floored at MIN_DETECTION_SIZE
+        assert detection_scale(1920, 1080, auto=True, min_face_size=512, detector_min_face_size=16) == \
+            pytest.approx(MIN_DETECTION_SIZE / 1920)
+        assert detection_scale(1920, 1080, auto=True, min_face_size=48, detector_min_face_size=16) == \
+            pytest.approx(1 / 3)
+
+
+class TestResizeForDetection:
+    def test_letterbox_is_square_and_stride_aligned(self):
+        frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+        image, transform = resize_for_detection(frame, 1 / 3, letterbox=True)
+
+        assert image.shape == (640, 640, 3)
+        assert transform.pad_x == 0 and transform.pad_y == 140
+        assert image[0, 0, 0] == 114
+
+    def test_boxes_round_trip(self):
+        frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+        _, transform = resize_for_detection(frame, 1 / 3, letterbox=True)
+
+        box = transform.boxes_to_original(np.array([[100, 140 + 50, 200, 140 + 150]]))[0]
+        assert box == pytest.approx([300, 150, 600, 450], abs=1)
+
+
+class TestFaceDetectorResolution:
+    def test_full_frame_unchanged(self):
+        detector = _detector()
+        detection = detector.detect(np.zeros((480, 640, 3), dtype=np.uint8))[0]
+
+        shapes, kwargs = detector._model.calls[0]
+        assert shapes == [(480, 640, 3)] and 'imgsz' not in kwargs
+        assert (detection.bbox.x, detection.bbox.y, detection.bbox.width) == (100, 50, 100)
+
+    def test_downscaled_detections_in_frame_coordinates(self):
+        detector = _detector(detection_size=640)
+        detection = detector.detect(np.zeros((1080, 1920, 3), dtype=np.uint8))[0]
+
+        shapes, kwargs = detector._model.calls[0]
+        assert shapes == [(360, 640, 3)] and kwargs['imgsz'] == 640
+        assert (detection.bbox.x, detection.bbox.y, detection.bbox.width, detection.bbox.height) == \
+            (300, 150, 300, 300)
+        assert detection.keypoints[0] == pytest.approx([360, 240])
+
+    def test_batch_letterboxed(self):
+        detector = _detector(detection_size=640, letterbox=True)
+        frames = [np.zeros((1080, 1920, 3), dtype=np.uint8)] * 2
+
+        batch = detector.detect_batch(frames)
+
+        assert detector._model.calls[0][0] == [(640, 640, 3)] * 2
+        # y1 = 50 lies in the top padding (140 px) and is clipped to the frame
+        assert [(d[0].bbox.x, d[0].bbox.y, d[0].bbox.height) for d in batch] == [(300, 0, 30)] * 2
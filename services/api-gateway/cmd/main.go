@@ -72,6 +72,30 @@ func main() {
 	lastSaveTime := make(map[string]time.Time)
 	saveMutex := &sync.Mutex{}
 
+	// Latest participants per meeting, rebuilt from delta updates
+	snapshots := attentionSnapshots{}
+	snapshotMutex := &sync.Mutex{}
+
+	// Forget meetings that stopped publishing (ended or abandoned) so the
+	// per-meeting maps do not grow for the lifetime of the gateway
+	go func() {
+		ticker := time.NewTicker(time.Minute)
+		defer ticker.Stop()
+		for range ticker.C {
+			snapshotMutex.Lock()
+			snapshots.evictIdle(meetingIdleTimeout)
+			snapshotMutex.Unlock()
+
+			saveMutex.Lock()
+			for meetingID, lastSave := range lastSaveTime {
+				if time.Since(lastSave) > meetingIdleTimeout {
+					delete(lastSaveTime, meetingID)
+				}
+			}
+			saveMutex.Unlock()
+		}
+	}()
+
 	// Start Redis subscriber to broadcast attention results to WebSocket
 	if redisService != nil {
 		redisService.StartAttentionSubscriber(func(meetingID string, result []byte) {
@@ -81,16 +105,34 @@ func main() {
 				return
 			}
 
-			// Pipeline sends an array of face results
-			var facesArray []map[string]interface{}
-			if err := json.Unmarshal(result, &facesArray); err != nil {
-				log.Printf("Failed to unmarshal attention result: %v", err)
-				return
-			}
-
-			// Wrap in object for WebSocket broadcast
-			attentionData := map[string]interface{}{
-				"faces": facesArray,
+			// Pipeline sends an array of face results (PUBLISH_MODE=full) or a
+			// keyframe/delta update object (PUBLISH_MODE=delta)
+			var attentionData map[string]interface{}
+			var allFaces []interface{}
+			if isJSONArray(result) {
+				var facesArray []interface{}
+				if err := json.Unmarshal(result, &facesArray); err != nil {
+					log.Printf("Failed to unmarshal attention result: %v", err)
+					return
+				}
+				attentionData = map[string]interface{}{"faces": facesArray}
+				allFaces = facesArray
+			} else {
+				var update attentionUpdate
+				if err := json.Unmarshal(result, &update); err != nil {
+					log.Printf("Failed to unmarshal attention update: %v", err)
+					return
+				}
+				// Clients receive the update as is and merge it into their view
+				attentionData = map[string]interface{}{
+					"faces":   update.Participants,
+					"type":    update.Type,
+					"seq":     update.Seq,
+					"removed": update.Removed,
+				}
+				snapshotMutex.Lock()
+				allFaces = snapshots.apply(meetingID, update)
+				snapshotMutex.Unlock()
 			}
 
 			// Broadcast to WebSocket clients
@@ -106,7 +148,7 @@ func main() {
 			saveMutex.Unlock()
 
 			if shouldSave {
-				go saveAttentionMetrics(db, meetingUUID, attentionData)
+				go saveAttentionMetrics(db, meetingUUID, map[string]interface{}{"faces": allFaces})
 			}
 		})
 		log.Printf("📡 Redis subscriber started for attention results")
@@ -200,6 +242,75 @@ func main() {
 	log.Fatal(app.Listen(addr))
 }
 
+// attentionUpdate is a keyframe/delta message published by the pipeline in delta mode
+type attentionUpdate struct {
+	Type         string        `json:"type"`
+	Seq          int64         `json:"seq"`
+	Participants []interface{} `json:"participants"`
+	Removed      []string      `json:"removed"`
+}
+
+// meetingIdleTimeout is how long a meeting may go without results before its
+// per-meeting state is dropped
+const meetingIdleTimeout = 5 * time.Minute
+
+// attentionSnapshot is the current participants of a meeting by track ID
+type attentionSnapshot struct {
+	participants map[string]interface{}
+	updatedAt    time.Time
+}
+
+// attentionSnapshots holds the snapshot of each meeting
+type attentionSnapshots map[string]*attentionSnapshot
+
+// apply merges an update into the meeting's snapshot and returns all its participants
+func (s attentionSnapshots) apply(meetingID string, update attentionUpdate) []interface{} {
+	snapshot, ok := s[meetingID]
+	if !ok || update.Type == "keyframe" {
+		snapshot = &attentionSnapshot{participants: make(map[string]interface{})}
+		s[meetingID] = snapshot
+	}
+	snapshot.updatedAt = time.Now()
+	for _, trackID := range update.Removed {
+		delete(snapshot.participants, trackID)
+	}
+	for _, p := range update.Participants {
+		if participant, ok := p.(map[string]interface{}); ok {
+			trackID, _ := participant["track_id"].(string)
+			snapshot.participants[trackID] = participant
+		}
+	}
+
+	faces := make([]interface{}, 0, len(snapshot.participants))
+	for _, participant := range snapshot.participants {
+		faces = append(faces, participant)
+	}
+	return faces
+}
+
+// evictIdle drops the snapshots of meetings not updated within maxIdle
+func (s attentionSnapshots) evictIdle(maxIdle time.Duration) {
+	for meetingID, snapshot := range s {
+		if time.Since(snapshot.updatedAt) > maxIdle {
+			delete(s, meetingID)
+		}
+	}
+}
+
+// isJSONArray reports whether a JSON payload is an array
+func isJSONArray(data []byte) bool {
+	for _, c := range data {
+		switch c {
+		case ' ', '\t', '\n', '\r':
+			continue
+		case '[':
+			return true
+		}
+		return false
+	}
+	return false
+}
+
 // saveAttentionMetrics saves attention data to database
 func saveAttentionMetrics(db *gorm.DB, meetingID uuid.UUID, data map[string]interface{}) {
 	// Handle "faces" key (from Redis broadcast) or "participants" key
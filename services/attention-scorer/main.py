@@ -6,6 +6,7 @@ Combines head pose, gaze, blink metrics into attention score.
 """
 
 import os
+import sys
 import grpc
 from concurrent import futures
 import numpy as np
@@ -16,12 +17,29 @@ from dataclasses import dataclass, field
 from collections import deque
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse
 from typing import List, Dict, Any
+from pathlib import Path
 import uvicorn
 
+# Shared service helpers (services/common, copied to /app/common in images)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.deadline import enforce_deadlines
+from common.metrics import ServiceMetrics, instrument_app
+from common.tracing import Tracer
+from common.track_state import TrackStateStore
+
 
 app = FastAPI(title="Attention Scorer Service", version="1.0.0")
 
+# Stage latencies (scoring) and counters
+metrics = ServiceMetrics('attention_scorer', {
+    'faces': "Faces scored",
+    'alerts': "Alerts raised, by type",
+}, tracer=Tracer.from_env('attention-scorer'))
+instrument_app(app, metrics)
+enforce_deadlines(app, metrics)
+
 
 class HeadPoseInput(BaseModel):
     yaw: float = 0
@@ -43,6 +61,7 @@ class BlinkInput(BaseModel):
 
 class ScoreRequest(BaseModel):
     track_id: str = "0"
+    meeting_id: str = ""
     head_pose: HeadPoseInput = HeadPoseInput()
     gaze: GazeInput = GazeInput()
     blink: BlinkInput = BlinkInput()
@@ -57,6 +76,17 @@ class ScoreResponse(BaseModel):
     error: str = ""
 
 
+class BatchScoreRequest(BaseModel):
+    requests: List[ScoreRequest]  # One per face in the frame
+    meeting_id: str = ""  # Applies to requests without their own meeting_id
+    request_id: str = ""
+
+
+class BatchScoreResponse(BaseModel):
+    responses: List[ScoreResponse]  # One per face, in request order
+    request_id: str = ""
+
+
 servicer_instance = None
 
 
@@ -89,19 +119,16 @@ class AttentionScorerServicer:
         self.low_attention_threshold = 50.0
         self.alert_cooldown = 30.0  # seconds
         
-        self.participant_states: dict[str, ParticipantState] = {}
+        # Per-participant state keyed by (meeting_id, track_id), bounded by LRU and idle TTL
+        self.participant_states: TrackStateStore[ParticipantState] = TrackStateStore.from_env(ParticipantState)
     
     def CalculateScore(self, request, context):
         """Calculate attention score from metrics."""
         try:
             start_time = time.time()
             
-            track_id = request.track_id
-            
             # Get or create state
-            if track_id not in self.participant_states:
-                self.participant_states[track_id] = ParticipantState()
-            state = self.participant_states[track_id]
+            state = self.participant_states.get(getattr(request, 'meeting_id', ''), request.track_id)
             
             # Extract metrics
             head_pose = request.head_pose
@@ -162,6 +189,10 @@ class AttentionScorerServicer:
                 })
             
             processing_time = (time.time() - start_time) * 1000
+            metrics.observe('inference', processing_time / 1000)
+            metrics.inc('faces')
+            for alert in alerts:
+                metrics.inc('alerts', type=alert['type'])
             
             return {
                 'request_id': request.request_id,
@@ -183,6 +214,89 @@ class AttentionScorerServicer:
             logger.error(f"Attention scoring error: {e}")
             return self._error_response(request.request_id, str(e))
     
+    def score_batch(self, requests: List[Any], meeting_id: str = "") -> List[Dict]:
+        """Score every face of a frame in one vectorized pass.
+
+        Component scores are computed for all faces at once; smoothing and
+        alerting then update each participant's state in request order.
+        Alerts follow the REST /score endpoint this replaces in the
+        orchestrator: LOW_ATTENTION on every frame once 10 consecutive
+        frames are low, without the gRPC path's cooldown.
+
+        Args:
+            requests: Objects with track_id, head_pose, gaze and blink fields
+                (ScoreRequest models or gRPC messages)
+            meeting_id: Meeting of requests that do not carry their own
+
+        Returns:
+            Score dict per request, in request order
+        """
+        if not requests:
+            return []
+        inference_start = time.perf_counter()
+
+        yaw = np.array([r.head_pose.yaw for r in requests], dtype=np.float64)
+        pitch = np.array([r.head_pose.pitch for r in requests], dtype=np.float64)
+        gaze_x = np.array([r.gaze.gaze_x for r in requests], dtype=np.float64)
+        looking = np.array([r.gaze.is_looking_at_camera for r in requests], dtype=bool)
+        avg_ear = np.array([r.blink.avg_ear for r in requests], dtype=np.float64)
+        perclos = np.array([r.blink.perclos for r in requests], dtype=np.float64)
+
+        yaw_score = np.maximum(0, 1 - np.abs(yaw) / self.yaw_threshold)
+        pitch_score = np.maximum(0, 1 - np.abs(pitch) / self.pitch_threshold)
+        head_score = (yaw_score + pitch_score) / 2
+
+        gaze_score = np.where(looking, 1.0, np.maximum(0, 1 - np.abs(gaze_x) / 0.5))
+
+        ear_normalized = np.where(avg_ear > 0, np.minimum(1, avg_ear / 0.3), 0)
+        eye_score = (ear_normalized + (1 - perclos / 100)) / 2
+
+        presence_score = 1.0
+        raw_scores = (
+            self.weights['gaze'] * gaze_score +
+            self.weights['head_pose'] * head_score +
+            self.weights['eye_openness'] * eye_score +
+            self.weights['presence'] * presence_score
+        ) * 100
+
+        results = []
+        for i, request in enumerate(requests):
+            state = self.participant_states.get(getattr(request, 'meeting_id', '') or meeting_id, request.track_id)
+
+            state.score_history.append(float(raw_scores[i]))
+            smoothed_score = float(np.mean(state.score_history))
+
+            alerts = []
+            if smoothed_score < self.low_attention_threshold:
+                state.consecutive_low += 1
+                if state.consecutive_low >= 10:  # 10 consecutive low frames
+                    alerts.append({'type': 'LOW_ATTENTION', 'message': 'Low attention detected', 'severity': 'warning'})
+            else:
+                state.consecutive_low = 0
+
+            if request.blink.is_drowsy:
+                alerts.append({'type': 'DROWSINESS', 'message': 'Drowsiness detected', 'severity': 'critical'})
+
+            results.append({
+                'request_id': request.request_id,
+                'attention_score': smoothed_score,
+                'raw_score': float(raw_scores[i]),
+                'component_scores': {
+                    'gaze': float(gaze_score[i]),
+                    'head_pose': float(head_score[i]),
+                    'eye_openness': float(eye_score[i]),
+                    'presence': presence_score
+                },
+                'alerts': alerts,
+                'success': True,
+                'error': ''
+            })
+            for alert in alerts:
+                metrics.inc('alerts', type=alert['type'])
+        metrics.observe('inference', time.perf_counter() - inference_start)
+        metrics.inc('faces', len(requests))
+        return results
+
     def Health(self, request, context):
         """Health check."""
         return {'healthy': True, 'version': self.version}
@@ -202,6 +316,25 @@ def health():
     return {"healthy": servicer_instance is not None, "version": "1.0.0"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus metrics endpoint."""
+    global servicer_instance
+    lines = metrics.prometheus_lines()
+    if servicer_instance is not None:
+        lines += servicer_instance.participant_states.prometheus_lines("scorer_participant_state")
+    return "\n".join(lines) + "\n"
+
+
+@app.delete("/meetings/{meeting_id}")
+def end_meeting(meeting_id: str):
+    """Drop the participant state of a finished meeting."""
+    global servicer_instance
+    if servicer_instance is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    return {"removed": servicer_instance.participant_states.remove_meeting(meeting_id)}
+
+
 @app.post("/score", response_model=ScoreResponse)
 def score(request: ScoreRequest):
     global servicer_instance
@@ -209,10 +342,8 @@ def score(request: ScoreRequest):
         raise HTTPException(status_code=503, detail="Service not ready")
 
     try:
-        track_id = request.track_id
-        if track_id not in servicer_instance.participant_states:
-            servicer_instance.participant_states[track_id] = ParticipantState()
-        state = servicer_instance.participant_states[track_id]
+        start = time.perf_counter()
+        state = servicer_instance.participant_states.get(request.meeting_id, request.track_id)
 
         head_pose = request.head_pose
         gaze = request.gaze
@@ -252,12 +383,38 @@ def score(request: ScoreRequest):
         if blink.is_drowsy:
             alerts.append({'type': 'DROWSINESS', 'message': 'Drowsiness detected', 'severity': 'critical'})
 
+        metrics.observe('inference', time.perf_counter() - start)
+        metrics.inc('faces')
+        for alert in alerts:
+            metrics.inc('alerts', type=alert['type'])
         return ScoreResponse(attention_score=smoothed_score, alerts=alerts, request_id=request.request_id)
     except Exception as e:
         return ScoreResponse(attention_score=75.0, alerts=[], request_id=request.request_id,
                             success=False, error=str(e))
 
 
+@app.post("/score-batch", response_model=BatchScoreResponse)
+def score_batch(request: BatchScoreRequest):
+    """Score all faces of a frame, returned in request order."""
+    global servicer_instance
+    if servicer_instance is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+
+    try:
+        results = servicer_instance.score_batch(request.requests, request.meeting_id)
+    except Exception as e:
+        return BatchScoreResponse(responses=[
+            ScoreResponse(attention_score=75.0, alerts=[], request_id=r.request_id,
+                          success=False, error=str(e))
+            for r in request.requests
+        ], request_id=request.request_id)
+
+    return BatchScoreResponse(responses=[
+        ScoreResponse(attention_score=r['attention_score'], alerts=r['alerts'], request_id=r['request_id'])
+        for r in results
+    ], request_id=request.request_id)
+
+
 def run_rest_server(port: int):
     uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
 
@@ -114,6 +114,81 @@ class TestAttentionScorerServicer:
         assert result['attention']['score'] == 0
 
 
+class TestBatchScore:
+    """Tests for multi-face batch scoring."""
+
+    @staticmethod
+    def _request(track_id, yaw=0.0, gaze_x=0.0, looking=True, drowsy=False):
+        from main import ScoreRequest
+        return ScoreRequest(
+            track_id=track_id, request_id=f"req-{track_id}",
+            head_pose={'yaw': yaw, 'pitch': 0.0, 'roll': 0.0},
+            gaze={'gaze_x': gaze_x, 'is_looking_at_camera': looking},
+            blink={'avg_ear': 0.3, 'perclos': 0.0, 'is_drowsy': drowsy}
+        )
+
+    def test_batch_matches_single(self, servicer):
+        """Batch scores match the single-face /score endpoint, in order."""
+        import main
+        from fastapi.testclient import TestClient
+
+        requests = [self._request("0"), self._request("1", yaw=20.0, gaze_x=0.4, looking=False)]
+        results = servicer.score_batch(requests)
+
+        main.servicer_instance = AttentionScorerServicer()
+        client = TestClient(main.app)
+        for request, result in zip(requests, results):
+            single = client.post("/score", json=request.model_dump()).json()
+            assert result['request_id'] == request.request_id
+            assert result['attention_score'] == pytest.approx(single['attention_score'])
+        assert results[0]['attention_score'] > results[1]['attention_score']
+
+    def test_batch_alerts_and_state(self, servicer):
+        """Drowsiness alerts are per face and history is kept per track."""
+        results = servicer.score_batch([self._request("0"), self._request("1", drowsy=True)])
+
+        assert results[0]['alerts'] == []
+        assert results[1]['alerts'][0]['type'] == 'DROWSINESS'
+        assert ("", "0") in servicer.participant_states and ("", "1") in servicer.participant_states
+
+    def test_batch_alerts_match_single_across_frames(self, servicer):
+        """LOW_ATTENTION alerts over consecutive frames match /score (frequency and text)."""
+        import main
+        from fastapi.testclient import TestClient
+
+        main.servicer_instance = AttentionScorerServicer()
+        client = TestClient(main.app)
+        away = self._request("0", yaw=60.0, gaze_x=0.5, looking=False)
+        away.head_pose.pitch = 40.0
+
+        for frame in range(14):
+            batch_alerts = servicer.score_batch([away])[0]['alerts']
+            single_alerts = client.post("/score", json=away.model_dump()).json()['alerts']
+            assert batch_alerts == single_alerts, f"frame {frame}"
+
+        assert batch_alerts == [{'type': 'LOW_ATTENTION', 'message': 'Low attention detected', 'severity': 'warning'}]
+
+    def test_batch_state_is_meeting_scoped(self, servicer):
+        """The batch meeting id scopes participant state."""
+        servicer.score_batch([self._request("0")], meeting_id="m1")
+        servicer.score_batch([self._request("0")], meeting_id="m2")
+
+        assert len(servicer.participant_states.peek("m1", "0").score_history) == 1
+        assert len(servicer.participant_states.peek("m2", "0").score_history) == 1
+
+    def test_rest_batch_endpoint(self, servicer):
+        """POST /score-batch returns one response per request."""
+        import main
+        from fastapi.testclient import TestClient
+
+        main.servicer_instance = servicer
+        body = {'requests': [self._request(str(i)).model_dump() for i in range(3)]}
+        response = TestClient(main.app).post("/score-batch", json=body)
+
+        assert response.status_code == 200
+        assert [r['request_id'] for r in response.json()['responses']] == ["req-0", "req-1", "req-2"]
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
@@ -6,6 +6,7 @@ Tracks blink patterns and calculates PERCLOS metric.
 """
 
 import os
+import sys
 import grpc
 from concurrent import futures
 import numpy as np
@@ -15,17 +16,36 @@ from loguru import logger
 from collections import deque
 from dataclasses import dataclass, field
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+from pathlib import Path
 import uvicorn
 
+# Shared service helpers (services/common, copied to /app/common in images)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.deadline import enforce_deadlines
+from common.grpc_support import add_servicer
+from common.metrics import ServiceMetrics, instrument_app
+from common.tracing import Tracer
+from common.track_state import TrackStateStore
+
 
 app = FastAPI(title="Blink Detection Service", version="1.0.0")
 
+# Stage latencies (landmark conversion, inference, serialization) and counters
+metrics = ServiceMetrics('blink_detection', {
+    'faces': "Faces analyzed",
+    'blinks': "Completed blinks detected",
+}, tracer=Tracer.from_env('blink-detection'))
+instrument_app(app, metrics)
+enforce_deadlines(app, metrics)
+
 
 class DetectRequest(BaseModel):
     landmarks: List[Dict[str, Any]]
     track_id: str = "0"
+    meeting_id: str = ""
     request_id: str = ""
 
 
@@ -40,6 +60,22 @@ class DetectResponse(BaseModel):
     error: str = ""
 
 
+class BatchFace(BaseModel):
+    landmarks: List[Dict[str, Any]]
+    track_id: str = "0"
+
+
+class BatchDetectRequest(BaseModel):
+    faces: List[BatchFace]  # Every face in the frame
+    meeting_id: str = ""
+    request_id: str = ""
+
+
+class BatchDetectResponse(BaseModel):
+    responses: List[DetectResponse]  # One per face, in request order
+    request_id: str = ""
+
+
 servicer_instance = None
 
 
@@ -48,6 +84,16 @@ LEFT_EYE = [362, 385, 387, 263, 373, 380]
 RIGHT_EYE = [33, 160, 158, 133, 153, 144]
 
 
+def calculate_ear_batch(eye_points: np.ndarray) -> np.ndarray:
+    """Eye Aspect Ratio for (N, 6, 2) eye points; 0.0 where undefined."""
+    v1 = np.linalg.norm(eye_points[:, 1] - eye_points[:, 5], axis=1)
+    v2 = np.linalg.norm(eye_points[:, 2] - eye_points[:, 4], axis=1)
+    h = np.linalg.norm(eye_points[:, 0] - eye_points[:, 3], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ear = (v1 + v2) / (2.0 * h)
+    return np.where(np.isfinite(ear) & (h > 0), ear, 0.0)
+
+
 @dataclass
 class TrackState:
     """State for a tracked face."""
@@ -67,7 +113,8 @@ class BlinkDetectionServicer:
         self.ear_threshold = 0.21
         self.consecutive_frames = 2
         self.perclos_threshold = 0.8
-        self.track_states: dict[str, TrackState] = {}
+        # Per-track state keyed by (meeting_id, track_id), bounded by LRU and idle TTL
+        self.track_states: TrackStateStore[TrackState] = TrackStateStore.from_env(TrackState)
     
     def _calculate_ear(self, landmarks: dict, eye_indices: list) -> float:
         """Calculate Eye Aspect Ratio."""
@@ -93,13 +140,10 @@ class BlinkDetectionServicer:
         try:
             start_time = time.time()
             
-            track_id = request.track_id
             landmarks = {lm.index: (lm.x, lm.y, lm.z) for lm in request.landmarks}
             
             # Get or create track state
-            if track_id not in self.track_states:
-                self.track_states[track_id] = TrackState()
-            state = self.track_states[track_id]
+            state = self.track_states.get(getattr(request, 'meeting_id', ''), request.track_id)
             
             # Calculate EAR for both eyes
             left_ear = self._calculate_ear(landmarks, LEFT_EYE)
@@ -120,6 +164,7 @@ class BlinkDetectionServicer:
                 if state.is_eye_closed:
                     state.blink_count += 1
                     state.last_blink_time = time.time()
+                    metrics.inc('blinks')
                 state.is_eye_closed = False
                 state.closed_frames = 0
             
@@ -138,6 +183,8 @@ class BlinkDetectionServicer:
             blink_rate = (state.blink_count / elapsed * 60) if elapsed > 0 else 0
             
             processing_time = (time.time() - start_time) * 1000
+            metrics.observe('inference', processing_time / 1000)
+            metrics.inc('faces')
             
             return {
                 'request_id': request.request_id,
@@ -160,10 +207,76 @@ class BlinkDetectionServicer:
             logger.error(f"Blink detection error: {e}")
             return self._error_response(request.request_id, str(e))
     
+    def detect_batch(self, faces: List[Tuple[str, Dict[int, tuple]]], meeting_id: str = "") -> List[Dict]:
+        """Analyze blinks for every face of a frame in one vectorized pass.
+
+        EAR is computed for all faces at once; per-track state is then
+        updated in request order.
+
+        Args:
+            faces: (track_id, landmark index -> (x, y, z)) per face
+            meeting_id: Meeting the tracks belong to
+
+        Returns:
+            Blink dict per face, in request order
+        """
+        if not faces:
+            return []
+        inference_start = time.perf_counter()
+
+        eye_indices = LEFT_EYE + RIGHT_EYE
+        points = np.full((len(faces), len(eye_indices), 2), np.nan)
+        for row, (_, landmarks) in enumerate(faces):
+            for col, idx in enumerate(eye_indices):
+                if idx in landmarks:
+                    points[row, col] = landmarks[idx][:2]
+
+        left_ears = calculate_ear_batch(points[:, :6])
+        right_ears = calculate_ear_batch(points[:, 6:])
+        # Matches _calculate_ear: an eye with missing landmarks scores 0
+        avg_ears = (left_ears + right_ears) / 2
+
+        now = time.time()
+        results = []
+        for (track_id, _), left_ear, right_ear, avg_ear in zip(faces, left_ears, right_ears, avg_ears):
+            state = self.track_states.get(meeting_id, track_id)
+
+            state.ear_history.append(float(avg_ear))
+            is_blinking = bool(avg_ear < self.ear_threshold)
+
+            if is_blinking:
+                state.closed_frames += 1
+                if not state.is_eye_closed and state.closed_frames >= self.consecutive_frames:
+                    state.is_eye_closed = True
+            else:
+                if state.is_eye_closed:
+                    state.blink_count += 1
+                    state.last_blink_time = now
+                    metrics.inc('blinks')
+                state.is_eye_closed = False
+                state.closed_frames = 0
+
+            history = np.fromiter(state.ear_history, dtype=np.float64)
+            perclos = float((history < self.ear_threshold).mean() * 100) if len(history) else 0.0
+            elapsed = now - state.start_time
+
+            results.append({
+                'left_ear': float(left_ear),
+                'right_ear': float(right_ear),
+                'avg_ear': float(avg_ear),
+                'perclos': perclos,
+                'is_blinking': is_blinking,
+                'is_drowsy': perclos > (self.perclos_threshold * 100),
+                'blink_count': state.blink_count,
+                'blink_rate': float(state.blink_count / elapsed * 60) if elapsed > 0 else 0.0
+            })
+        metrics.observe('inference', time.perf_counter() - inference_start)
+        metrics.inc('faces', len(faces))
+        return results
+
     def ResetTrack(self, request, context):
         """Reset state for a track."""
-        if request.track_id in self.track_states:
-            del self.track_states[request.track_id]
+        self.track_states.remove(getattr(request, 'meeting_id', ''), request.track_id)
         return {'success': True}
     
     def Health(self, request, context):
@@ -186,6 +299,25 @@ def health():
     return {"healthy": servicer_instance is not None, "version": "1.0.0"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus metrics endpoint."""
+    global servicer_instance
+    lines = metrics.prometheus_lines()
+    if servicer_instance is not None:
+        lines += servicer_instance.track_states.prometheus_lines("blink_track_state")
+    return "\n".join(lines) + "\n"
+
+
+@app.delete("/meetings/{meeting_id}")
+def end_meeting(meeting_id: str):
+    """Drop the track state of a finished meeting."""
+    global servicer_instance
+    if servicer_instance is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    return {"removed": servicer_instance.track_states.remove_meeting(meeting_id)}
+
+
 @app.post("/detect", response_model=DetectResponse)
 def detect(request: DetectRequest):
     global servicer_instance
@@ -193,12 +325,11 @@ def detect(request: DetectRequest):
         raise HTTPException(status_code=503, detail="Service not ready")
 
     try:
+        start = time.perf_counter()
         landmarks = {lm['index']: (lm['x'], lm['y'], lm.get('z', 0)) for lm in request.landmarks}
-        track_id = request.track_id
-
-        if track_id not in servicer_instance.track_states:
-            servicer_instance.track_states[track_id] = TrackState()
-        state = servicer_instance.track_states[track_id]
+        converted = time.perf_counter()
+        metrics.observe('landmark_conversion', converted - start)
+        state = servicer_instance.track_states.get(request.meeting_id, request.track_id)
 
         # Calculate EAR
         left_ear = servicer_instance._calculate_ear(landmarks, LEFT_EYE)
@@ -215,6 +346,7 @@ def detect(request: DetectRequest):
         else:
             if state.is_eye_closed:
                 state.blink_count += 1
+                metrics.inc('blinks')
             state.is_eye_closed = False
             state.closed_frames = 0
 
@@ -226,6 +358,8 @@ def detect(request: DetectRequest):
             perclos = 0
 
         is_drowsy = perclos > (servicer_instance.perclos_threshold * 100)
+        metrics.observe('inference', time.perf_counter() - converted)
+        metrics.inc('faces')
 
         return DetectResponse(
             avg_ear=float(avg_ear), perclos=float(perclos), is_drowsy=is_drowsy,
@@ -237,6 +371,37 @@ def detect(request: DetectRequest):
                              request_id=request.request_id, success=False, error=str(e))
 
 
+@app.post("/detect-batch", response_model=BatchDetectResponse)
+def detect_batch(request: BatchDetectRequest):
+    """Detect blinks for all faces of a frame, returned in request order."""
+    global servicer_instance
+    if servicer_instance is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+
+    try:
+        with metrics.time('landmark_conversion'):
+            faces = [
+                (face.track_id, {lm['index']: (lm['x'], lm['y'], lm.get('z', 0)) for lm in face.landmarks})
+                for face in request.faces
+            ]
+        blinks = servicer_instance.detect_batch(faces, request.meeting_id)
+    except Exception as e:
+        return BatchDetectResponse(responses=[
+            DetectResponse(avg_ear=0.25, perclos=0, is_drowsy=False,
+                           request_id=request.request_id, success=False, error=str(e))
+            for _ in request.faces
+        ], request_id=request.request_id)
+
+    return BatchDetectResponse(responses=[
+        DetectResponse(
+            avg_ear=blink['avg_ear'], perclos=blink['perclos'], is_drowsy=blink['is_drowsy'],
+            is_blinking=blink['is_blinking'], blink_count=blink['blink_count'],
+            request_id=request.request_id
+        )
+        for blink in blinks
+    ], request_id=request.request_id)
+
+
 def run_rest_server(port: int):
     uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
 
@@ -250,6 +415,7 @@ def serve(grpc_port: int = 50056, rest_port: int = 8056):
     logger.info(f"🌐 REST API on port {rest_port}")
 
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    add_servicer(server, servicer_instance, 'blink_detection', 'BlinkDetectionService', metrics=metrics)
     server.add_insecure_port(f'[::]:{grpc_port}')
     server.start()
     logger.info(f"😴 Blink Detection Service started (gRPC: {grpc_port})")
@@ -7,7 +7,7 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
 
-from main import BlinkDetectionServicer
+from main import BlinkDetectionServicer, TrackState
 
 
 @pytest.fixture
@@ -125,6 +125,108 @@ class TestBlinkDetectionServicer:
         assert result['success'] == False
 
 
+class TestBatchDetect:
+    """Tests for multi-face batch blink detection."""
+
+    @staticmethod
+    def _as_map(landmarks):
+        return {i: (lm.x, lm.y, lm.z) for i, lm in enumerate(landmarks)}
+
+    def test_batch_matches_single(self, servicer, mock_landmarks_open_eyes, mock_landmarks_closed_eyes):
+        """Batch EAR matches _calculate_ear for each face, in request order."""
+        faces = [("a", self._as_map(mock_landmarks_open_eyes)),
+                 ("b", self._as_map(mock_landmarks_closed_eyes)),
+                 ("c", {})]
+        results = servicer.detect_batch(faces)
+
+        assert len(results) == 3
+        for (_, landmarks), result in zip(faces[:2], results):
+            left = servicer._calculate_ear(landmarks, [362, 385, 387, 263, 373, 380])
+            right = servicer._calculate_ear(landmarks, [33, 160, 158, 133, 153, 144])
+            assert result['avg_ear'] == pytest.approx((left + right) / 2)
+        assert results[2]['avg_ear'] == 0.0
+
+    def test_batch_keeps_per_track_state(self, servicer, mock_landmarks_open_eyes):
+        """Each face in a batch updates its own track state."""
+        face = self._as_map(mock_landmarks_open_eyes)
+        for _ in range(3):
+            servicer.detect_batch([("a", face), ("b", face)])
+
+        assert len(servicer.track_states.peek("", "a").ear_history) == 3
+        assert len(servicer.track_states.peek("", "b").ear_history) == 3
+
+    def test_state_is_meeting_scoped(self, servicer, mock_landmarks_open_eyes):
+        """The same track id in two meetings has separate state."""
+        face = self._as_map(mock_landmarks_open_eyes)
+        servicer.detect_batch([("0", face)], meeting_id="m1")
+        servicer.detect_batch([("0", face)], meeting_id="m1")
+        servicer.detect_batch([("0", face)], meeting_id="m2")
+
+        assert len(servicer.track_states.peek("m1", "0").ear_history) == 2
+        assert len(servicer.track_states.peek("m2", "0").ear_history) == 1
+
+    def test_metrics_and_meeting_end(self, servicer, mock_landmarks_open_eyes):
+        """/metrics reports the track store; DELETE /meetings drops a meeting's tracks."""
+        import main
+        from fastapi.testclient import TestClient
+
+        main.servicer_instance = servicer
+        servicer.detect_batch([("0", self._as_map(mock_landmarks_open_eyes))], meeting_id="m1")
+        client = TestClient(main.app)
+
+        assert "blink_track_state_entries 1" in client.get("/metrics").text
+        assert client.delete("/meetings/m1").json() == {"removed": 1}
+        assert "blink_track_state_entries 0" in client.get("/metrics").text
+
+    def test_rest_batch_endpoint(self, servicer, mock_landmarks_open_eyes):
+        """POST /detect-batch returns one response per face."""
+        import main
+        from fastapi.testclient import TestClient
+
+        main.servicer_instance = servicer
+        landmarks = [{'index': i, 'x': lm.x, 'y': lm.y} for i, lm in enumerate(mock_landmarks_open_eyes)]
+        response = TestClient(main.app).post("/detect-batch", json={
+            'faces': [{'landmarks': landmarks, 'track_id': "0"}, {'landmarks': landmarks, 'track_id': "1"}]
+        })
+
+        assert response.status_code == 200
+        assert len(response.json()['responses']) == 2
+
+
+class TestTrackStateStore:
+    """Tests for the bounded, meeting-scoped track state store."""
+
+    def test_lru_eviction(self):
+        """The least recently used track is evicted at the entry cap."""
+        from common.track_state import TrackStateStore
+
+        store = TrackStateStore(TrackState, max_entries=2, ttl_seconds=0)
+        a = store.get("m", "a")
+        store.get("m", "b")
+        assert store.get("m", "a") is a  # touch "a"
+        store.get("m", "c")
+
+        assert ("m", "b") not in store and ("m", "a") in store
+        assert store.stats()['evicted_lru_total'] == 1
+
+    def test_idle_expiry(self, monkeypatch):
+        """Tracks idle past the TTL are expired on the next access."""
+        from common import track_state
+        from common.track_state import TrackStateStore
+
+        now = [1000.0]
+        monkeypatch.setattr(track_state.time, 'monotonic', lambda: now[0])
+        store = TrackStateStore(TrackState, ttl_seconds=60, sweep_interval=0)
+        store.get("m1", "0")
+        now[0] += 30
+        store.get("m2", "0")
+        now[0] += 40
+        store.get("m2", "1")
+
+        assert ("m1", "0") not in store and ("m2", "0") in store
+        assert store.stats()['expired_total'] == 1
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
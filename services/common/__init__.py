@@ -0,0 +1,5 @@
+"""
+Shared helpers for the attention detection microservices.
+
+Copied into each service image as the ``common`` package.
+"""
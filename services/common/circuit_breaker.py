@@ -0,0 +1,202 @@
+"""
+Per-service circuit breakers.
+
+The orchestrator keeps one breaker per downstream service. A breaker looks
+at the service's most recent calls and opens when too many of them failed
+or were slow; while open, calls are rejected immediately (``CircuitOpen``)
+so a sick service costs a frame nothing instead of its whole timeout, and
+the caller answers from an in-process fallback. After a cool-down the
+breaker lets a few probe calls through (half-open): if they succeed in time
+the circuit closes again, otherwise it reopens.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+from loguru import logger
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Gauge values of the state metric
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpen(Exception):
+    """The service's circuit is open; the call was not made."""
+
+    def __init__(self, service: str):
+        super().__init__(f"{service} circuit open")
+        self.service = service
+
+
+class CircuitBreaker:
+    """Thread-safe breaker over a sliding window of a service's recent calls.
+
+    Args:
+        service: Service name, used in errors and metrics
+        window: Number of recent calls the rates are computed over
+        min_calls: Calls needed in the window before the breaker can open
+        failure_rate: Fraction of failed calls that opens the breaker
+        slow_call_seconds: Calls taking longer than this count as slow
+        slow_call_rate: Fraction of slow calls that opens the breaker
+        open_seconds: How long calls are rejected before probing
+        half_open_probes: Successful probes needed to close again
+        clock: Monotonic time source
+    """
+
+    def __init__(
+        self,
+        service: str,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 1.0,
+        slow_call_rate: float = 0.5,
+        open_seconds: float = 5.0,
+        half_open_probes: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.service = service
+        self.min_calls = max(1, min_calls)
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self.clock = clock
+
+        self._calls: deque = deque(maxlen=max(self.min_calls, window))  # (failed, slow)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+        self.opened_total = 0
+        self.rejected_total = 0
+
+    @classmethod
+    def from_env(cls, service: str) -> "CircuitBreaker":
+        """Breaker configured from CIRCUIT_* environment variables."""
+        return cls(
+            service,
+            window=int(os.getenv('CIRCUIT_WINDOW', '20')),
+            min_calls=int(os.getenv('CIRCUIT_MIN_CALLS', '5')),
+            failure_rate=float(os.getenv('CIRCUIT_FAILURE_RATE', '0.5')),
+            slow_call_seconds=float(os.getenv('CIRCUIT_SLOW_CALL_SECONDS', '1.0')),
+            slow_call_rate=float(os.getenv('CIRCUIT_SLOW_CALL_RATE', '0.5')),
+            open_seconds=float(os.getenv('CIRCUIT_OPEN_SECONDS', '5')),
+            half_open_probes=int(os.getenv('CIRCUIT_HALF_OPEN_PROBES', '1')),
+        )
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self.clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may be made now; in half-open state this claims a probe slot.
+
+        Every allowed call must be followed by ``record``, or by ``release``
+        if it was not made after all.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes_in_flight + self._probe_successes < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            self.rejected_total += 1
+            return False
+
+    def check(self) -> None:
+        """Claim a call like ``allow``.
+
+        Raises:
+            CircuitOpen: If the call is rejected
+        """
+        if not self.allow():
+            raise CircuitOpen(self.service)
+
+    def record(self, failed: bool, seconds: float) -> None:
+        """Report the outcome of an allowed call."""
+        slow = seconds > self.slow_call_seconds
+        with self._lock:
+            state = self._current_state()
+            if state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if failed or slow:
+                    self._open()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_probes:
+                        self._state = CLOSED
+                        self._calls.clear()
+                        logger.info(f"{self.service} circuit closed")
+            elif state == CLOSED:
+                self._calls.append((failed, slow))
+                if len(self._calls) >= self.min_calls and self._tripped():
+                    self._open()
+            # Outcomes of calls started before the breaker opened are ignored
+
+    def release(self) -> None:
+        """Return the claim of an allowed call that was never made."""
+        with self._lock:
+            if self._current_state() == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _tripped(self) -> bool:
+        calls = len(self._calls)
+        failures = sum(1 for failed, _ in self._calls if failed)
+        slow = sum(1 for _, is_slow in self._calls if is_slow)
+        return failures / calls >= self.failure_rate or slow / calls >= self.slow_call_rate
+
+    def _open(self) -> None:
+        self._state = OPEN
+        self._opened_at = self.clock()
+        self._calls.clear()
+        self.opened_total += 1
+        logger.warning(f"{self.service} circuit open for {self.open_seconds:g}s")
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._calls.clear()
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+
+
+def prometheus_lines(prefix: str, breakers: Dict[str, CircuitBreaker]) -> List[str]:
+    """State and counters of a set of breakers, labelled by service."""
+    lines = [
+        f"# HELP {prefix}_circuit_state Circuit state by service (0 closed, 1 half-open, 2 open)",
+        f"# TYPE {prefix}_circuit_state gauge",
+    ]
+    lines += [f'{prefix}_circuit_state{{service="{name}"}} {STATE_VALUES[b.state]}'
+              for name, b in breakers.items()]
+    lines += [
+        f"# HELP {prefix}_circuit_opened_total Times the circuit opened, by service",
+        f"# TYPE {prefix}_circuit_opened_total counter",
+    ]
+    lines += [f'{prefix}_circuit_opened_total{{service="{name}"}} {b.opened_total}'
+              for name, b in breakers.items()]
+    lines += [
+        f"# HELP {prefix}_circuit_rejected_total Calls rejected by an open circuit, by service",
+        f"# TYPE {prefix}_circuit_rejected_total counter",
+    ]
+    lines += [f'{prefix}_circuit_rejected_total{{service="{name}"}} {b.rejected_total}'
+              for name, b in breakers.items()]
+    return lines
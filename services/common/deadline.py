@@ -0,0 +1,128 @@
+"""
+Per-frame deadlines.
+
+The orchestrator gives every frame a deadline at ingress and passes the
+remaining budget to each downstream call: as the ``X-Deadline-Ms`` header
+(milliseconds left, relative so host clocks need not agree) on REST and as
+the call deadline on gRPC. Services refuse requests that arrive with no
+budget left and check ``expired()`` before expensive stages, so a frame
+the client has given up on stops consuming capacity. Retries are allowed
+only while the budget can still absorb the backoff.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+DEADLINE_HEADER = 'X-Deadline-Ms'
+
+# Monotonic time by which the current request must be done
+_deadline: ContextVar[Optional[float]] = ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The current request's deadline has passed."""
+
+    def __init__(self, message: str = "Deadline exceeded"):
+        super().__init__(message)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the current deadline (negative once past), None without one."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def time_left() -> Optional[float]:
+    """Seconds left, for use as a call timeout; None without a deadline (no timeout).
+
+    Raises:
+        DeadlineExceeded: If there is a deadline and it has passed
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+    return left
+
+
+@contextmanager
+def scope(seconds: Optional[float]) -> Iterator[None]:
+    """Run the enclosed block with at most ``seconds`` left (never extends an outer deadline)."""
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def header(timeout: Optional[float]) -> Dict[str, str]:
+    """Header carrying a call's budget to the service; none without a budget."""
+    if timeout is None:
+        return {}
+    return {DEADLINE_HEADER: str(max(0, int(timeout * 1000)))}
+
+
+def parse_budget(value: Optional[str]) -> Optional[float]:
+    """Budget in seconds from an ``X-Deadline-Ms`` header, None if absent or malformed."""
+    if not value:
+        return None
+    try:
+        return float(value) / 1000
+    except ValueError:
+        return None
+
+
+def retry_delay(attempt: int, backoff: float, min_budget: float) -> Optional[float]:
+    """Backoff before retry number ``attempt`` (0-based), or None if the budget cannot afford it.
+
+    A retry is worth it only if, after the exponential backoff, at least
+    ``min_budget`` seconds remain for the call itself.
+    """
+    delay = backoff * (2 ** attempt)
+    left = remaining()
+    if left is None or left - delay < min_budget:
+        return None
+    return delay
+
+
+def enforce_deadlines(app, metrics: Any = None) -> None:
+    """Apply the ``X-Deadline-Ms`` budget of each REST request of a FastAPI app.
+
+    Requests arriving with no budget left are refused with 504 before any
+    work is done; otherwise the handler runs within the budget, and a
+    ``DeadlineExceeded`` it raises also answers 504. With ``metrics``,
+    expired requests are counted as ``requests_expired`` by stage.
+    """
+    from fastapi.responses import JSONResponse
+
+    if metrics is not None:
+        metrics.declare('requests_expired', "Requests refused or aborted past their deadline, by stage")
+
+    def refuse(stage: str):
+        if metrics is not None:
+            metrics.inc('requests_expired', stage=stage)
+        return JSONResponse({'detail': "Deadline exceeded"}, status_code=504)
+
+    @app.middleware("http")
+    async def apply_deadline(request, call_next):
+        budget = parse_budget(request.headers.get(DEADLINE_HEADER))
+        if budget is None:
+            return await call_next(request)
+        if budget <= 0:
+            return refuse('ingress')
+        with scope(budget):
+            try:
+                return await call_next(request)
+            except DeadlineExceeded:
+                return refuse('handler')
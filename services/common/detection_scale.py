@@ -0,0 +1,207 @@
+"""
+Detection input resolution.
+
+Detectors rarely need the full camera frame to find the faces we care
+about. ``DetectionResolution`` picks a downscale factor for a frame, either
+a fixed longest side (``DETECTION_SIZE``) or derived from the smallest face
+that must still be found (``DETECTION_SIZE=auto``), optionally letterboxes
+the result onto a square stride-aligned canvas, and maps detector
+coordinates back to the original frame. Frames are never upscaled.
+
+JPEGs can be decoded straight at 1/2, 1/4 or 1/8 size (the scaling happens
+in the DCT domain, so the skipped pixels are never reconstructed); for
+detection-only consumers ``decode`` picks the largest such reduction that
+still leaves at least the detector input size.
+"""
+
+import math
+import os
+import struct
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Smallest detector input that is still worth running
+MIN_DETECTION_SIZE = 160
+
+# Letterboxed inputs are padded to a multiple of the detector stride
+STRIDE = 32
+
+# Padding color of letterboxed inputs
+PAD_VALUE = 114
+
+# Reduced JPEG decode flags by downscale factor, largest first
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# Start-of-frame markers (baseline, progressive, lossless, arithmetic coded)
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    """(width, height) from a JPEG header without decoding, None for other formats."""
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    while i + 4 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:  # no payload
+            i += 2
+            continue
+        if marker in (0xD9, 0xDA):  # end of image / start of scan before any frame header
+            return None
+        length = struct.unpack('>H', data[i + 2:i + 4])[0]
+        if marker in _SOF_MARKERS:
+            if i + 9 > len(data):
+                return None
+            height, width = struct.unpack('>HH', data[i + 5:i + 9])
+            return (width, height) if width and height else None
+        i += 2 + length
+    return None
+
+
+@dataclass
+class FrameTransform:
+    """Maps detector input coordinates back to the original frame."""
+    scale: float = 1.0
+    pad_x: int = 0
+    pad_y: int = 0
+    width: int = 0   # original frame size
+    height: int = 0
+
+    @property
+    def is_identity(self) -> bool:
+        return self.scale == 1.0 and self.pad_x == 0 and self.pad_y == 0
+
+    def box_to_original(self, x1: float, y1: float, x2: float, y2: float) -> Tuple[float, float, float, float]:
+        """Map a detector input box to the original frame, clipped to its bounds."""
+        x1, x2 = ((x - self.pad_x) / self.scale for x in (x1, x2))
+        y1, y2 = ((y - self.pad_y) / self.scale for y in (y1, y2))
+        return (min(self.width, max(0.0, x1)), min(self.height, max(0.0, y1)),
+                min(self.width, max(0.0, x2)), min(self.height, max(0.0, y2)))
+
+
+class DetectionResolution:
+    """Chooses and applies the detector input size of a frame.
+
+    Args:
+        detection_size: Longest side of the detector input; 0 keeps the full frame
+        auto: Derive the scale from the face sizes instead of detection_size
+        letterbox: Center the scaled frame on a square, stride-aligned canvas
+        min_face_size: Smallest face (pixels, original frame) that must be found
+        detector_min_face_size: Smallest face the detector reliably finds at its input
+    """
+
+    def __init__(self, detection_size: int = 0, auto: bool = False, letterbox: bool = False,
+                 min_face_size: int = 64, detector_min_face_size: int = 32):
+        self.detection_size = max(0, detection_size)
+        self.auto = auto
+        self.letterbox = letterbox
+        self.min_face_size = max(1, min_face_size)
+        self.detector_min_face_size = max(1, detector_min_face_size)
+
+    @classmethod
+    def from_env(cls, detector_min_face_size: int = 32) -> "DetectionResolution":
+        """Resolution configured from DETECTION_* environment variables.
+
+        ``DETECTION_SIZE`` is a longest side in pixels, ``0`` for the full
+        frame or ``auto``.
+        """
+        size = os.getenv('DETECTION_SIZE', '0').strip().lower()
+        return cls(
+            detection_size=0 if size == 'auto' else int(size),
+            auto=size == 'auto',
+            letterbox=os.getenv('DETECTION_LETTERBOX', 'false').lower() == 'true',
+            min_face_size=int(os.getenv('DETECTION_MIN_FACE_SIZE', '64')),
+            detector_min_face_size=int(os.getenv('DETECTOR_MIN_FACE_SIZE', str(detector_min_face_size))),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.auto or self.detection_size > 0 or self.letterbox
+
+    def scale(self, width: int, height: int) -> float:
+        """Scale factor (at most 1) to apply to a frame of this size before detection."""
+        longest = max(width, height)
+        if longest <= 0:
+            return 1.0
+        if self.auto:
+            scale = self.detector_min_face_size / self.min_face_size
+        elif self.detection_size > 0:
+            scale = self.detection_size / longest
+        else:
+            return 1.0
+        return min(1.0, max(scale, MIN_DETECTION_SIZE / longest))
+
+    def decode(self, data: bytes) -> Tuple[Optional[np.ndarray], Optional[FrameTransform]]:
+        """Decode an encoded frame straight to the detector input (BGR).
+
+        JPEGs are decoded at a reduced size when the detector input is at
+        least 2x smaller than the frame; other formats and JPEGs whose
+        header cannot be read are decoded in full.
+
+        Returns:
+            Detector input and the transform mapping its coordinates back
+            to the full-size frame, or (None, None) if decoding failed
+        """
+        buffer = np.frombuffer(data, np.uint8)
+        size = jpeg_size(data) if self.enabled else None
+        if size is not None:
+            width, height = size
+            scale = self.scale(width, height)
+            for factor, flag in REDUCED_DECODE_FLAGS:
+                if scale * factor > 1.0:
+                    continue
+                image = cv2.imdecode(buffer, flag)
+                # An EXIF rotation swaps the sides; fall back to a full decode
+                if image is None or image.shape[:2] != (math.ceil(height / factor), math.ceil(width / factor)):
+                    break
+                decoded = image.shape[1] / width
+                image, transform = self._resize(image, min(1.0, scale / decoded))
+                transform.scale *= decoded
+                transform.width, transform.height = width, height
+                return image, transform
+
+        frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        if frame is None:
+            return None, None
+        return self.prepare(frame)
+
+    def prepare(self, frame: np.ndarray) -> Tuple[np.ndarray, FrameTransform]:
+        """Detector input for a frame and the transform mapping its coordinates back."""
+        height, width = frame.shape[:2]
+        return self._resize(frame, self.scale(width, height))
+
+    def _resize(self, frame: np.ndarray, scale: float) -> Tuple[np.ndarray, FrameTransform]:
+        height, width = frame.shape[:2]
+        if scale >= 1.0 and not self.letterbox:
+            return frame, FrameTransform(width=width, height=height)
+
+        new_w = max(1, round(width * scale))
+        new_h = max(1, round(height * scale))
+        image = frame if (new_w, new_h) == (width, height) else cv2.resize(
+            frame, (new_w, new_h), interpolation=cv2.INTER_AREA
+        )
+        # Actual scale after rounding to whole pixels
+        scale = new_w / width
+        if not self.letterbox:
+            return image, FrameTransform(scale=scale, width=width, height=height)
+
+        side = math.ceil(max(new_w, new_h) / STRIDE) * STRIDE
+        pad_x = (side - new_w) // 2
+        pad_y = (side - new_h) // 2
+        image = cv2.copyMakeBorder(
+            image, pad_y, side - new_h - pad_y, pad_x, side - new_w - pad_x,
+            cv2.BORDER_CONSTANT, value=(PAD_VALUE,) * (image.shape[2] if image.ndim == 3 else 1)
+        )
+        return image, FrameTransform(scale=scale, pad_x=pad_x, pad_y=pad_y, width=width, height=height)
@@ -0,0 +1,193 @@
+"""
+Shared-memory frame store.
+
+Holds one decoded RGB frame per request in POSIX shared memory so that
+co-located services (orchestrator, face detection, landmark detection) can
+read the frame the orchestrator already decoded instead of decoding the
+JPEG again. Segments are named from the frame key, expire after a TTL and
+are evicted oldest-first once the store exceeds its size budget.
+"""
+
+import os
+import time
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Iterator, Optional
+
+import numpy as np
+from loguru import logger
+
+
+# Segment header: magic, height, width, channels, created_at (unix seconds)
+_HEADER = struct.Struct('<4sIIId')
+_MAGIC = b'AFRM'
+
+
+def _untrack(shm: shared_memory.SharedMemory) -> None:
+    """Stop the resource tracker from unlinking a segment this process does not own."""
+    try:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+
+
+@dataclass
+class _Segment:
+    shm: shared_memory.SharedMemory
+    size: int
+    created_at: float
+
+
+class SharedFrameStore:
+    """Request-keyed store of decoded RGB frames in shared memory.
+
+    The writer (orchestrator) owns the segments and unlinks them on
+    release, expiry or eviction. Readers attach by key and get a
+    read-only view of the frame that is valid inside ``read()``.
+    """
+
+    def __init__(
+        self,
+        prefix: str = "attn_frame",
+        ttl_seconds: float = 5.0,
+        max_bytes: int = 256 * 1024 * 1024
+    ):
+        self.prefix = prefix
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._segments: "OrderedDict[str, _Segment]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "SharedFrameStore":
+        """Create a store configured from FRAME_STORE_* environment variables."""
+        return cls(
+            prefix=os.getenv('FRAME_STORE_PREFIX', 'attn_frame'),
+            ttl_seconds=float(os.getenv('FRAME_STORE_TTL_SECONDS', '5.0')),
+            max_bytes=int(float(os.getenv('FRAME_STORE_MAX_MB', '256')) * 1024 * 1024)
+        )
+
+    def segment_name(self, key: str) -> str:
+        """Shared memory name for a frame key (kept short for POSIX limits)."""
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return f"{self.prefix}_{digest}"
+
+    # ------------------------------------------------------------------
+    # Writer side
+    # ------------------------------------------------------------------
+
+    def put(self, key: str, frame: np.ndarray) -> str:
+        """Copy an RGB frame into shared memory under ``key``.
+
+        Returns the key, which readers pass to ``read()``.
+        """
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.ndim == 2:
+            frame = frame[:, :, None]
+        h, w, c = frame.shape
+        size = _HEADER.size + frame.nbytes
+
+        if size > self.max_bytes:
+            raise ValueError(f"Frame of {size} bytes exceeds frame store budget")
+
+        with self._lock:
+            self._release_locked(key)
+            self._evict_locked(size)
+
+            shm = shared_memory.SharedMemory(name=self.segment_name(key), create=True, size=size)
+            _HEADER.pack_into(shm.buf, 0, _MAGIC, h, w, c, time.time())
+            view = np.ndarray((h, w, c), dtype=np.uint8, buffer=shm.buf, offset=_HEADER.size)
+            view[:] = frame
+            del view
+
+            self._segments[key] = _Segment(shm=shm, size=size, created_at=time.time())
+            self._total_bytes += size
+
+        return key
+
+    def release(self, key: str) -> None:
+        """Unlink the frame stored under ``key`` once the request is done."""
+        with self._lock:
+            self._release_locked(key)
+
+    def close(self) -> None:
+        """Unlink every segment owned by this store."""
+        with self._lock:
+            for key in list(self._segments):
+                self._release_locked(key)
+
+    def stats(self) -> dict:
+        """Current occupancy of the store."""
+        with self._lock:
+            return {
+                'frames': len(self._segments),
+                'bytes': self._total_bytes,
+                'evictions': self.evictions
+            }
+
+    def _release_locked(self, key: str) -> None:
+        segment = self._segments.pop(key, None)
+        if segment is None:
+            return
+        self._total_bytes -= segment.size
+        try:
+            segment.shm.close()
+            segment.shm.unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to unlink frame segment {key}: {e}")
+
+    def _evict_locked(self, incoming: int) -> None:
+        now = time.time()
+        for key in [k for k, s in self._segments.items() if now - s.created_at > self.ttl_seconds]:
+            self._release_locked(key)
+            self.evictions += 1
+
+        while self._segments and self._total_bytes + incoming > self.max_bytes:
+            oldest = next(iter(self._segments))
+            self._release_locked(oldest)
+            self.evictions += 1
+
+    # ------------------------------------------------------------------
+    # Reader side
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def read(self, key: str) -> Iterator[Optional[np.ndarray]]:
+        """Attach to the frame stored under ``key``.
+
+        Yields a read-only (H, W, C) RGB view, or None if the frame is
+        missing, malformed or older than the TTL. The view must not be
+        used after the block exits.
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=self.segment_name(key))
+        except (FileNotFoundError, ValueError):
+            yield None
+            return
+
+        _untrack(shm)
+        frame = None
+        try:
+            magic, h, w, c, created_at = _HEADER.unpack_from(shm.buf, 0)
+            fresh = time.time() - created_at <= self.ttl_seconds
+            if magic == _MAGIC and fresh and shm.size >= _HEADER.size + h * w * c:
+                frame = np.ndarray((h, w, c), dtype=np.uint8, buffer=shm.buf, offset=_HEADER.size)
+                frame.flags.writeable = False
+            yield frame
+        finally:
+            del frame
+            try:
+                shm.close()
+            except BufferError:
+                # A caller still holds a view; the mapping is released when it is collected
+                pass
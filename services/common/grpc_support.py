@@ -0,0 +1,179 @@
+"""
+gRPC support for the microservices.
+
+Loads the protobuf/gRPC modules generated from proto/ and exposes the
+dict-returning servicers through them, so the same servicer code backs
+both the REST and the gRPC API.
+"""
+
+import importlib
+import os
+import sys
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+
+from . import deadline
+
+
+# Images generate the stubs into /app/generated at build time; a source
+# checkout falls back to the committed stubs in generated/python
+STUB_DIRS = [
+    Path(os.getenv('GRPC_STUBS_DIR', '/app/generated')),
+    Path(__file__).resolve().parents[2] / 'generated' / 'python',
+]
+
+
+def load_stubs(proto_name: str) -> Tuple[Any, Any]:
+    """Import ``<proto_name>_pb2`` and ``<proto_name>_pb2_grpc``.
+
+    Raises:
+        ImportError: If no stub directory has the modules, or they do not
+            match the installed protobuf/grpcio runtime
+    """
+    for stub_dir in STUB_DIRS:
+        if not (stub_dir / f"{proto_name}_pb2.py").exists():
+            continue
+        # Generated *_pb2_grpc modules import their *_pb2 module top-level
+        if str(stub_dir) not in sys.path:
+            sys.path.insert(0, str(stub_dir))
+        try:
+            return (importlib.import_module(f"{proto_name}_pb2"),
+                    importlib.import_module(f"{proto_name}_pb2_grpc"))
+        except Exception as e:
+            raise ImportError(f"Cannot import {proto_name} stubs from {stub_dir}: {e}") from e
+    raise ImportError(f"No generated stubs for {proto_name} in {[str(d) for d in STUB_DIRS]}")
+
+
+def to_plain(value: Any) -> Any:
+    """Convert numpy scalars/arrays inside a result to plain Python values."""
+    if isinstance(value, dict):
+        return {k: to_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return value
+
+
+def to_message(result: Any, message_class: Any) -> Any:
+    """Build a response message from a servicer result dict."""
+    from google.protobuf import json_format
+    from google.protobuf.message import Message
+
+    if isinstance(result, Message):
+        return result
+    return json_format.ParseDict(to_plain(result), message_class(), ignore_unknown_fields=True)
+
+
+class DictServicerAdapter:
+    """Expose a servicer whose RPC methods return dicts as a generated gRPC servicer.
+
+    Results are converted to the RPC's response message. Methods the
+    servicer does not implement answer UNIMPLEMENTED.
+
+    Args:
+        servicer: Object with RPC-named methods taking (request, context)
+        pb2: Generated message module
+        service_name: Service name in the proto, e.g. "HeadPoseService"
+        converters: Optional fast result->message functions by RPC name
+        metrics: Optional ServiceMetrics timing each RPC ("grpc" stage) and
+            its result->message conversion ("serialization" stage); with a
+            tracer on it, each unary RPC is a server span continuing the
+            caller's ``traceparent`` metadata
+
+    Unary RPCs run within the call's deadline (see ``common.deadline``);
+    calls arriving past it are refused with DEADLINE_EXCEEDED.
+    """
+
+    def __init__(self, servicer: Any, pb2: Any, service_name: str,
+                 converters: Optional[Dict[str, Callable]] = None, metrics: Any = None):
+        self._servicer = servicer
+        self._pb2 = pb2
+        self._service = pb2.DESCRIPTOR.services_by_name[service_name]
+        self._service_name = service_name
+        self._converters = converters or {}
+        self._metrics = metrics
+        if metrics is not None:
+            metrics.declare('requests_expired', "Requests refused or aborted past their deadline, by stage")
+
+    def __getattr__(self, name: str):
+        method = self._service.methods_by_name.get(name)
+        if method is None:
+            raise AttributeError(name)
+
+        impl = getattr(self._servicer, name, None)
+        if impl is None:
+            def unimplemented(request, context):
+                import grpc
+                context.abort(grpc.StatusCode.UNIMPLEMENTED, f"{name} is not implemented")
+            return unimplemented
+
+        response_class = getattr(self._pb2, method.output_type.name)
+        convert = self._converters.get(name, to_message)
+
+        if self._metrics is not None:
+            metrics, plain_convert = self._metrics, convert
+
+            def convert(result, response_class):
+                with metrics.time('serialization', method=name):
+                    return plain_convert(result, response_class)
+
+        if method.server_streaming:
+            def stream(request, context):
+                for result in impl(request, context):
+                    yield convert(result, response_class)
+            return stream
+
+        def unary(request, context):
+            budget = context.time_remaining()
+            if budget is not None and budget <= 0:
+                import grpc
+                if self._metrics is not None:
+                    self._metrics.inc('requests_expired', stage='ingress')
+                context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline exceeded")
+            with deadline.scope(budget):
+                if self._metrics is None:
+                    return convert(impl(request, context), response_class)
+                tracer = self._metrics.tracer
+                with tracer.span(f"{self._service_name}/{name}", _traceparent(context)) if tracer else nullcontext():
+                    start = time.perf_counter()
+                    try:
+                        return convert(impl(request, context), response_class)
+                    finally:
+                        self._metrics.observe('grpc', time.perf_counter() - start, traced=False, method=name)
+        return unary
+
+
+def _traceparent(context: Any) -> Optional[str]:
+    """The caller's traceparent from the RPC metadata, if any."""
+    for key, value in context.invocation_metadata() or ():
+        if key == 'traceparent':
+            return value
+    return None
+
+
+def add_servicer(server: Any, servicer: Any, proto_name: str, service_name: str,
+                 converters: Optional[Dict[str, Callable]] = None, metrics: Any = None) -> bool:
+    """Register a dict-returning servicer on a grpc.server.
+
+    Returns:
+        False (and logs a warning) when the generated stubs are unavailable,
+        leaving the service REST-only
+    """
+    try:
+        pb2, pb2_grpc = load_stubs(proto_name)
+    except ImportError as e:
+        logger.warning(f"gRPC API disabled: {e}")
+        return False
+
+    register = getattr(pb2_grpc, f"add_{service_name}Servicer_to_server")
+    register(DictServicerAdapter(servicer, pb2, service_name, converters, metrics), server)
+    logger.info(f"Registered gRPC {service_name}")
+    return True
@@ -0,0 +1,234 @@
+"""
+Bounded pools of model instances.
+
+MediaPipe graphs are not safe to drive from several threads at once, and
+a single instance behind a lock pins a service to one core. An
+``InstancePool`` holds up to ``size`` instances, created on demand by a
+factory; a caller checks one out for the duration of a call and returns it.
+An instance whose calls keep failing (or fail fatally) is closed and
+replaced on the next checkout, without touching the others.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Generic, Iterator, List, Optional, TypeVar
+
+from loguru import logger
+
+from .metrics import Histogram
+
+T = TypeVar('T')
+
+# CPU quota files of cgroup v2 ("<quota> <period>" or "max <period>") and v1
+_CGROUP_V2_CPU_MAX = '/sys/fs/cgroup/cpu.max'
+_CGROUP_V1_CPU_QUOTA = ('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', '/sys/fs/cgroup/cpu/cpu.cfs_period_us')
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: its CPU affinity capped by the container's cgroup CPU quota.
+
+    ``os.cpu_count()`` is the host's core count inside a container, which
+    would size pools far beyond the pod's CPU limit.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:  # not available on every platform
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    if quota is not None:
+        cpus = min(cpus, max(1, math.ceil(quota)))
+    return max(1, cpus)
+
+
+def _cgroup_cpu_quota() -> Optional[float]:
+    """CPU limit in cores from the cgroup, None if unlimited or unknown."""
+    try:
+        with open(_CGROUP_V2_CPU_MAX) as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == 'max' else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(_CGROUP_V1_CPU_QUOTA[0]) as f:
+            quota = int(f.read())
+        with open(_CGROUP_V1_CPU_QUOTA[1]) as f:
+            period = int(f.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+class _Slot(Generic[T]):
+    """A pooled instance and its consecutive error count."""
+
+    def __init__(self, instance: T):
+        self.instance = instance
+        self.errors = 0
+
+
+class InstancePool(Generic[T]):
+    """Thread-safe pool of at most ``size`` instances.
+
+    Args:
+        factory: Creates a new instance
+        size: Maximum number of instances
+        max_errors: Consecutive failed calls after which an instance is replaced
+        is_fatal: Errors that replace the instance at once
+        name: Instance kind, used in logs
+    """
+
+    def __init__(self, factory: Callable[[], T], size: int = 1, max_errors: int = 2,
+                 is_fatal: Optional[Callable[[Exception], bool]] = None, name: str = "instance"):
+        self.factory = factory
+        self.size = max(1, size)
+        self.max_errors = max(1, max_errors)
+        self.is_fatal = is_fatal or (lambda e: False)
+        self.name = name
+
+        self._idle: deque = deque()  # most recently returned last
+        self._instances = 0          # live instances, idle or checked out
+        self._cond = threading.Condition()
+
+        self.waits = Histogram()
+        self.created_total = 0
+        self.recycled_total = 0
+
+    @classmethod
+    def from_env(cls, factory: Callable[[], T], name: str = "instance", max_errors: int = 2,
+                 is_fatal: Optional[Callable[[Exception], bool]] = None) -> "InstancePool[T]":
+        """Pool sized by DETECTOR_POOL_SIZE (default: one instance per CPU available to the container)."""
+        return cls(
+            factory,
+            size=int(os.getenv('DETECTOR_POOL_SIZE', str(available_cpus()))),
+            max_errors=int(os.getenv('DETECTOR_POOL_MAX_ERRORS', str(max_errors))),
+            is_fatal=is_fatal,
+            name=name
+        )
+
+    def warm(self, count: int = 1) -> None:
+        """Create instances up front so the first requests do not pay for it."""
+        slots = []
+        for _ in range(min(count, self.size)):
+            slots.append(self._acquire(None))
+        for slot in slots:
+            self._release(slot, None)
+
+    @contextmanager
+    def checkout(self, timeout: Optional[float] = None) -> Iterator[T]:
+        """Borrow an instance for the enclosed block.
+
+        An exception raised in the block counts against the instance and is
+        re-raised.
+
+        Raises:
+            TimeoutError: If no instance became free within ``timeout`` seconds
+        """
+        slot = self._acquire(timeout)
+        try:
+            yield slot.instance
+        except Exception as e:
+            self._release(slot, e)
+            raise
+        self._release(slot, None)
+
+    def _acquire(self, timeout: Optional[float]) -> _Slot:
+        start = time.perf_counter()
+        with self._cond:
+            while not self._idle and self._instances >= self.size:
+                left = None if timeout is None else timeout - (time.perf_counter() - start)
+                if left is not None and left <= 0:
+                    raise TimeoutError(f"No {self.name} free within {timeout:.3f}s")
+                self._cond.wait(left)
+            slot = self._idle.pop() if self._idle else None
+            if slot is None:
+                self._instances += 1
+        self.waits.observe(time.perf_counter() - start)
+        if slot is not None:
+            return slot
+
+        # Create outside the lock; the slot is already reserved
+        try:
+            slot = _Slot(self.factory())
+        except Exception:
+            with self._cond:
+                self._instances -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.created_total += 1
+        logger.info(f"Created {self.name} ({self._instances}/{self.size})")
+        return slot
+
+    def _release(self, slot: _Slot, error: Optional[Exception]) -> None:
+        if error is None:
+            slot.errors = 0
+        else:
+            slot.errors += 1
+            if slot.errors >= self.max_errors or self.is_fatal(error):
+                logger.info(f"Replacing {self.name} after {slot.errors} error(s): {error}")
+                self._close(slot)
+                with self._cond:
+                    self._instances -= 1
+                    self.recycled_total += 1
+                    self._cond.notify()
+                return
+        with self._cond:
+            self._idle.append(slot)
+            self._cond.notify()
+
+    def _close(self, slot: _Slot) -> None:
+        close = getattr(slot.instance, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                logger.debug(f"Closing {self.name} failed: {e}")
+
+    @property
+    def instances(self) -> int:
+        return self._instances
+
+    @property
+    def in_use(self) -> int:
+        with self._cond:
+            return self._instances - len(self._idle)
+
+    def close(self) -> None:
+        """Close the idle instances; checked-out ones are closed by their callers' GC."""
+        with self._cond:
+            slots = list(self._idle)
+            self._idle.clear()
+            self._instances -= len(slots)
+        for slot in slots:
+            self._close(slot)
+
+    def prometheus_lines(self, prefix: str) -> List[str]:
+        """Pool size, usage, replacements and checkout waits, metric names starting with ``prefix``."""
+        cumulative, total, count = self.waits.snapshot()
+        bounds = [f"{b:g}" for b in self.waits.buckets] + ["+Inf"]
+        lines = [
+            f"# HELP {prefix}_pool_size Configured maximum number of instances",
+            f"# TYPE {prefix}_pool_size gauge",
+            f"{prefix}_pool_size {self.size}",
+            f"# HELP {prefix}_pool_instances Live instances",
+            f"# TYPE {prefix}_pool_instances gauge",
+            f"{prefix}_pool_instances {self.instances}",
+            f"# HELP {prefix}_pool_in_use Instances checked out",
+            f"# TYPE {prefix}_pool_in_use gauge",
+            f"{prefix}_pool_in_use {self.in_use}",
+            f"# HELP {prefix}_pool_recycled_total Instances replaced after errors",
+            f"# TYPE {prefix}_pool_recycled_total counter",
+            f"{prefix}_pool_recycled_total {self.recycled_total}",
+            f"# HELP {prefix}_pool_wait_seconds Time spent waiting for a free instance",
+            f"# TYPE {prefix}_pool_wait_seconds histogram",
+        ]
+        lines += [f'{prefix}_pool_wait_seconds_bucket{{le="{le}"}} {n}' for le, n in zip(bounds, cumulative)]
+        lines += [
+            f"{prefix}_pool_wait_seconds_sum {total}",
+            f"{prefix}_pool_wait_seconds_count {count}",
+        ]
+        return lines
@@ -0,0 +1,184 @@
+"""
+Per-stage latency histograms and counters in Prometheus text format.
+
+Every service keeps one ``ServiceMetrics`` and times its stages with it
+(decode, inference, landmark conversion, downstream calls, serialization,
+Redis publish, ...). Stages are histograms with fixed buckets, so p50/p99
+can be derived per stage and aggregated across replicas by Prometheus
+(``histogram_quantile``). Rendered by each service's ``/metrics``.
+
+With a ``Tracer`` attached, timed stages inside a traced request are also
+recorded as spans (see ``common.tracing``).
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; from sub-millisecond landmark math to multi-second stalls
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+class Histogram:
+    """Thread-safe cumulative histogram with fixed upper bounds."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def snapshot(self) -> Tuple[List[int], float, int]:
+        """(cumulative bucket counts incl. +Inf, sum, count)."""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, running
+
+
+class ServiceMetrics:
+    """Stage latency histograms and counters of one service.
+
+    Args:
+        prefix: Metric name prefix, e.g. "face_detection"
+        counters: Counter name (without "_total") -> help text
+        buckets: Histogram upper bounds in seconds
+        tracer: Optional Tracer; observed stages become spans of the current trace
+    """
+
+    def __init__(self, prefix: str, counters: Optional[Dict[str, str]] = None,
+                 buckets: Sequence[float] = LATENCY_BUCKETS, tracer: Any = None):
+        self.prefix = prefix
+        self.tracer = tracer
+        self.buckets = tuple(buckets)
+        self.counter_help = dict(counters or {})
+        self._stages: Dict[Labels, Histogram] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = {name: {} for name in self.counter_help}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float, traced: bool = True, **labels: str) -> None:
+        """Record a stage duration; extra labels (e.g. service=...) split the series.
+
+        Inside a traced request the stage is also recorded as a span that
+        ended now, unless ``traced`` is False (stages that have their own span).
+        """
+        if traced and self.tracer is not None:
+            self.tracer.add_span(stage, seconds, **labels)
+        key = (('stage', stage),) + tuple(sorted((k, str(v)) for k, v in labels.items()))
+        histogram = self._stages.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._stages.setdefault(key, Histogram(self.buckets))
+        histogram.observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str, **labels: str) -> Iterator[None]:
+        """Time the enclosed block as a stage (also when it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, **labels)
+
+    def declare(self, name: str, help_text: str) -> None:
+        """Add a counter after construction (no-op if it exists)."""
+        with self._lock:
+            self.counter_help.setdefault(name, help_text)
+            self._counters.setdefault(name, {})
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Add to a counter declared in ``counters``."""
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._counters[name]
+            series[key] = series.get(key, 0) + value
+
+    def count(self, name: str, **labels: str) -> float:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            return self._counters[name].get(key, 0)
+
+    def prometheus_lines(self) -> List[str]:
+        lines = []
+        for name, help_text in self.counter_help.items():
+            metric = f"{self.prefix}_{name}_total"
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            with self._lock:
+                series = sorted(self._counters[name].items())
+            lines += [f"{metric}{_format_labels(labels)} {_format_value(value)}" for labels, value in series]
+
+        metric = f"{self.prefix}_stage_duration_seconds"
+        lines += [f"# HELP {metric} Time spent per processing stage",
+                  f"# TYPE {metric} histogram"]
+        with self._lock:
+            stages = sorted(self._stages.items())
+        for labels, histogram in stages:
+            cumulative, total, count = histogram.snapshot()
+            bounds = [f"{b:g}" for b in histogram.buckets] + ["+Inf"]
+            lines += [
+                f"{metric}_bucket{_format_labels(labels + (('le', le),))} {n}"
+                for le, n in zip(bounds, cumulative)
+            ]
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+        return lines
+
+    def render(self) -> str:
+        return "\n".join(self.prometheus_lines()) + "\n"
+
+
+def instrument_app(app, metrics: ServiceMetrics) -> None:
+    """Time every REST request of a FastAPI app as stage "http" and count it by status.
+
+    With a tracer on ``metrics`` each request is also a server span that
+    continues the caller's ``traceparent``, and ``/traces/{trace_id}``
+    returns the spans of a trace held in memory.
+    """
+    metrics.declare('http_requests', "REST requests by route and status code")
+    tracer = metrics.tracer
+
+    @app.middleware("http")
+    async def record(request, call_next):
+        start = time.perf_counter()
+        if tracer is None:
+            response = await call_next(request)
+        else:
+            with tracer.span(f"{request.method} {request.url.path}",
+                             request.headers.get('traceparent')) as span:
+                response = await call_next(request)
+                span.set(status_code=response.status_code)
+        route = getattr(request.scope.get('route'), 'path', 'unmatched')
+        metrics.observe('http', time.perf_counter() - start, traced=False, route=route)
+        metrics.inc('http_requests', route=route, status=response.status_code)
+        return response
+
+    if tracer is not None:
+        @app.get("/traces/{trace_id}")
+        def trace_spans(trace_id: str):
+            """Spans of a trace recorded by this service."""
+            return {'trace_id': trace_id, 'spans': [s.to_dict() for s in tracer.spans(trace_id)]}
@@ -0,0 +1,259 @@
+"""
+Lightweight distributed tracing.
+
+The orchestrator opens a root span per frame and passes its context to every
+downstream request as a W3C ``traceparent`` header (REST) or metadata entry
+(gRPC). Services continue the trace in a server span per request; stages
+recorded by ``ServiceMetrics`` inside it become child spans. Finished
+spans go to a local exporter: an in-memory collector (default, readable at
+``/traces/{trace_id}``) or a JSON-lines file, so one frame's path through
+face detection, landmarks and every per-face call can be reconstructed.
+
+Traces are head-sampled: the service starting a trace keeps a fraction
+``TRACE_SAMPLE_RATE`` of them and says so in the traceparent sampled flag,
+which downstream services honour. Unsampled spans still carry the trace
+context but are not exported.
+"""
+
+import json
+import os
+import random
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+TRACEPARENT = 'traceparent'
+
+
+@dataclass
+class Span:
+    name: str
+    service: str
+    trace_id: str
+    span_id: str
+    parent_id: str = ""
+    start: float = 0.0  # epoch seconds
+    duration_ms: float = 0.0
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    sampled: bool = True
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'service': self.service,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start': self.start,
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'attributes': self.attributes,
+        }
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent span_id, sampled) from a traceparent header, None if absent or malformed."""
+    if not value:
+        return None
+    parts = value.strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    if parts[1] == '0' * 32 or parts[2] == '0' * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+
+class InMemoryExporter:
+    """Keeps the spans of the most recent ``max_traces`` traces."""
+
+    def __init__(self, max_traces: int = 1000):
+        self.max_traces = max(1, max_traces)
+        self._traces: "OrderedDict[str, List[Span]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            spans = self._traces.get(span.trace_id)
+            if spans is None:
+                spans = self._traces[span.trace_id] = []
+                while len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+            spans.append(span)
+
+    def spans(self, trace_id: str) -> List[Span]:
+        with self._lock:
+            return list(self._traces.get(trace_id, []))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._traces.clear()
+
+
+class FileExporter:
+    """Appends spans to a file as JSON lines."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', buffering=1)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+_current: ContextVar[Optional[Span]] = ContextVar('current_span', default=None)
+_recorded: ContextVar[Optional[List[Span]]] = ContextVar('recorded_spans', default=None)
+
+
+class Tracer:
+    """Creates spans of one service and hands finished spans to its exporter.
+
+    Args:
+        service: Service name recorded on every span
+        exporter: InMemoryExporter, FileExporter or None (propagate only)
+        sample_rate: Fraction of the traces started here that are exported
+    """
+
+    def __init__(self, service: str, exporter: Any = None, sample_rate: float = 1.0):
+        self.service = service
+        self.exporter = exporter
+        self.sample_rate = min(1.0, max(0.0, sample_rate))
+
+    @classmethod
+    def from_env(cls, service: str) -> "Tracer":
+        """Tracer configured from TRACE_* environment variables.
+
+        TRACE_EXPORTER is "memory" (default), "file" (TRACE_FILE, one JSON
+        span per line) or "none"; TRACE_SAMPLE_RATE (default 0.01) is the
+        fraction of new traces that are sampled.
+        """
+        kind = os.getenv('TRACE_EXPORTER', 'memory').lower()
+        exporter = None
+        if kind == 'memory':
+            exporter = InMemoryExporter(int(os.getenv('TRACE_MEMORY_TRACES', '1000')))
+        elif kind == 'file':
+            path = os.getenv('TRACE_FILE', f"/tmp/traces-{service}.jsonl")
+            try:
+                exporter = FileExporter(path)
+            except OSError as e:
+                logger.warning(f"Cannot write spans to {path}, tracing without export: {e}")
+        return cls(service, exporter, float(os.getenv('TRACE_SAMPLE_RATE', '0.01')))
+
+    @staticmethod
+    def current() -> Optional[Span]:
+        """Innermost active span of the calling context."""
+        return _current.get()
+
+    @contextmanager
+    def span(self, name: str, traceparent: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+        """Time the enclosed block as a span.
+
+        The parent is the context in ``traceparent`` if given and valid,
+        else the current span; without either a new trace starts, sampled
+        at the tracer's rate (always while spans are being recorded).
+        """
+        remote = parse_traceparent(traceparent)
+        parent = _current.get()
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+        elif parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            trace_id, parent_id = secrets.token_hex(16), ""
+            sampled = _recorded.get() is not None or random.random() < self.sample_rate
+
+        span = Span(name, self.service, trace_id, secrets.token_hex(8), parent_id,
+                    time.time(), attributes=attributes, sampled=sampled)
+        token = _current.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.status = "error"
+            span.attributes.setdefault('error', repr(e))
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - start) * 1000
+            _current.reset(token)
+            self._finish(span)
+
+    def add_span(self, name: str, seconds: float, **attributes: Any) -> Optional[Span]:
+        """Record a block that just took ``seconds`` as a child of the current span.
+
+        No-op outside a trace.
+        """
+        parent = _current.get()
+        if parent is None:
+            return None
+        span = Span(name, self.service, parent.trace_id, secrets.token_hex(8), parent.span_id,
+                    time.time() - seconds, seconds * 1000, attributes=attributes, sampled=parent.sampled)
+        self._finish(span)
+        return span
+
+    def _finish(self, span: Span) -> None:
+        recorded = _recorded.get()
+        if recorded is not None:
+            recorded.append(span)
+        if self.exporter is not None and span.sampled:
+            try:
+                self.exporter.export(span)
+            except Exception as e:
+                logger.debug(f"Span export failed: {e}")
+
+    @contextmanager
+    def record(self) -> Iterator[List[Span]]:
+        """Collect the spans finished in this context (and tasks/threads it starts)."""
+        spans: List[Span] = []
+        token = _recorded.set(spans)
+        try:
+            yield spans
+        finally:
+            _recorded.reset(token)
+
+    def spans(self, trace_id: str) -> List[Span]:
+        """Spans of a trace held by an in-memory exporter (empty otherwise)."""
+        if isinstance(self.exporter, InMemoryExporter):
+            return self.exporter.spans(trace_id)
+        return []
+
+
+def timings(spans: List[Span], root: Span) -> List[Dict[str, Any]]:
+    """Per-stage breakdown of a trace: offset from the root start and duration, in ms."""
+    return [
+        {
+            'name': span.name,
+            'service': span.service,
+            'span_id': span.span_id,
+            'parent_id': span.parent_id,
+            'start_ms': round((span.start - root.start) * 1000, 3),
+            'duration_ms': round(span.duration_ms, 3),
+            **({'status': span.status} if span.status != 'ok' else {}),
+        }
+        for span in sorted(spans, key=lambda s: s.start)
+    ]
@@ -0,0 +1,152 @@
+"""
+Meeting-scoped per-track state store.
+
+Stateful services (blink detection, attention scoring) keep a small state
+object per tracked face. Track ids are only unique within a meeting, so
+state is keyed by (meeting_id, track_id). The store is bounded: entries
+idle for longer than the TTL are expired, and once it holds ``max_entries``
+the least recently used entry is evicted. Every state object is itself
+bounded (fixed-length histories), so the entry cap is the memory cap.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Optional, Tuple, TypeVar
+
+S = TypeVar('S')
+
+TrackKey = Tuple[str, str]
+
+
+class TrackStateStore(Generic[S]):
+    """Thread-safe LRU + idle-TTL store of per-track state.
+
+    Args:
+        factory: Creates the state of a new track
+        max_entries: Tracks kept before the least recently used is evicted
+        ttl_seconds: Tracks not used for this long are expired (0 = never)
+        sweep_interval: Minimum seconds between idle sweeps
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], S],
+        max_entries: int = 10000,
+        ttl_seconds: float = 300.0,
+        sweep_interval: float = 5.0
+    ):
+        self.factory = factory
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.sweep_interval = sweep_interval
+
+        self._entries: "OrderedDict[TrackKey, Tuple[S, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+        self.created_total = 0
+        self.evicted_lru_total = 0
+        self.expired_total = 0
+
+    @classmethod
+    def from_env(cls, factory: Callable[[], S]) -> "TrackStateStore[S]":
+        """Create a store configured from TRACK_STATE_* environment variables."""
+        return cls(
+            factory,
+            max_entries=int(os.getenv('TRACK_STATE_MAX_ENTRIES', '10000')),
+            ttl_seconds=float(os.getenv('TRACK_STATE_TTL_SECONDS', '300'))
+        )
+
+    def get(self, meeting_id: str, track_id: str) -> S:
+        """State of a track, created on first use; marks it most recently used."""
+        key = (meeting_id or "", track_id)
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                state = self.factory()
+                self.created_total += 1
+                while len(self._entries) >= self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evicted_lru_total += 1
+            else:
+                state = entry[0]
+            self._entries[key] = (state, now)
+            return state
+
+    def peek(self, meeting_id: str, track_id: str) -> Optional[S]:
+        """State of a track if present, without creating or touching it."""
+        with self._lock:
+            entry = self._entries.get((meeting_id or "", track_id))
+            return entry[0] if entry else None
+
+    def remove(self, meeting_id: str, track_id: str) -> bool:
+        with self._lock:
+            return self._entries.pop((meeting_id or "", track_id), None) is not None
+
+    def remove_meeting(self, meeting_id: str) -> int:
+        """Drop every track of a meeting; returns the number removed."""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == (meeting_id or "")]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def sweep(self) -> int:
+        """Expire idle tracks now; returns the number expired."""
+        with self._lock:
+            return self._sweep(time.monotonic(), force=True)
+
+    def _sweep(self, now: float, force: bool = False) -> int:
+        if self.ttl_seconds <= 0 or (not force and now - self._last_sweep < self.sweep_interval):
+            return 0
+        self._last_sweep = now
+        expired = 0
+        # Entries are in last-use order, so idle ones are at the front
+        while self._entries:
+            key, (_, last_used) = next(iter(self._entries.items()))
+            if now - last_used < self.ttl_seconds:
+                break
+            del self._entries[key]
+            expired += 1
+        self.expired_total += expired
+        return expired
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: TrackKey) -> bool:
+        return key in self._entries
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'meetings': len({key[0] for key in self._entries}),
+                'max_entries': self.max_entries,
+                'created_total': self.created_total,
+                'evicted_lru_total': self.evicted_lru_total,
+                'expired_total': self.expired_total,
+            }
+
+    def prometheus_lines(self, prefix: str) -> list:
+        """Store stats in Prometheus text format, metric names starting with ``prefix``."""
+        stats = self.stats()
+        return [
+            f"# HELP {prefix}_entries Tracks currently held",
+            f"# TYPE {prefix}_entries gauge",
+            f"{prefix}_entries {stats['entries']}",
+            f"# HELP {prefix}_meetings Meetings with at least one track",
+            f"# TYPE {prefix}_meetings gauge",
+            f"{prefix}_meetings {stats['meetings']}",
+            f"# HELP {prefix}_created_total Tracks created",
+            f"# TYPE {prefix}_created_total counter",
+            f"{prefix}_created_total {stats['created_total']}",
+            f"# HELP {prefix}_evictions_total Tracks evicted, by reason",
+            f"# TYPE {prefix}_evictions_total counter",
+            f'{prefix}_evictions_total{{reason="lru"}} {stats["evicted_lru_total"]}',
+            f'{prefix}_evictions_total{{reason="idle"}} {stats["expired_total"]}',
+        ]
@@ -0,0 +1,138 @@
+"""
+Sampled video frame reader.
+
+Reads a video at a fixed sampling interval in seconds and decodes only the
+frames it returns. Short gaps between samples are skipped with
+``VideoCapture.grab()`` (no colour conversion or copy); gaps longer than
+the seek threshold jump straight to the next sample with a frame seek, so
+the frames in between are not decoded at all.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+import cv2
+import numpy as np
+from loguru import logger
+
+
+@dataclass
+class SampledFrame:
+    frame_idx: int
+    timestamp_ms: int
+    frame: np.ndarray
+
+
+class VideoFrameSampler:
+    """Iterate over one frame per ``interval_seconds`` of a video.
+
+    Args:
+        video_path: File readable by OpenCV
+        interval_seconds: Time between analyzed frames
+        start_seconds: Position of the first sample
+        end_seconds: Stop before this position (None = end of video)
+        seek_min_seconds: Gaps at least this long are seeked instead of
+            grabbed; 0 always seeks, a negative value never seeks
+    """
+
+    def __init__(
+        self,
+        video_path: str,
+        interval_seconds: float = 1.0,
+        start_seconds: float = 0.0,
+        end_seconds: Optional[float] = None,
+        seek_min_seconds: float = 4.0
+    ):
+        if interval_seconds <= 0:
+            raise ValueError("interval_seconds must be positive")
+        self.video_path = video_path
+        self.interval_seconds = interval_seconds
+        self.start_seconds = start_seconds
+        self.end_seconds = end_seconds
+        self.seek_min_seconds = seek_min_seconds
+
+        self.cap = cv2.VideoCapture(video_path)
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) if self.cap.isOpened() else 0
+        self.fps = (self.cap.get(cv2.CAP_PROP_FPS) if self.cap.isOpened() else 0) or 30
+        self.duration = self.total_frames / self.fps
+
+        self._position = 0  # index of the frame the next grab() returns
+        self._sample = 0
+        self.decoded_frames = 0
+        self.skipped_frames = 0
+        self.seeks = 0
+
+    @classmethod
+    def from_env(cls, video_path: str, interval_seconds: Optional[float] = None, **kwargs) -> "VideoFrameSampler":
+        """Create a sampler configured from VIDEO_* environment variables."""
+        if interval_seconds is None:
+            interval_seconds = float(os.getenv('VIDEO_SAMPLE_INTERVAL_SECONDS', '1.0'))
+        kwargs.setdefault('seek_min_seconds', float(os.getenv('VIDEO_SEEK_MIN_SECONDS', '4.0')))
+        return cls(video_path, interval_seconds, **kwargs)
+
+    def is_opened(self) -> bool:
+        return self.cap.isOpened()
+
+    @property
+    def end_frame(self) -> int:
+        """Index one past the last frame the sampler may return."""
+        if self.end_seconds is None:
+            return self.total_frames
+        return min(self.total_frames, int(round(self.end_seconds * self.fps)))
+
+    @property
+    def expected_samples(self) -> int:
+        """Number of frames the sampler will return (for progress reporting)."""
+        count = 0
+        while self._target(count) < self.end_frame:
+            count += 1
+        return count
+
+    def _target(self, sample: int) -> int:
+        return int(round((self.start_seconds + sample * self.interval_seconds) * self.fps))
+
+    def read(self) -> Optional[SampledFrame]:
+        """Decode and return the next sampled frame, or None at the end."""
+        target = self._target(self._sample)
+        if target >= self.end_frame or not self.cap.isOpened():
+            return None
+
+        gap = target - self._position
+        if gap > 0 and 0 <= self.seek_min_seconds <= gap / self.fps:
+            if self.cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+                self.seeks += 1
+                self._position = target
+                gap = 0
+            else:
+                logger.debug(f"Seek failed in {self.video_path}, grabbing instead")
+
+        for _ in range(max(0, gap)):
+            if not self.cap.grab():
+                return None
+            self._position += 1
+            self.skipped_frames += 1
+
+        ret, frame = self.cap.read()
+        if not ret:
+            return None
+        self._position += 1
+        self._sample += 1
+        self.decoded_frames += 1
+        return SampledFrame(target, int((target / self.fps) * 1000), frame)
+
+    def __iter__(self) -> Iterator[SampledFrame]:
+        while True:
+            sample = self.read()
+            if sample is None:
+                return
+            yield sample
+
+    def release(self) -> None:
+        self.cap.release()
+
+    def __enter__(self) -> "VideoFrameSampler":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
@@ -6,6 +6,7 @@ Can be scaled independently and deployed on GPU nodes.
 """
 
 import os
+import sys
 import grpc
 from concurrent import futures
 import numpy as np
@@ -15,18 +16,40 @@ import base64
 import threading
 from loguru import logger
 import mediapipe as mp
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Body
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Optional
+from pathlib import Path
 import uvicorn
 
+# Shared service helpers (services/common, copied to /app/common in images)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import deadline
+from common.deadline import enforce_deadlines
+from common.detection_scale import DetectionResolution, FrameTransform
+from common.frame_store import SharedFrameStore
+from common.grpc_support import add_servicer
+from common.instance_pool import InstancePool
+from common.metrics import ServiceMetrics, instrument_app
+from common.tracing import Tracer
+
 
 # FastAPI app for REST endpoints
 app = FastAPI(title="Face Detection Service", version="1.0.0")
 
+# Stage latencies (decode, resize, inference, postprocess, serialization) and counters
+metrics = ServiceMetrics('face_detection', {
+    'detections': "Detection requests by outcome",
+    'faces_detected': "Faces returned",
+}, tracer=Tracer.from_env('face-detection'))
+instrument_app(app, metrics)
+enforce_deadlines(app, metrics)
+
 
 class DetectRequest(BaseModel):
-    frame_data: str  # base64 encoded image
+    frame_data: str = ""  # base64 encoded image
+    frame_ref: str = ""   # key of an already decoded frame in the shared frame store
     request_id: str = ""
     confidence_threshold: float = 0.5
 
@@ -57,101 +80,120 @@ class FaceDetectionServicer:
     def __init__(self, model_path: str = "", device: str = "cpu"):
         self.device = device
         self.model_path = model_path
-        self.face_detection = None
         self.version = "1.0.0"
-        self._load_model()
-
-    def _load_model(self):
-        """Load MediaPipe Face Detection model."""
-        logger.info("Loading MediaPipe Face Detection model")
+        self.frame_store = SharedFrameStore.from_env()
+        # Detector input size (DETECTION_SIZE, DETECTION_LETTERBOX); full frame by default
+        self.resolution = DetectionResolution.from_env()
         logger.info(f"Using device: {self.device}")
+        # One MediaPipe instance per worker (DETECTOR_POOL_SIZE, default one per
+        # CPU); an instance that keeps failing is replaced on its own
+        self.pool = InstancePool.from_env(self._create_face_detection, name='MediaPipe FaceDetection')
+        self.pool.warm()
 
-        # Close existing instance if any
-        if self.face_detection is not None:
-            try:
-                self.face_detection.close()
-            except:
-                pass
-
-        mp_face_detection = mp.solutions.face_detection
+    def _create_face_detection(self):
+        """Create a MediaPipe Face Detection instance."""
         # Use short-range model (0) with lower confidence for better detection
         # model_selection=0: short-range (2m), better for webcam
         # model_selection=1: full-range (5m), for larger distances
-        self.face_detection = mp_face_detection.FaceDetection(
+        return mp.solutions.face_detection.FaceDetection(
             model_selection=0,  # Short-range model works better for webcam
             min_detection_confidence=0.3  # Lower threshold for better detection
         )
-        self._error_count = 0
-
-        logger.info("Face detection model loaded successfully (short-range, confidence=0.3)")
     
     def DetectFaces(self, request, context):
         """Detect faces in a frame using MediaPipe."""
         try:
             start_time = time.time()
 
-            # Decode frame
-            nparr = np.frombuffer(request.frame_data, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            # Read an already decoded frame from the shared frame store
+            frame_ref = getattr(request, 'frame_ref', '')
+            if frame_ref:
+                with self.frame_store.read(frame_ref) as rgb_frame:
+                    if rgb_frame is None:
+                        return self._error_response(request.request_id, f"Frame not in frame store: {frame_ref}")
+                    return self._detect_rgb(rgb_frame, request.request_id, start_time)
+
+            # Decode frame straight to the detector input size (reduced JPEG decode)
+            with metrics.time('decode'):
+                frame, transform = self.resolution.decode(request.frame_data)
 
-            if frame is None:
-                logger.error(f"Failed to decode frame, data length: {len(request.frame_data)}")
-                return self._error_response(request.request_id, "Failed to decode frame")
+                if frame is None:
+                    logger.error(f"Failed to decode frame, data length: {len(request.frame_data)}")
+                    return self._error_response(request.request_id, "Failed to decode frame")
+
+                # Convert BGR to RGB for MediaPipe
+                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
             h, w = frame.shape[:2]
-            logger.debug(f"Frame decoded: {w}x{h}")
-
-            # Convert BGR to RGB for MediaPipe
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-            # Run detection with error recovery
-            try:
-                results = self.face_detection.process(rgb_frame)
-                self._error_count = 0  # Reset on success
-            except Exception as process_error:
-                self._error_count = getattr(self, '_error_count', 0) + 1
-                logger.warning(f"MediaPipe process error (count={self._error_count}): {process_error}")
-
-                # Reinitialize model after errors
-                if self._error_count >= 2:
-                    logger.info("Reinitializing MediaPipe Face Detection due to errors")
-                    self._load_model()
-
-                return self._error_response(request.request_id, f"Process error: {process_error}")
-
-            # Parse results
-            faces = []
-            if results and results.detections:
-                logger.debug(f"MediaPipe detected {len(results.detections)} faces")
-                for detection in results.detections:
-                    bbox = detection.location_data.relative_bounding_box
-                    x1 = max(0, bbox.xmin * w)
-                    y1 = max(0, bbox.ymin * h)
-                    x2 = min(w, (bbox.xmin + bbox.width) * w)
-                    y2 = min(h, (bbox.ymin + bbox.height) * h)
-                    conf = detection.score[0] if detection.score else 0.5
-
-                    faces.append({
-                        'x1': float(x1),
-                        'y1': float(y1),
-                        'x2': float(x2),
-                        'y2': float(y2),
-                        'confidence': float(conf)
-                    })
-
-            processing_time = (time.time() - start_time) * 1000
-
-            return {
-                'request_id': request.request_id,
-                'faces': faces,
-                'processing_time_ms': processing_time,
-                'success': True,
-                'error': ''
-            }
+            logger.debug(f"Frame decoded: {w}x{h} of {transform.width}x{transform.height}")
+
+            return self._detect_rgb(rgb_frame, request.request_id, start_time, transform)
 
         except Exception as e:
             logger.error(f"Detection error: {e}")
             return self._error_response(request.request_id, str(e))
+
+    def _detect_rgb(self, rgb_frame: np.ndarray, request_id: str, start_time: float,
+                    transform: Optional[FrameTransform] = None):
+        """Run MediaPipe on a decoded RGB frame and build the response.
+
+        Without a transform the frame is full size and is scaled to the
+        detector input here; with one it already is the detector input.
+        """
+
+        if deadline.expired():
+            return self._expired_response(request_id)
+
+        if transform is None:
+            with metrics.time('resize'):
+                detector_frame, transform = self.resolution.prepare(rgb_frame)
+        else:
+            detector_frame = rgb_frame
+        det_h, det_w = detector_frame.shape[:2]
+
+        # Run detection on a pooled instance; failures count against it and the
+        # pool replaces it after repeated errors
+        try:
+            with self.pool.checkout() as face_detection, metrics.time('inference'):
+                results = face_detection.process(detector_frame)
+        except Exception as process_error:
+            logger.warning(f"MediaPipe process error: {process_error}")
+            return self._error_response(request_id, f"Process error: {process_error}")
+
+        # Parse results
+        postprocess_start = time.perf_counter()
+        faces = []
+        if results and results.detections:
+            logger.debug(f"MediaPipe detected {len(results.detections)} faces")
+            for detection in results.detections:
+                # Relative to the detector input, which may be scaled and padded
+                bbox = detection.location_data.relative_bounding_box
+                x1, y1, x2, y2 = transform.box_to_original(
+                    bbox.xmin * det_w, bbox.ymin * det_h,
+                    (bbox.xmin + bbox.width) * det_w, (bbox.ymin + bbox.height) * det_h
+                )
+                conf = detection.score[0] if detection.score else 0.5
+
+                faces.append({
+                    'x1': float(x1),
+                    'y1': float(y1),
+                    'x2': float(x2),
+                    'y2': float(y2),
+                    'confidence': float(conf)
+                })
+
+        metrics.observe('postprocess', time.perf_counter() - postprocess_start)
+        metrics.inc('detections', outcome='success')
+        metrics.inc('faces_detected', len(faces))
+        processing_time = (time.time() - start_time) * 1000
+
+        return {
+            'request_id': request_id,
+            'faces': faces,
+            'processing_time_ms': processing_time,
+            'success': True,
+            'error': ''
+        }
     
     def StreamDetect(self, request_iterator, context):
         """Stream detection for real-time processing."""
@@ -161,12 +203,18 @@ class FaceDetectionServicer:
     def Health(self, request, context):
         """Health check."""
         return {
-            'healthy': self.face_detection is not None,
+            'healthy': self.pool.instances > 0,
             'version': self.version,
             'device': self.device
         }
     
+    def _expired_response(self, request_id: str):
+        """Skip inference for a frame the caller has already given up on."""
+        metrics.inc('requests_expired', stage='inference')
+        return self._error_response(request_id, "Deadline exceeded")
+
     def _error_response(self, request_id: str, error: str):
+        metrics.inc('detections', outcome='error')
         return {
             'request_id': request_id,
             'faces': [],
@@ -186,6 +234,42 @@ def health():
     return {"healthy": True, "version": servicer_instance.version, "device": servicer_instance.device}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus metrics endpoint."""
+    global servicer_instance
+    lines = metrics.prometheus_lines()
+    if servicer_instance is not None:
+        lines += servicer_instance.pool.prometheus_lines('face_detection')
+    return "\n".join(lines) + "\n"
+
+
+class FrameBytesRequest:
+    """Request adapter passing raw frame bytes to the servicer."""
+    def __init__(self, frame_data: bytes, request_id: str, confidence_threshold: float, frame_ref: str = ""):
+        self.frame_data = frame_data
+        self.request_id = request_id
+        self.confidence_threshold = confidence_threshold
+        self.frame_ref = frame_ref
+
+
+def _detect_bytes(frame_bytes: bytes, request_id: str, confidence_threshold: float,
+                  frame_ref: str = "") -> DetectResponse:
+    """Run detection on encoded frame bytes and build the REST response."""
+    global servicer_instance
+    if servicer_instance is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+
+    try:
+        request = FrameBytesRequest(frame_bytes, request_id, confidence_threshold, frame_ref)
+        result = servicer_instance.DetectFaces(request, None)
+        with metrics.time('serialization'):
+            return DetectResponse(**result)
+    except Exception as e:
+        logger.error(f"Detection error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/detect", response_model=DetectResponse)
 def detect(request: DetectRequest):
     """Detect faces in an image."""
@@ -193,28 +277,36 @@ def detect(request: DetectRequest):
     if servicer_instance is None:
         raise HTTPException(status_code=503, detail="Service not ready")
 
+    if request.frame_ref:
+        return _detect_bytes(b"", request.request_id, request.confidence_threshold, request.frame_ref)
+
     try:
         # Decode base64 image
         if "," in request.frame_data:
             request.frame_data = request.frame_data.split(",")[1]
 
-        frame_bytes = base64.b64decode(request.frame_data)
-
-        # Create mock request object
-        class MockRequest:
-            def __init__(self):
-                self.frame_data = frame_bytes
-                self.request_id = request.request_id
-                self.confidence_threshold = request.confidence_threshold
-
-        mock_req = MockRequest()
-        result = servicer_instance.DetectFaces(mock_req, None)
-
-        return DetectResponse(**result)
+        with metrics.time('base64_decode'):
+            frame_bytes = base64.b64decode(request.frame_data)
     except Exception as e:
         logger.error(f"Detection error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    return _detect_bytes(frame_bytes, request.request_id, request.confidence_threshold)
+
+
+@app.post("/detect-binary", response_model=DetectResponse)
+def detect_binary(
+    frame: bytes = Body(..., media_type="image/jpeg"),
+    request_id: str = "",
+    confidence_threshold: float = 0.5
+):
+    """Detect faces in a raw JPEG/PNG request body.
+
+    Skips the base64/JSON envelope of /detect; request_id and
+    confidence_threshold are passed as query parameters.
+    """
+    return _detect_bytes(frame, request_id, confidence_threshold)
+
 
 def run_rest_server(port: int):
     """Run REST server."""
@@ -245,6 +337,8 @@ def serve(grpc_port: int = 50052, rest_port: int = 8052):
         ]
     )
 
+    add_servicer(server, servicer_instance, 'face_detection', 'FaceDetectionService', metrics=metrics)
+
     server.add_insecure_port(f'[::]:{grpc_port}')
     server.start()
 
@@ -5,12 +5,15 @@ import pytest
 import numpy as np
 import cv2
 import sys
+import time
 from pathlib import Path
 
 # Add parent to path
 sys.path.insert(0, str(Path(__file__).parent))
 
+import main
 from main import FaceDetectionServicer
+from fastapi.testclient import TestClient
 
 
 @pytest.fixture
@@ -93,6 +96,370 @@ class TestFaceDetectionServicer:
         assert result['processing_time_ms'] >= 0
 
 
+class TestSharedFrameStore:
+    """Tests for reading decoded frames from the shared frame store."""
+
+    def test_detect_from_frame_ref(self, servicer, test_frame_with_face):
+        """Test that a frame_ref gives the same result as encoded bytes."""
+        from common.frame_store import SharedFrameStore
+        store = SharedFrameStore(prefix="test_fd")
+        servicer.frame_store = store
+        bgr = cv2.imdecode(np.frombuffer(test_frame_with_face, np.uint8), cv2.IMREAD_COLOR)
+        try:
+            key = store.put("meeting/frame-1", cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+            shared = servicer.DetectFaces(MockRequest(frame_ref=key, request_id="ref-1"), None)
+        finally:
+            store.close()
+        encoded = servicer.DetectFaces(MockRequest(frame_data=test_frame_with_face, request_id="ref-1"), None)
+
+        assert shared['success'] == True
+        assert len(shared['faces']) == len(encoded['faces'])
+
+    def test_missing_frame_ref(self, servicer):
+        """Test that an unknown frame_ref reports failure."""
+        request = MockRequest(frame_ref="missing/frame", request_id="ref-2")
+        result = servicer.DetectFaces(request, None)
+        assert result['success'] == False
+        assert "frame store" in result['error']
+
+
+class TestBinaryEndpoint:
+    """Tests for the raw-bytes /detect-binary REST endpoint."""
+
+    @pytest.fixture
+    def client(self, servicer):
+        main.servicer_instance = servicer
+        yield TestClient(main.app)
+        main.servicer_instance = None
+
+    def test_detect_binary_accepts_jpeg_body(self, client, test_frame_with_face):
+        """Test that raw JPEG bytes are accepted without base64."""
+        response = client.post(
+            "/detect-binary?request_id=bin-1",
+            content=test_frame_with_face,
+            headers={"Content-Type": "image/jpeg"}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data['success'] == True
+        assert data['request_id'] == "bin-1"
+
+    def test_detect_binary_invalid_body(self, client):
+        """Test that undecodable bytes report failure."""
+        response = client.post(
+            "/detect-binary",
+            content=b"invalid",
+            headers={"Content-Type": "image/jpeg"}
+        )
+        assert response.status_code == 200
+        assert response.json()['success'] == False
+
+    def test_metrics_stage_histograms(self, client, test_frame_with_face):
+        """/metrics exposes per-stage latency histograms and detection counters."""
+        client.post("/detect-binary", content=test_frame_with_face, headers={"Content-Type": "image/jpeg"})
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith("text/plain")
+        text = response.text
+        for stage in ('decode', 'inference', 'postprocess', 'serialization'):
+            assert f'face_detection_stage_duration_seconds_count{{stage="{stage}"}}' in text
+        assert 'face_detection_stage_duration_seconds_bucket{stage="inference",le="+Inf"}' in text
+        assert 'face_detection_detections_total{outcome="success"}' in text
+        assert 'face_detection_http_requests_total{route="/detect-binary",status="200"}' in text
+
+    def test_refuses_request_past_deadline(self, client, test_frame_with_face):
+        """A request that arrives with no budget left is refused before decoding."""
+        response = client.post(
+            "/detect-binary", content=test_frame_with_face,
+            headers={"Content-Type": "image/jpeg", "X-Deadline-Ms": "0"}
+        )
+        assert response.status_code == 504
+        assert 'face_detection_requests_expired_total{stage="ingress"} 1' in client.get("/metrics").text
+
+    def test_skips_inference_past_deadline(self, servicer, test_frame_with_face):
+        from common import deadline
+
+        with deadline.scope(-1):
+            result = servicer.DetectFaces(main.FrameBytesRequest(test_frame_with_face, "r", 0.5), None)
+
+        assert result['success'] == False
+        assert result['error'] == "Deadline exceeded"
+
+    def test_request_continues_caller_trace(self, client, test_frame_with_face):
+        """A traceparent header makes the request and its stages spans of the caller's trace."""
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        client.post(
+            "/detect-binary", content=test_frame_with_face,
+            headers={"Content-Type": "image/jpeg",
+                     "traceparent": f"00-{trace_id}-00f067aa0ba902b7-01"}
+        )
+        spans = client.get(f"/traces/{trace_id}").json()['spans']
+
+        by_name = {span['name']: span for span in spans}
+        server = by_name['POST /detect-binary']
+        assert server['parent_id'] == "00f067aa0ba902b7"
+        assert server['service'] == 'face-detection'
+        for stage in ('decode', 'inference', 'postprocess'):
+            assert by_name[stage]['parent_id'] == server['span_id']
+
+
+class TestDetectionResolution:
+    """Tests for the configurable detector input size."""
+
+    class _FakeDetection:
+        """MediaPipe stand-in returning one box relative to its input and recording input shapes."""
+
+        def __init__(self):
+            self.shapes = []
+
+        def process(self, rgb_frame):
+            from types import SimpleNamespace as NS
+            self.shapes.append(rgb_frame.shape)
+            bbox = NS(xmin=0.25, ymin=0.25, width=0.25, height=0.25)
+            return NS(detections=[NS(location_data=NS(relative_bounding_box=bbox), score=[0.9])])
+
+    def _detect(self, servicer, resolution, shape=(720, 1280, 3)):
+        from common.instance_pool import InstancePool
+
+        fake = self._FakeDetection()
+        servicer.resolution = resolution
+        servicer.pool = InstancePool(lambda: fake)
+        frame = np.zeros(shape, dtype=np.uint8)
+        _, buffer = cv2.imencode('.jpg', frame)
+        result = servicer.DetectFaces(MockRequest(frame_data=buffer.tobytes(), request_id="r"), None)
+        return result, fake.shapes
+
+    def test_full_frame_by_default(self, servicer):
+        from common.detection_scale import DetectionResolution
+
+        result, shapes = self._detect(servicer, DetectionResolution())
+
+        assert shapes == [(720, 1280, 3)]
+        face = result['faces'][0]
+        assert (face['x1'], face['y1'], face['x2'], face['y2']) == (320, 180, 640, 360)
+
+    def test_downscaled_boxes_in_frame_coordinates(self, servicer):
+        from common.detection_scale import DetectionResolution
+
+        result, shapes = self._detect(servicer, DetectionResolution(detection_size=640))
+
+        assert shapes == [(360, 640, 3)]
+        face = result['faces'][0]
+        assert (face['x1'], face['y1'], face['x2'], face['y2']) == (320, 180, 640, 360)
+
+    def test_letterboxed_boxes_in_frame_coordinates(self, servicer):
+        from common.detection_scale import DetectionResolution
+
+        result, shapes = self._detect(servicer, DetectionResolution(detection_size=640, letterbox=True))
+
+        # 640x360 centered on a 640x640 canvas: 140 px of padding above
+        assert shapes == [(640, 640, 3)]
+        face = result['faces'][0]
+        assert (face['x1'], face['y1'], face['x2'], face['y2']) == (320, 40, 640, 360)
+
+    def test_reduced_jpeg_decode(self, monkeypatch):
+        """JPEGs are decoded at the largest 1/2^n reduction that still covers the detector input."""
+        from common import detection_scale
+        from common.detection_scale import DetectionResolution, jpeg_size
+
+        frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+        data = cv2.imencode('.jpg', frame)[1].tobytes()
+        flags = []
+        imdecode = cv2.imdecode
+        monkeypatch.setattr(detection_scale.cv2, 'imdecode', lambda buf, flag: flags.append(flag) or imdecode(buf, flag))
+
+        assert jpeg_size(data) == (1920, 1080)
+        assert jpeg_size(cv2.imencode('.png', frame)[1].tobytes()) is None
+
+        # 640 px target: a 1/2 decode (960x540) leaves a small resize, 1/4 would be too small
+        image, transform = DetectionResolution(detection_size=640).decode(data)
+        assert flags == [cv2.IMREAD_REDUCED_COLOR_2]
+        assert image.shape == (360, 640, 3)
+        assert transform.box_to_original(100, 50, 200, 150) == (300, 150, 600, 450)
+
+        flags.clear()
+        image, transform = DetectionResolution(detection_size=240).decode(data)
+        assert flags == [cv2.IMREAD_REDUCED_COLOR_8]
+        assert image.shape == (135, 240, 3) and transform.scale == 0.125
+
+        # Full frame: plain decode
+        flags.clear()
+        image, transform = DetectionResolution().decode(data)
+        assert flags == [cv2.IMREAD_COLOR] and image.shape == (1080, 1920, 3) and transform.is_identity
+
+    def test_auto_size_from_min_face_size(self):
+        from common.detection_scale import MIN_DETECTION_SIZE, DetectionResolution
+
+        resolution = DetectionResolution(auto=True, min_face_size=128, detector_min_face_size=32)
+        assert resolution.scale(1280, 720) == 0.25
+        assert resolution.scale(128, 96) == 1.0  # never upscaled
+        resolution.min_face_size = 1024
+        assert resolution.scale(1280, 720) == MIN_DETECTION_SIZE / 1280
+
+
+class TestInstancePool:
+    """Tests for the pool of MediaPipe instances."""
+
+    class _Flaky:
+        """Instance whose process() fails while ``failing`` is set."""
+        failing = False
+
+        def __init__(self):
+            self.closed = False
+
+        def process(self, rgb_frame):
+            if self.failing:
+                raise RuntimeError("graph error")
+            return None
+
+        def close(self):
+            self.closed = True
+
+    def test_concurrent_checkouts_use_separate_instances(self):
+        import threading
+        from common.instance_pool import InstancePool
+
+        pool = InstancePool(object, size=3)
+        barrier = threading.Barrier(3)
+        seen = []
+
+        def call():
+            with pool.checkout() as instance:
+                seen.append(instance)
+                barrier.wait(timeout=2)
+
+        threads = [threading.Thread(target=call) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len({id(i) for i in seen}) == 3
+        assert pool.instances == 3 and pool.in_use == 0
+
+    def test_concurrent_frames_scale_across_instances(self, monkeypatch, test_frame_with_face):
+        """N concurrent frames are detected on N instances of an N-sized pool."""
+        import threading
+        from common.instance_pool import InstancePool
+
+        used = set()
+
+        class SlowDetection:
+            def process(self, rgb_frame):
+                used.add(id(self))
+                time.sleep(0.05)
+                return None
+
+        monkeypatch.setenv('DETECTOR_POOL_SIZE', '4')
+        servicer = FaceDetectionServicer()
+        servicer.pool = InstancePool(SlowDetection, size=servicer.pool.size)
+        threads = [
+            threading.Thread(target=servicer.DetectFaces,
+                             args=(MockRequest(frame_data=test_frame_with_face, request_id=f"r{i}"), None))
+            for i in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(used) == 4
+        assert servicer.pool.instances == 4
+
+    def test_concurrent_requests_run_in_parallel(self, test_frame_with_face):
+        """Concurrent requests run on separate instances at once, not one after another."""
+        import threading
+        from common.instance_pool import InstancePool
+
+        class SlowDetection:
+            def process(self, rgb_frame):
+                time.sleep(0.05)
+                return None
+
+        servicer = FaceDetectionServicer()
+        servicer.pool = InstancePool(SlowDetection, size=8)
+        results = []
+
+        def call(i):
+            results.append(servicer.DetectFaces(MockRequest(frame_data=test_frame_with_face, request_id=f"r{i}"), None))
+
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        assert len(results) == 8 and all(r['success'] for r in results)
+        assert elapsed < 0.25  # 8 x 50 ms one after another would take 0.4 s
+
+    def test_default_size_follows_cgroup_quota(self, monkeypatch, tmp_path):
+        """Without DETECTOR_POOL_SIZE the pool is sized by the container's CPU limit, not the host."""
+        from common import instance_pool
+
+        cpu_max = tmp_path / "cpu.max"
+        cpu_max.write_text("150000 100000\n")
+        monkeypatch.setattr(instance_pool, '_CGROUP_V2_CPU_MAX', str(cpu_max))
+        monkeypatch.setattr(instance_pool, '_CGROUP_V1_CPU_QUOTA', (str(tmp_path / "quota"), str(tmp_path / "period")))
+        monkeypatch.setattr(instance_pool.os, 'sched_getaffinity', lambda pid: set(range(64)), raising=False)
+        monkeypatch.delenv('DETECTOR_POOL_SIZE', raising=False)
+
+        assert instance_pool.InstancePool.from_env(object).size == 2
+
+        cpu_max.write_text("max 100000\n")
+        assert instance_pool.available_cpus() == 64
+
+    def test_checkout_blocks_when_exhausted(self):
+        from common.instance_pool import InstancePool
+
+        pool = InstancePool(object, size=1)
+        with pool.checkout():
+            with pytest.raises(TimeoutError):
+                with pool.checkout(timeout=0.05):
+                    pass
+        with pool.checkout(timeout=0.05):
+            pass
+
+    def test_failing_instance_is_replaced_alone(self):
+        from common.instance_pool import InstancePool
+
+        pool = InstancePool(self._Flaky, size=2, max_errors=2)
+        with pool.checkout() as flaky, pool.checkout() as healthy:
+            pass
+        flaky.failing = True
+
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                with pool.checkout() as instance:
+                    assert instance is flaky  # most recently returned first
+                    instance.process(None)
+
+        assert flaky.closed and not healthy.closed
+        assert pool.recycled_total == 1 and pool.instances == 1
+        with pool.checkout() as a, pool.checkout() as b:
+            assert {a, b} & {healthy} and flaky not in (a, b)
+
+    def test_detection_error_recovers(self, servicer, test_frame_with_face):
+        """A failing instance fails only its frames and is replaced after repeated errors."""
+        from common.instance_pool import InstancePool
+
+        created = []
+
+        def factory():
+            instance = self._Flaky()
+            instance.failing = not created  # only the first instance is broken
+            created.append(instance)
+            return instance
+
+        servicer.pool = InstancePool(factory, size=1, max_errors=2)
+        request = MockRequest(frame_data=test_frame_with_face, request_id="r")
+
+        assert [servicer.DetectFaces(request, None)['success'] for _ in range(3)] == [False, False, True]
+        assert len(created) == 2 and created[0].closed
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
@@ -6,6 +6,7 @@ Tracks eye gaze direction from facial landmarks.
 """
 
 import os
+import sys
 import grpc
 from concurrent import futures
 import numpy as np
@@ -13,13 +14,28 @@ import time
 import threading
 from loguru import logger
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from pathlib import Path
 import uvicorn
 
+# Shared service helpers (services/common, copied to /app/common in images)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.deadline import enforce_deadlines
+from common.grpc_support import add_servicer
+from common.metrics import ServiceMetrics, instrument_app
+from common.tracing import Tracer
+
 
 app = FastAPI(title="Gaze Tracking Service", version="1.0.0")
 
+# Stage latencies (landmark conversion, inference, serialization) and counters
+metrics = ServiceMetrics('gaze_tracking', {'faces': "Faces whose gaze was estimated, by outcome"},
+                         tracer=Tracer.from_env('gaze-tracking'))
+instrument_app(app, metrics)
+enforce_deadlines(app, metrics)
+
 
 class TrackRequest(BaseModel):
     landmarks: List[Dict[str, Any]]
@@ -36,6 +52,16 @@ class TrackResponse(BaseModel):
     error: str = ""
 
 
+class BatchTrackRequest(BaseModel):
+    faces: List[List[Dict[str, Any]]]  # Landmarks of every face in the frame
+    request_id: str = ""
+
+
+class BatchTrackResponse(BaseModel):
+    responses: List[TrackResponse]  # One per face, in request order
+    request_id: str = ""
+
+
 servicer_instance = None
 
 
@@ -44,6 +70,7 @@ LEFT_IRIS = [468, 469, 470, 471, 472]
 RIGHT_IRIS = [473, 474, 475, 476, 477]
 LEFT_EYE_CENTER = [33, 133]   # Inner and outer corners
 RIGHT_EYE_CENTER = [362, 263]
+GAZE_POINTS = LEFT_IRIS + RIGHT_IRIS + LEFT_EYE_CENTER + RIGHT_EYE_CENTER
 
 
 class GazeTrackingServicer:
@@ -95,6 +122,8 @@ class GazeTrackingServicer:
             is_looking_at_camera = abs(gaze_x) < self.gaze_threshold
             
             processing_time = (time.time() - start_time) * 1000
+            metrics.observe('inference', processing_time / 1000)
+            metrics.inc('faces', outcome='success')
             
             return {
                 'request_id': request.request_id,
@@ -117,9 +146,81 @@ class GazeTrackingServicer:
             logger.error(f"Gaze tracking error: {e}")
             return self._error_response(request.request_id, str(e))
     
+    def estimate_batch(self, faces: List[Dict[int, tuple]]) -> List[Optional[Dict]]:
+        """Estimate gaze for every face of a frame in one vectorized pass.
+
+        Args:
+            faces: Per face, mapping of landmark index to (x, y, z)
+
+        Returns:
+            Gaze dict per face, or None where iris landmarks are missing
+        """
+        valid = [i for i, lms in enumerate(faces) if all(idx in lms for idx in GAZE_POINTS)]
+        results: List[Optional[Dict]] = [None] * len(faces)
+        metrics.inc('faces', len(faces) - len(valid), outcome='failed')
+        if not valid:
+            return results
+        inference_start = time.perf_counter()
+
+        points = np.array(
+            [[faces[i][idx][:2] for idx in GAZE_POINTS] for i in valid], dtype=np.float64
+        )
+        left_iris = points[:, 0:5].mean(axis=1)
+        right_iris = points[:, 5:10].mean(axis=1)
+        left_corners, right_corners = points[:, 10:12], points[:, 12:14]
+
+        left_eye_cx = left_corners[:, :, 0].mean(axis=1)
+        right_eye_cx = right_corners[:, :, 0].mean(axis=1)
+        left_half_width = np.abs(left_corners[:, 1, 0] - left_corners[:, 0, 0]) / 2
+        right_half_width = np.abs(right_corners[:, 1, 0] - right_corners[:, 0, 0]) / 2
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            left_gaze_x = np.where(left_half_width > 0, (left_iris[:, 0] - left_eye_cx) / left_half_width, 0.0)
+            right_gaze_x = np.where(right_half_width > 0, (right_iris[:, 0] - right_eye_cx) / right_half_width, 0.0)
+
+        gaze_x = (left_gaze_x + right_gaze_x) / 2
+        gaze_angle = np.degrees(np.arctan2(np.abs(gaze_x), 1))
+        looking = np.abs(gaze_x) < self.gaze_threshold
+
+        for row, i in enumerate(valid):
+            results[i] = {
+                'gaze_x': float(gaze_x[row]),
+                'gaze_y': 0.0,  # Simplified - would need more landmarks for accurate Y
+                'left_iris_x': float(left_iris[row, 0]),
+                'left_iris_y': float(left_iris[row, 1]),
+                'right_iris_x': float(right_iris[row, 0]),
+                'right_iris_y': float(right_iris[row, 1]),
+                'is_looking_at_camera': bool(looking[row]),
+                'gaze_angle': float(gaze_angle[row])
+            }
+        metrics.observe('inference', time.perf_counter() - inference_start)
+        metrics.inc('faces', len(valid), outcome='success')
+        return results
+
     def BatchEstimate(self, request, context):
-        """Batch estimation."""
-        responses = [self.EstimateGaze(req, context) for req in request.requests]
+        """Batch estimation for all faces of a frame in one pass."""
+        start_time = time.time()
+        try:
+            with metrics.time('landmark_conversion'):
+                faces = [{lm.index: (lm.x, lm.y, lm.z) for lm in req.landmarks} for req in request.requests]
+            gazes = self.estimate_batch(faces)
+        except Exception as e:
+            logger.error(f"Batch gaze tracking error: {e}")
+            return {'responses': [self._error_response(req.request_id, str(e)) for req in request.requests]}
+
+        processing_time = (time.time() - start_time) * 1000
+        responses = []
+        for req, gaze in zip(request.requests, gazes):
+            if gaze is None:
+                responses.append(self._error_response(req.request_id, "Iris landmarks not available"))
+            else:
+                responses.append({
+                    'request_id': req.request_id,
+                    'gaze': gaze,
+                    'processing_time_ms': processing_time,
+                    'success': True,
+                    'error': ''
+                })
         return {'responses': responses}
     
     def Health(self, request, context):
@@ -142,6 +243,12 @@ def health():
     return {"healthy": servicer_instance is not None, "version": "1.0.0"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus metrics endpoint."""
+    return metrics.render()
+
+
 @app.post("/track", response_model=TrackResponse)
 def track(request: TrackRequest):
     global servicer_instance
@@ -149,7 +256,10 @@ def track(request: TrackRequest):
         raise HTTPException(status_code=503, detail="Service not ready")
 
     try:
+        start = time.perf_counter()
         landmarks = {lm['index']: (lm['x'], lm['y'], lm.get('z', 0)) for lm in request.landmarks}
+        converted = time.perf_counter()
+        metrics.observe('landmark_conversion', converted - start)
 
         # Check iris landmarks
         if not all(idx in landmarks for idx in LEFT_IRIS + RIGHT_IRIS):
@@ -174,6 +284,8 @@ def track(request: TrackRequest):
 
         gaze_angle = float(np.degrees(np.arctan2(abs(gaze_x), 1)))
         is_looking = abs(gaze_x) < servicer_instance.gaze_threshold
+        metrics.observe('inference', time.perf_counter() - converted)
+        metrics.inc('faces', outcome='success')
 
         return TrackResponse(
             gaze_x=float(gaze_x), gaze_y=0.0, is_looking_at_camera=is_looking,
@@ -184,6 +296,42 @@ def track(request: TrackRequest):
                             request_id=request.request_id, success=False, error=str(e))
 
 
+@app.post("/track-batch", response_model=BatchTrackResponse)
+def track_batch(request: BatchTrackRequest):
+    """Track gaze for all faces of a frame, returned in request order."""
+    global servicer_instance
+    if servicer_instance is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+
+    try:
+        with metrics.time('landmark_conversion'):
+            faces = [
+                {lm['index']: (lm['x'], lm['y'], lm.get('z', 0)) for lm in landmarks}
+                for landmarks in request.faces
+            ]
+        gazes = servicer_instance.estimate_batch(faces)
+    except Exception as e:
+        return BatchTrackResponse(responses=[
+            TrackResponse(gaze_x=0, gaze_y=0, is_looking_at_camera=True,
+                          request_id=request.request_id, success=False, error=str(e))
+            for _ in request.faces
+        ], request_id=request.request_id)
+
+    responses = []
+    for gaze in gazes:
+        if gaze is None:
+            responses.append(TrackResponse(gaze_x=0, gaze_y=0, is_looking_at_camera=True,
+                                           request_id=request.request_id, success=False,
+                                           error="Iris landmarks not available"))
+        else:
+            responses.append(TrackResponse(
+                gaze_x=gaze['gaze_x'], gaze_y=gaze['gaze_y'],
+                is_looking_at_camera=gaze['is_looking_at_camera'],
+                gaze_angle=gaze['gaze_angle'], request_id=request.request_id
+            ))
+    return BatchTrackResponse(responses=responses, request_id=request.request_id)
+
+
 def run_rest_server(port: int):
     uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
 
@@ -197,6 +345,7 @@ def serve(grpc_port: int = 50055, rest_port: int = 8055):
     logger.info(f"🌐 REST API on port {rest_port}")
 
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    add_servicer(server, servicer_instance, 'gaze_tracking', 'GazeTrackingService', metrics=metrics)
     server.add_insecure_port(f'[::]:{grpc_port}')
     server.start()
     logger.info(f"👀 Gaze Tracking Service started (gRPC: {grpc_port})")
@@ -97,6 +97,36 @@ class TestGazeTrackingServicer:
         assert result['success'] == False
 
 
+class TestBatchTrack:
+    """Tests for multi-face batch gaze tracking."""
+
+    @staticmethod
+    def _as_dicts(landmarks, dx=0.0):
+        return [{'index': i, 'x': lm.x + dx, 'y': lm.y, 'z': lm.z} for i, lm in enumerate(landmarks)]
+
+    def test_batch_matches_single(self, servicer, mock_landmarks):
+        """Batch results match the single-face /track endpoint, in order."""
+        import main
+        from fastapi.testclient import TestClient
+
+        main.servicer_instance = servicer
+        client = TestClient(main.app)
+        shifted = self._as_dicts(mock_landmarks)
+        for lm in shifted:
+            if lm['index'] in main.LEFT_IRIS + main.RIGHT_IRIS:
+                lm['x'] += 0.03
+        faces = [self._as_dicts(mock_landmarks), [], shifted]
+
+        batch = client.post("/track-batch", json={'faces': faces}).json()['responses']
+
+        assert [r['success'] for r in batch] == [True, False, True]
+        for i in (0, 2):
+            single = client.post("/track", json={'landmarks': faces[i]}).json()
+            assert batch[i]['gaze_x'] == pytest.approx(single['gaze_x'])
+            assert batch[i]['is_looking_at_camera'] == single['is_looking_at_camera']
+        assert batch[2]['gaze_x'] > batch[0]['gaze_x']
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
@@ -6,6 +6,7 @@ Estimates yaw, pitch, roll from facial landmarks.
 """
 
 import os
+import sys
 import grpc
 from concurrent import futures
 import numpy as np
@@ -14,13 +15,28 @@ import time
 import threading
 from loguru import logger
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional
+from pathlib import Path
 import uvicorn
 
+# Shared service helpers (services/common, copied to /app/common in images)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.deadline import enforce_deadlines
+from common.grpc_support import add_servicer
+from common.metrics import ServiceMetrics, instrument_app
+from common.tracing import Tracer
+
 
 app = FastAPI(title="Head Pose Service", version="1.0.0")
 
+# Stage latencies (landmark conversion, inference, serialization) and counters
+metrics = ServiceMetrics('head_pose', {'faces': "Faces whose pose was estimated, by outcome"},
+                         tracer=Tracer.from_env('head-pose'))
+instrument_app(app, metrics)
+enforce_deadlines(app, metrics)
+
 
 class EstimateRequest(BaseModel):
     landmarks: List[Dict[str, Any]]
@@ -38,6 +54,18 @@ class EstimateResponse(BaseModel):
     error: str = ""
 
 
+class BatchEstimateRequest(BaseModel):
+    faces: List[List[Dict[str, Any]]]  # Landmarks of every face in the frame
+    frame_width: int = 640
+    frame_height: int = 480
+    request_id: str = ""
+
+
+class BatchEstimateResponse(BaseModel):
+    responses: List[EstimateResponse]  # One per face, in request order
+    request_id: str = ""
+
+
 servicer_instance = None
 
 
@@ -55,6 +83,33 @@ MODEL_POINTS = np.array([
 LANDMARK_INDICES = [1, 152, 33, 263, 61, 291]
 
 
+def rotation_vectors_to_euler(rotation_vectors: np.ndarray) -> np.ndarray:
+    """Convert (N, 3) Rodrigues vectors to (N, 3) yaw/pitch/roll in degrees."""
+    theta = np.linalg.norm(rotation_vectors, axis=1)
+    safe_theta = np.where(theta < 1e-12, 1.0, theta)
+    kx, ky, kz = (rotation_vectors / safe_theta[:, None]).T
+    sin_t, cos_t = np.sin(theta), np.cos(theta)
+    one_cos = 1 - cos_t
+
+    # Rodrigues formula, only the matrix entries used below
+    r00 = cos_t + kx * kx * one_cos
+    r10 = kz * sin_t + kx * ky * one_cos
+    r20 = -ky * sin_t + kx * kz * one_cos
+    r21 = kx * sin_t + ky * kz * one_cos
+    r22 = cos_t + kz * kz * one_cos
+    r11 = cos_t + ky * ky * one_cos
+    r12 = -kx * sin_t + ky * kz * one_cos
+
+    sy = np.sqrt(r00 ** 2 + r10 ** 2)
+    singular = sy < 1e-6
+
+    pitch = np.where(singular, np.arctan2(-r12, r11), np.arctan2(r21, r22))
+    yaw = np.arctan2(-r20, sy)
+    roll = np.where(singular, 0.0, np.arctan2(r10, r00))
+
+    return np.degrees(np.stack([yaw, pitch, roll], axis=1))
+
+
 class HeadPoseServicer:
     """gRPC servicer for head pose estimation."""
     
@@ -94,13 +149,15 @@ class HeadPoseServicer:
             ], dtype=np.float64)
             
             # Solve PnP
-            success, rotation_vector, translation_vector = cv2.solvePnP(
-                MODEL_POINTS,
-                image_points,
-                camera_matrix,
-                self.dist_coeffs,
-                flags=cv2.SOLVEPNP_ITERATIVE
-            )
+            with metrics.time('inference'):
+                success, rotation_vector, translation_vector = cv2.solvePnP(
+                    MODEL_POINTS,
+                    image_points,
+                    camera_matrix,
+                    self.dist_coeffs,
+                    flags=cv2.SOLVEPNP_ITERATIVE
+                )
+            metrics.inc('faces', outcome='success' if success else 'failed')
             
             if not success:
                 return self._error_response(request.request_id, "PnP failed")
@@ -146,9 +203,91 @@ class HeadPoseServicer:
             logger.error(f"Head pose estimation error: {e}")
             return self._error_response(request.request_id, str(e))
     
+    def estimate_batch(self, image_points: np.ndarray, frame_sizes: np.ndarray) -> List[Optional[Dict]]:
+        """Estimate head pose for every face of a frame in one pass.
+
+        Args:
+            image_points: (N, 6, 2) image points at LANDMARK_INDICES
+            frame_sizes: (N, 2) frame width and height per face
+
+        Returns:
+            Pose dict per face, or None where PnP failed
+        """
+        num_faces = len(image_points)
+        if num_faces == 0:
+            return []
+        inference_start = time.perf_counter()
+
+        camera_matrices = {}
+        rotation_vectors = np.zeros((num_faces, 3), dtype=np.float64)
+        translation_vectors = np.zeros((num_faces, 3), dtype=np.float64)
+        solved = np.zeros(num_faces, dtype=bool)
+
+        for i in range(num_faces):
+            size = (int(frame_sizes[i][0]), int(frame_sizes[i][1]))
+            if size not in camera_matrices:
+                camera_matrices[size] = self._get_camera_matrix(*size)
+            try:
+                success, rotation_vector, translation_vector = cv2.solvePnP(
+                    MODEL_POINTS, image_points[i], camera_matrices[size],
+                    self.dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE
+                )
+            except cv2.error as e:
+                logger.warning(f"PnP error for face {i}: {e}")
+                continue
+            if success:
+                rotation_vectors[i] = rotation_vector.flatten()
+                translation_vectors[i] = translation_vector.flatten()
+                solved[i] = True
+
+        angles = rotation_vectors_to_euler(rotation_vectors)
+        metrics.observe('inference', time.perf_counter() - inference_start)
+        metrics.inc('faces', int(solved.sum()), outcome='success')
+        metrics.inc('faces', int(num_faces - solved.sum()), outcome='failed')
+
+        return [
+            {
+                'yaw': float(angles[i, 0]),
+                'pitch': float(angles[i, 1]),
+                'roll': float(angles[i, 2]),
+                'rotation_vector': rotation_vectors[i].tolist(),
+                'translation_vector': translation_vectors[i].tolist()
+            } if solved[i] else None
+            for i in range(num_faces)
+        ]
+
     def BatchEstimate(self, request, context):
-        """Batch estimation."""
-        responses = [self.EstimatePose(req, context) for req in request.requests]
+        """Batch estimation for all faces of a frame in one pass."""
+        start_time = time.time()
+        valid, points, sizes = [], [], []
+        with metrics.time('landmark_conversion'):
+            for i, req in enumerate(request.requests):
+                if len(req.landmarks) >= max(LANDMARK_INDICES) + 1:
+                    valid.append(i)
+                    points.append([(req.landmarks[idx].x, req.landmarks[idx].y) for idx in LANDMARK_INDICES])
+                    sizes.append((req.frame_width, req.frame_height))
+
+        poses = self.estimate_batch(
+            np.array(points, dtype=np.float64).reshape(-1, len(LANDMARK_INDICES), 2),
+            np.array(sizes).reshape(-1, 2)
+        )
+        pose_by_index = dict(zip(valid, poses))
+        processing_time = (time.time() - start_time) * 1000
+
+        responses = []
+        for i, req in enumerate(request.requests):
+            if i not in pose_by_index:
+                responses.append(self._error_response(req.request_id, "Insufficient landmarks"))
+            elif pose_by_index[i] is None:
+                responses.append(self._error_response(req.request_id, "PnP failed"))
+            else:
+                responses.append({
+                    'request_id': req.request_id,
+                    'pose': pose_by_index[i],
+                    'processing_time_ms': processing_time,
+                    'success': True,
+                    'error': ''
+                })
         return {'responses': responses}
     
     def Health(self, request, context):
@@ -171,6 +310,12 @@ def health():
     return {"healthy": servicer_instance is not None, "version": "1.0.0"}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus metrics endpoint."""
+    return metrics.render()
+
+
 @app.post("/estimate", response_model=EstimateResponse)
 def estimate(request: EstimateRequest):
     global servicer_instance
@@ -185,15 +330,18 @@ def estimate(request: EstimateRequest):
 
         camera_matrix = servicer_instance._get_camera_matrix(request.frame_width, request.frame_height)
 
-        image_points = np.array([
-            (landmarks[idx]['x'], landmarks[idx]['y'])
-            for idx in LANDMARK_INDICES
-        ], dtype=np.float64)
+        with metrics.time('landmark_conversion'):
+            image_points = np.array([
+                (landmarks[idx]['x'], landmarks[idx]['y'])
+                for idx in LANDMARK_INDICES
+            ], dtype=np.float64)
 
-        success, rotation_vector, translation_vector = cv2.solvePnP(
-            MODEL_POINTS, image_points, camera_matrix,
-            servicer_instance.dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE
-        )
+        with metrics.time('inference'):
+            success, rotation_vector, translation_vector = cv2.solvePnP(
+                MODEL_POINTS, image_points, camera_matrix,
+                servicer_instance.dist_coeffs, flags=cv2.SOLVEPNP_ITERATIVE
+            )
+        metrics.inc('faces', outcome='success' if success else 'failed')
 
         if not success:
             return EstimateResponse(yaw=0, pitch=0, roll=0, request_id=request.request_id,
@@ -223,6 +371,44 @@ def estimate(request: EstimateRequest):
                                success=False, error=str(e))
 
 
+@app.post("/estimate-batch", response_model=BatchEstimateResponse)
+def estimate_batch(request: BatchEstimateRequest):
+    """Estimate head pose for all faces of a frame, returned in request order."""
+    global servicer_instance
+    if servicer_instance is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+
+    responses: List[Optional[EstimateResponse]] = [None] * len(request.faces)
+    valid, points = [], []
+    with metrics.time('landmark_conversion'):
+        for i, landmarks in enumerate(request.faces):
+            if len(landmarks) < max(LANDMARK_INDICES) + 1:
+                responses[i] = EstimateResponse(yaw=0, pitch=0, roll=0, request_id=request.request_id,
+                                                success=False, error="Insufficient landmarks")
+                continue
+            valid.append(i)
+            points.append([(landmarks[idx]['x'], landmarks[idx]['y']) for idx in LANDMARK_INDICES])
+
+    try:
+        poses = servicer_instance.estimate_batch(
+            np.array(points, dtype=np.float64).reshape(-1, len(LANDMARK_INDICES), 2),
+            np.tile([request.frame_width, request.frame_height], (len(valid), 1))
+        )
+    except Exception as e:
+        logger.error(f"Batch head pose error: {e}")
+        poses = [None] * len(valid)
+
+    for i, pose in zip(valid, poses):
+        if pose is None:
+            responses[i] = EstimateResponse(yaw=0, pitch=0, roll=0, request_id=request.request_id,
+                                            success=False, error="PnP failed")
+        else:
+            responses[i] = EstimateResponse(yaw=pose['yaw'], pitch=pose['pitch'], roll=pose['roll'],
+                                            request_id=request.request_id)
+
+    return BatchEstimateResponse(responses=responses, request_id=request.request_id)
+
+
 def run_rest_server(port: int):
     uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
 
@@ -236,6 +422,7 @@ def serve(grpc_port: int = 50054, rest_port: int = 8054):
     logger.info(f"🌐 REST API on port {rest_port}")
 
     server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    add_servicer(server, servicer_instance, 'head_pose', 'HeadPoseService', metrics=metrics)
     server.add_insecure_port(f'[::]:{grpc_port}')
     server.start()
     logger.info(f"🔄 Head Pose Service started (gRPC: {grpc_port})")
@@ -117,6 +117,76 @@ class TestHeadPoseServicer:
         assert result['success'] == False
 
 
+class TestBatchEstimate:
+    """Tests for multi-face batch estimation."""
+
+    def test_batch_matches_single(self, servicer, mock_landmarks):
+        """Batch results match per-face EstimatePose, in request order."""
+        shifted = [type(lm)(lm.x + 0.05, lm.y, lm.z) for lm in mock_landmarks]
+        requests = [
+            MockRequest(request_id=f"face-{i}", landmarks=lms, frame_width=640, frame_height=480)
+            for i, lms in enumerate([mock_landmarks, [], shifted])
+        ]
+        batch = servicer.BatchEstimate(MockRequest(requests=requests), None)['responses']
+
+        assert [r['request_id'] for r in batch] == ["face-0", "face-1", "face-2"]
+        assert batch[1]['success'] == False
+        for i in (0, 2):
+            single = servicer.EstimatePose(requests[i], None)
+            for key in ('yaw', 'pitch', 'roll'):
+                assert batch[i]['pose'][key] == pytest.approx(single['pose'][key], abs=1e-6)
+
+    def test_rest_batch_endpoint(self, servicer, mock_landmarks):
+        """POST /estimate-batch returns one response per face."""
+        import main
+        from fastapi.testclient import TestClient
+
+        main.servicer_instance = servicer
+        face = [{'x': lm.x, 'y': lm.y, 'z': lm.z} for lm in mock_landmarks]
+        response = TestClient(main.app).post(
+            "/estimate-batch", json={'faces': [face, [], face], 'request_id': "batch"}
+        )
+
+        assert response.status_code == 200
+        responses = response.json()['responses']
+        assert [r['success'] for r in responses] == [True, False, True]
+        assert responses[0]['yaw'] == pytest.approx(responses[2]['yaw'])
+
+
+class TestGrpcApi:
+    """Tests for the servicer exposed through the generated gRPC stubs."""
+
+    def test_estimate_over_grpc(self, servicer, mock_landmarks):
+        """EstimatePose and BatchEstimate answer protobuf requests."""
+        import grpc
+        from concurrent import futures
+        from common.grpc_support import add_servicer, load_stubs
+
+        try:
+            pb2, pb2_grpc = load_stubs('head_pose')
+        except ImportError as e:
+            pytest.skip(f"gRPC stubs unavailable: {e}")
+
+        server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        assert add_servicer(server, servicer, 'head_pose', 'HeadPoseService')
+        port = server.add_insecure_port('127.0.0.1:0')
+        server.start()
+        try:
+            with grpc.insecure_channel(f"127.0.0.1:{port}") as channel:
+                stub = pb2_grpc.HeadPoseServiceStub(channel)
+                request = pb2.PoseRequest(request_id="g", frame_width=640, frame_height=480, landmarks=[
+                    pb2.Landmark(index=i, x=lm.x, y=lm.y, z=lm.z) for i, lm in enumerate(mock_landmarks)
+                ])
+                single = stub.EstimatePose(request, timeout=5)
+                batch = stub.BatchEstimate(pb2.BatchPoseRequest(requests=[request, pb2.PoseRequest()]), timeout=5)
+        finally:
+            server.stop(None)
+
+        assert single.success and single.request_id == "g"
+        assert [r.success for r in batch.responses] == [True, False]
+        assert batch.responses[0].pose.yaw == pytest.approx(single.pose.yaw, abs=1e-4)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
@@ -6,26 +6,50 @@ Detects 478 facial landmarks for each face.
 """
 
 import os
+import sys
 import grpc
 from concurrent import futures
 import numpy as np
 import cv2
 import time
 import base64
+import json
 import threading
 from loguru import logger
 import mediapipe as mp
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Body
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Sequence, Tuple
+from pathlib import Path
 import uvicorn
 
+# Shared service helpers (services/common, copied to /app/common in images)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import deadline
+from common.deadline import enforce_deadlines
+from common.frame_store import SharedFrameStore
+from common.grpc_support import add_servicer
+from common.instance_pool import InstancePool
+from common.metrics import ServiceMetrics, instrument_app
+from common.tracing import Tracer
+
 
 app = FastAPI(title="Landmark Detection Service", version="1.0.0")
 
+# Stage latencies (decode, inference, landmark conversion, serialization) and counters
+metrics = ServiceMetrics('landmark_detection', {
+    'detections': "Landmark requests by outcome",
+    'faces_detected': "Faces with landmarks returned",
+    'crop_retries': "Face boxes retried on a crop",
+}, tracer=Tracer.from_env('landmark-detection'))
+instrument_app(app, metrics)
+enforce_deadlines(app, metrics)
+
 
 class DetectRequest(BaseModel):
-    frame_data: str
+    frame_data: str = ""
+    frame_ref: str = ""  # key of an already decoded frame in the shared frame store
     faces: List[Dict[str, Any]] = []
     request_id: str = ""
 
@@ -40,6 +64,18 @@ class DetectResponse(BaseModel):
 
 servicer_instance = None
 
+# Padding around a face box, as a fraction of its size, when re-running
+# FaceMesh on a crop of a face the full-frame pass missed
+CROP_PADDING = 0.25
+
+
+def face_box(face: Any) -> Tuple[float, float, float, float]:
+    """(x1, y1, x2, y2) of a face box given as a dict or a BoundingBox message."""
+    if isinstance(face, dict):
+        box = face.get('bbox', face)
+        return (float(box['x1']), float(box['y1']), float(box['x2']), float(box['y2']))
+    return (face.x1, face.y1, face.x2, face.y2)
+
 
 class LandmarkDetectionServicer:
     """gRPC servicer for landmark detection."""
@@ -47,108 +83,152 @@ class LandmarkDetectionServicer:
     def __init__(self):
         self.version = "1.0.0"
         self.mp_face_mesh = mp.solutions.face_mesh
-        self._lock = threading.Lock()
-        self._error_count = 0
-        self._max_errors = 3
-        self._create_face_mesh()
+        self.frame_store = SharedFrameStore.from_env()
+        # One FaceMesh per concurrent request up to DETECTOR_POOL_SIZE (default
+        # one per CPU); an instance is replaced after repeated or timestamp errors
+        self.pool = InstancePool.from_env(
+            self._create_face_mesh, name='MediaPipe FaceMesh', max_errors=3,
+            is_fatal=lambda e: "timestamp" in str(e).lower()
+        )
+        self.pool.warm()
 
     def _create_face_mesh(self):
         """Create a new MediaPipe FaceMesh instance."""
-        logger.info("Creating MediaPipe FaceMesh instance")
-        if hasattr(self, 'face_mesh') and self.face_mesh is not None:
-            try:
-                self.face_mesh.close()
-            except:
-                pass
-
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
+        return self.mp_face_mesh.FaceMesh(
             static_image_mode=True,  # Process each frame independently
             max_num_faces=20,
             refine_landmarks=True,  # Include iris landmarks
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
-        self._error_count = 0
-        logger.info("Landmark detection initialized successfully")
     
     def DetectLandmarks(self, request, context):
         """Detect landmarks in face regions."""
         start_time = time.time()
+        boxes = [face_box(face) for face in getattr(request, 'faces', None) or []]
+
+        # Read an already decoded frame from the shared frame store
+        frame_ref = getattr(request, 'frame_ref', '')
+        if frame_ref:
+            with self.frame_store.read(frame_ref) as rgb_frame:
+                if rgb_frame is None:
+                    return self._error_response(request.request_id, f"Frame not in frame store: {frame_ref}")
+                return self._detect_rgb(rgb_frame, request.request_id, start_time, boxes)
 
         # Decode frame
-        nparr = np.frombuffer(request.frame_data, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        with metrics.time('decode'):
+            nparr = np.frombuffer(request.frame_data, np.uint8)
+            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
-        if frame is None:
-            return self._error_response(request.request_id, "Failed to decode frame")
+            if frame is None:
+                return self._error_response(request.request_id, "Failed to decode frame")
 
-        # Convert BGR to RGB
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        h, w = frame.shape[:2]
+            # Convert BGR to RGB
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return self._detect_rgb(rgb_frame, request.request_id, start_time, boxes)
 
-        # Process with MediaPipe - with error recovery
+    def _process(self, rgb_frame: np.ndarray):
+        """Run FaceMesh on an RGB image on a pooled instance, retrying once on error."""
         results = None
         for attempt in range(2):
             try:
-                with self._lock:
-                    results = self.face_mesh.process(rgb_frame)
-                    self._error_count = 0  # Reset on success
+                with self.pool.checkout() as face_mesh, metrics.time('inference'):
+                    results = face_mesh.process(rgb_frame)
                 break
             except Exception as e:
                 logger.warning(f"MediaPipe error (attempt {attempt + 1}): {e}")
-                with self._lock:
-                    self._error_count += 1
-                    if self._error_count >= self._max_errors or "timestamp" in str(e).lower():
-                        logger.info("Recreating FaceMesh due to errors")
-                        self._create_face_mesh()
+        return results
+
+    def _detect_rgb(self, rgb_frame: np.ndarray, request_id: str, start_time: float,
+                    boxes: Sequence[Tuple[float, float, float, float]] = ()):
+        """Run FaceMesh on a decoded RGB frame and build the response.
+
+        FaceMesh runs on the full frame. Face boxes the full-frame pass did
+        not find (typically small, distant faces) are retried on a padded
+        crop around the box. Stops as soon as the caller's deadline passes.
+        """
+        h, w = rgb_frame.shape[:2]
 
+        if deadline.expired():
+            return self._expired_response(request_id)
         faces = []
+        results = self._process(rgb_frame)
         if results and results.multi_face_landmarks:
-            for face_idx, face_landmarks in enumerate(results.multi_face_landmarks):
-                landmarks = []
-                min_x, min_y = float('inf'), float('inf')
-                max_x, max_y = 0, 0
-
-                for idx, lm in enumerate(face_landmarks.landmark):
-                    x_px = lm.x * w
-                    y_px = lm.y * h
-                    landmarks.append({
-                        'index': idx,
-                        'x': x_px,
-                        'y': y_px,
-                        'z': lm.z * w  # Z is relative to width
-                    })
-                    # Calculate bounding box from landmarks
-                    min_x = min(min_x, x_px)
-                    min_y = min(min_y, y_px)
-                    max_x = max(max_x, x_px)
-                    max_y = max(max_y, y_px)
-
-                # Add padding to bbox (10%)
-                padding_x = (max_x - min_x) * 0.1
-                padding_y = (max_y - min_y) * 0.1
-
-                faces.append({
-                    'face_index': face_idx,
-                    'landmarks': landmarks,
-                    'bbox': {
-                        'x1': max(0, min_x - padding_x),
-                        'y1': max(0, min_y - padding_y),
-                        'x2': min(w, max_x + padding_x),
-                        'y2': min(h, max_y + padding_y),
-                        'confidence': 0.95  # FaceMesh is usually confident
-                    }
-                })
-
+            for face_landmarks in results.multi_face_landmarks:
+                faces.append(self._face_result(len(faces), face_landmarks, (0, 0, w, h), w, h))
+
+        for x1, y1, x2, y2 in boxes:
+            cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+            if any(f['bbox']['x1'] <= cx <= f['bbox']['x2'] and f['bbox']['y1'] <= cy <= f['bbox']['y2']
+                   for f in faces):
+                continue
+            pad_x, pad_y = (x2 - x1) * CROP_PADDING, (y2 - y1) * CROP_PADDING
+            cx1, cy1 = int(max(0, x1 - pad_x)), int(max(0, y1 - pad_y))
+            cx2, cy2 = int(min(w, x2 + pad_x)), int(min(h, y2 + pad_y))
+            if cx2 - cx1 < 2 or cy2 - cy1 < 2:
+                continue
+            if deadline.expired():
+                return self._expired_response(request_id)
+            metrics.inc('crop_retries')
+            results = self._process(np.ascontiguousarray(rgb_frame[cy1:cy2, cx1:cx2]))
+            if results and results.multi_face_landmarks:
+                faces.append(self._face_result(
+                    len(faces), results.multi_face_landmarks[0], (cx1, cy1, cx2 - cx1, cy2 - cy1), w, h
+                ))
+
+        metrics.inc('detections', outcome='success')
+        metrics.inc('faces_detected', len(faces))
         processing_time = (time.time() - start_time) * 1000
 
         return {
-            'request_id': request.request_id,
+            'request_id': request_id,
             'faces': faces,
             'processing_time_ms': processing_time,
             'success': True,
             'error': ''
         }
+
+    @staticmethod
+    def _face_result(face_idx: int, face_landmarks, region: Tuple[int, int, int, int],
+                     w: int, h: int) -> Dict[str, Any]:
+        """Convert FaceMesh landmarks normalized to ``region`` (x, y, width, height) to frame pixels."""
+        conversion_start = time.perf_counter()
+        rx, ry, rw, rh = region
+        landmarks = []
+        min_x, min_y = float('inf'), float('inf')
+        max_x, max_y = 0, 0
+
+        for idx, lm in enumerate(face_landmarks.landmark):
+            x_px = rx + lm.x * rw
+            y_px = ry + lm.y * rh
+            landmarks.append({
+                'index': idx,
+                'x': x_px,
+                'y': y_px,
+                'z': lm.z * rw  # Z is relative to width
+            })
+            # Calculate bounding box from landmarks
+            min_x = min(min_x, x_px)
+            min_y = min(min_y, y_px)
+            max_x = max(max_x, x_px)
+            max_y = max(max_y, y_px)
+
+        # Add padding to bbox (10%)
+        padding_x = (max_x - min_x) * 0.1
+        padding_y = (max_y - min_y) * 0.1
+        metrics.observe('landmark_conversion', time.perf_counter() - conversion_start)
+
+        return {
+            'face_index': face_idx,
+            'landmarks': landmarks,
+            'bbox': {
+                'x1': max(0, min_x - padding_x),
+                'y1': max(0, min_y - padding_y),
+                'x2': min(w, max_x + padding_x),
+                'y2': min(h, max_y + padding_y),
+                'confidence': 0.95  # FaceMesh is usually confident
+            }
+        }
     
     def StreamDetect(self, request_iterator, context):
         """Stream detection."""
@@ -158,11 +238,17 @@ class LandmarkDetectionServicer:
     def Health(self, request, context):
         """Health check."""
         return {
-            'healthy': self.face_mesh is not None,
+            'healthy': self.pool.instances > 0,
             'version': self.version
         }
     
+    def _expired_response(self, request_id: str):
+        """Stop work on a frame the caller has already given up on."""
+        metrics.inc('requests_expired', stage='inference')
+        return self._error_response(request_id, "Deadline exceeded")
+
     def _error_response(self, request_id: str, error: str):
+        metrics.inc('detections', outcome='error')
         return {
             'request_id': request_id,
             'faces': [],
@@ -172,8 +258,23 @@ class LandmarkDetectionServicer:
         }
     
     def __del__(self):
-        if self.face_mesh:
-            self.face_mesh.close()
+        if getattr(self, 'pool', None) is not None:
+            self.pool.close()
+
+
+def landmarks_message(result: Dict, response_class):
+    """Build a LandmarkResponse directly (much faster than json_format for 478 landmarks/face)."""
+    response = response_class(
+        request_id=result['request_id'],
+        processing_time_ms=result['processing_time_ms'],
+        success=result['success'],
+        error=result['error']
+    )
+    for face in result['faces']:
+        face_message = response.faces.add(face_index=face['face_index'])
+        for lm in face['landmarks']:
+            face_message.landmarks.add(index=lm['index'], x=lm['x'], y=lm['y'], z=lm['z'])
+    return response
 
 
 @app.get("/health")
@@ -184,27 +285,74 @@ def health():
     return {"healthy": True, "version": servicer_instance.version}
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus metrics endpoint."""
+    lines = metrics.prometheus_lines()
+    if servicer_instance is not None:
+        lines += servicer_instance.pool.prometheus_lines('landmark_detection')
+    return "\n".join(lines) + "\n"
+
+
+class FrameBytesRequest:
+    """Request adapter passing raw frame bytes to the servicer."""
+    def __init__(self, frame_data: bytes, request_id: str, frame_ref: str = "",
+                 faces: Sequence[Dict[str, Any]] = ()):
+        self.frame_data = frame_data
+        self.request_id = request_id
+        self.frame_ref = frame_ref
+        self.faces = faces
+
+
+def _detect_bytes(frame_bytes: bytes, request_id: str, frame_ref: str = "",
+                  faces: Sequence[Dict[str, Any]] = ()) -> DetectResponse:
+    """Run landmark detection on encoded frame bytes."""
+    global servicer_instance
+    if servicer_instance is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+
+    try:
+        result = servicer_instance.DetectLandmarks(FrameBytesRequest(frame_bytes, request_id, frame_ref, faces), None)
+        with metrics.time('serialization'):
+            return DetectResponse(**result)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.post("/detect", response_model=DetectResponse)
 def detect(request: DetectRequest):
     global servicer_instance
     if servicer_instance is None:
         raise HTTPException(status_code=503, detail="Service not ready")
 
+    if request.frame_ref:
+        return _detect_bytes(b"", request.request_id, request.frame_ref, request.faces)
+
     try:
         if "," in request.frame_data:
             request.frame_data = request.frame_data.split(",")[1]
-        frame_bytes = base64.b64decode(request.frame_data)
-
-        class MockRequest:
-            def __init__(self):
-                self.frame_data = frame_bytes
-                self.request_id = request.request_id
-
-        result = servicer_instance.DetectLandmarks(MockRequest(), None)
-        return DetectResponse(**result)
+        with metrics.time('base64_decode'):
+            frame_bytes = base64.b64decode(request.frame_data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    return _detect_bytes(frame_bytes, request.request_id, faces=request.faces)
+
+
+@app.post("/detect-binary", response_model=DetectResponse)
+def detect_binary(frame: bytes = Body(..., media_type="image/jpeg"), request_id: str = "",
+                  faces: str = ""):
+    """Detect landmarks in a raw JPEG/PNG request body.
+
+    FaceMesh runs on the full frame, so face boxes are optional; ``faces``
+    is a JSON list of boxes to retry if the full-frame pass misses them.
+    """
+    try:
+        boxes = json.loads(faces) if faces else []
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid faces: {e}")
+    return _detect_bytes(frame, request_id, faces=boxes)
+
 
 def run_rest_server(port: int):
     uvicorn.run(app, host="0.0.0.0", port=port, log_level="info")
@@ -226,6 +374,8 @@ def serve(grpc_port: int = 50053, rest_port: int = 8053):
         ]
     )
 
+    add_servicer(server, servicer_instance, 'landmark_detection', 'LandmarkDetectionService', {'DetectLandmarks': landmarks_message}, metrics=metrics)
+
     server.add_insecure_port(f'[::]:{grpc_port}')
     server.start()
 
@@ -9,7 +9,9 @@ from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent))
 
+import main
 from main import LandmarkDetectionServicer
+from fastapi.testclient import TestClient
 
 
 @pytest.fixture
@@ -95,6 +97,174 @@ class TestLandmarkDetectionServicer:
         assert result['success'] == False
 
 
+class TestSharedFrameStore:
+    """Tests for reading decoded frames from the shared frame store."""
+
+    def test_detect_from_frame_ref(self, servicer, test_frame_with_face):
+        """Test landmark detection on a frame published to the store."""
+        from common.frame_store import SharedFrameStore
+        store = SharedFrameStore(prefix="test_lm")
+        servicer.frame_store = store
+        bgr = cv2.imdecode(np.frombuffer(test_frame_with_face, np.uint8), cv2.IMREAD_COLOR)
+        try:
+            key = store.put("meeting/frame-1", cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB))
+            result = servicer.DetectLandmarks(MockRequest(frame_ref=key, request_id="ref-1"), None)
+        finally:
+            store.close()
+        assert result['success'] == True
+
+    def test_expired_frame_ref(self, servicer, test_frame_with_face):
+        """Test that frames older than the TTL are not served."""
+        from common.frame_store import SharedFrameStore
+        store = SharedFrameStore(prefix="test_lm", ttl_seconds=0.0)
+        servicer.frame_store = store
+        try:
+            key = store.put("meeting/frame-2", np.zeros((48, 64, 3), dtype=np.uint8))
+            result = servicer.DetectLandmarks(MockRequest(frame_ref=key, request_id="ref-2"), None)
+        finally:
+            store.close()
+        assert result['success'] == False
+
+
+class TestBinaryEndpoint:
+    """Tests for the raw-bytes /detect-binary REST endpoint."""
+
+    def test_detect_binary_matches_json_endpoint(self, servicer, test_frame_with_face):
+        """Test that binary and base64 ingest produce the same result."""
+        import base64
+        main.servicer_instance = servicer
+        try:
+            client = TestClient(main.app)
+            binary = client.post(
+                "/detect-binary?request_id=bin-1",
+                content=test_frame_with_face,
+                headers={"Content-Type": "image/jpeg"}
+            ).json()
+            json_result = client.post("/detect", json={
+                'frame_data': base64.b64encode(test_frame_with_face).decode('utf-8'),
+                'request_id': 'bin-1'
+            }).json()
+        finally:
+            main.servicer_instance = None
+
+        assert binary['success'] == True
+        assert len(binary['faces']) == len(json_result['faces'])
+
+
+class TestCropRetry:
+    """Tests for re-running FaceMesh on face boxes the full-frame pass missed."""
+
+    @staticmethod
+    def _fake_results(*points):
+        from types import SimpleNamespace
+        landmarks = [SimpleNamespace(x=x, y=y, z=0.1) for x, y in points]
+        return SimpleNamespace(multi_face_landmarks=[SimpleNamespace(landmark=landmarks)])
+
+    def test_missed_box_mapped_to_frame(self, servicer, monkeypatch):
+        """Crop landmarks are returned in full-frame pixel coordinates."""
+        shapes = []
+
+        def process(rgb):
+            shapes.append(rgb.shape[:2])
+            return None if len(shapes) == 1 else self._fake_results((0.0, 0.0), (1.0, 1.0))
+
+        monkeypatch.setattr(servicer, '_process', process)
+        frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        result = servicer._detect_rgb(frame, "r", 0.0, [(100.0, 200.0, 140.0, 240.0)])
+
+        # 25% padding around the 40x40 box
+        assert shapes == [(480, 640), (60, 60)]
+        landmarks = result['faces'][0]['landmarks']
+        assert (landmarks[0]['x'], landmarks[0]['y']) == (90.0, 190.0)
+        assert (landmarks[1]['x'], landmarks[1]['y']) == (150.0, 250.0)
+        assert landmarks[0]['z'] == pytest.approx(6.0)
+
+    def test_found_box_not_retried(self, servicer, monkeypatch):
+        """Boxes already covered by a full-frame face are not processed again."""
+        calls = []
+
+        def process(rgb):
+            calls.append(rgb.shape)
+            return self._fake_results((0.1, 0.1), (0.3, 0.3))
+
+        monkeypatch.setattr(servicer, '_process', process)
+        frame = np.zeros((100, 100, 3), dtype=np.uint8)
+        result = servicer._detect_rgb(frame, "r", 0.0, [main.face_box({'x1': 12, 'y1': 12, 'x2': 28, 'y2': 28})])
+
+        assert len(calls) == 1
+        assert len(result['faces']) == 1
+
+
+class TestGrpcConversion:
+    """Tests for the direct LandmarkResponse builder."""
+
+    def test_landmarks_message(self):
+        """landmarks_message keeps every landmark and drops the REST-only bbox."""
+        from common.grpc_support import load_stubs
+
+        try:
+            pb2, _ = load_stubs('landmark_detection')
+        except ImportError as e:
+            pytest.skip(f"gRPC stubs unavailable: {e}")
+
+        result = {
+            'request_id': "r", 'processing_time_ms': 1.5, 'success': True, 'error': '',
+            'faces': [{'face_index': 0, 'bbox': {'x1': 0},
+                       'landmarks': [{'index': i, 'x': i * 1.0, 'y': 2.0, 'z': 0.5} for i in range(478)]}]
+        }
+        message = main.landmarks_message(result, pb2.LandmarkResponse)
+
+        assert message.request_id == "r" and message.success
+        assert len(message.faces[0].landmarks) == 478
+        assert message.faces[0].landmarks[477].x == pytest.approx(477.0)
+
+
+class TestInstancePool:
+    """Tests for the pool of FaceMesh instances."""
+
+    class _FakeMesh:
+        """FaceMesh stand-in; raises ``error`` from process() when set."""
+
+        def __init__(self, error=None):
+            self.error = error
+            self.closed = False
+
+        def process(self, rgb):
+            if self.error:
+                raise self.error
+            return None
+
+        def close(self):
+            self.closed = True
+
+    def test_timestamp_error_replaces_instance_and_retries(self, servicer):
+        from common.instance_pool import InstancePool
+
+        meshes = [self._FakeMesh(RuntimeError("Packet timestamp mismatch")), self._FakeMesh()]
+        servicer.pool = InstancePool(lambda: meshes.pop(0) if meshes else self._FakeMesh(), size=1, max_errors=3,
+                                     is_fatal=lambda e: "timestamp" in str(e).lower())
+        with servicer.pool.checkout() as broken:
+            pass
+
+        servicer._process(np.zeros((10, 10, 3), dtype=np.uint8))
+
+        # Replaced at once rather than after max_errors, and the retry ran on the new instance
+        assert broken.closed
+        assert servicer.pool.recycled_total == 1 and servicer.pool.instances == 1
+
+    def test_metrics_expose_pool(self, servicer, test_frame_with_face):
+        main.servicer_instance = servicer
+        try:
+            servicer.DetectLandmarks(MockRequest(frame_data=test_frame_with_face, request_id="r"), None)
+            text = TestClient(main.app).get("/metrics").text
+        finally:
+            main.servicer_instance = None
+
+        assert f'landmark_detection_pool_size {servicer.pool.size}' in text
+        assert 'landmark_detection_pool_in_use 0' in text
+        assert 'landmark_detection_stage_duration_seconds_count{stage="inference"} 1' in text
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
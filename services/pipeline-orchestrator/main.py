@@ -6,6 +6,7 @@ Manages the processing flow and aggregates results from all services.
 """
 
 import os
+import sys
 import grpc
 from concurrent import futures
 import requests
@@ -16,27 +17,79 @@ import json
 import base64
 import redis
 import threading
+import itertools
+import math
+import bisect
+import hashlib
+import socket
+import asyncio
+import uuid
+import httpx
 from loguru import logger
-from dataclasses import dataclass
-from typing import Optional, Dict, Any, List
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from contextlib import asynccontextmanager, nullcontext
+from typing import Optional, Dict, Any, Callable, List, Tuple, Union
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
+from pathlib import Path
+from urllib.parse import urlsplit
 import uvicorn
 
+# Shared service helpers (services/common, copied to /app/common in images)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common import circuit_breaker, deadline
+from common.circuit_breaker import CircuitBreaker, CircuitOpen
+from common.deadline import DeadlineExceeded, enforce_deadlines
+from common.frame_store import SharedFrameStore
+from common.grpc_support import load_stubs
+from common.metrics import ServiceMetrics, instrument_app
+from common.tracing import TRACEPARENT, Span, Tracer, timings
+from common.track_state import TrackStateStore
+from common.video_sampling import VideoFrameSampler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close keep-alive connections to downstream services
+    if orchestrator_instance is not None:
+        await orchestrator_instance.aclose()
+
 
 # FastAPI app
-app = FastAPI(title="Pipeline Orchestrator", version="1.0.0")
+app = FastAPI(title="Pipeline Orchestrator", version="1.0.0", lifespan=lifespan)
+
+# Spans of each frame, propagated to downstream services as traceparent
+tracer = Tracer.from_env('pipeline-orchestrator')
+
+# Stage latencies: frame decode/encode, each downstream call, result
+# serialization and Redis publish, plus the whole frame
+metrics = ServiceMetrics('pipeline', {
+    'downstream_calls': "Downstream service calls, by service and outcome",
+    'downstream_retries': "Downstream calls retried within the frame's budget, by service",
+    'circuit_fallbacks': "Calls skipped by an open circuit and answered in-process or by defaults, by service",
+}, tracer=tracer)
+instrument_app(app, metrics)
+enforce_deadlines(app, metrics)
+
+# A call whose timeout fell short of the service's own by more than this
+# was capped by the frame's budget, so timing out says nothing about the service
+BUDGET_CAPPED_SLACK = 0.01
 
 
 class FrameRequest(BaseModel):
     frame_data: str  # base64 encoded image
     meeting_id: str = ""
     request_id: str = ""
+    include_timings: bool = False  # return the frame's spans as a per-stage breakdown
 
 
 class VideoAnalysisRequest(BaseModel):
     analysis_id: str
     video_path: str
+    sample_interval_seconds: Optional[float] = None  # default VIDEO_SAMPLE_INTERVAL_SECONDS
 
 
 class ProcessResponse(BaseModel):
@@ -46,6 +99,53 @@ class ProcessResponse(BaseModel):
     processing_time_ms: float
     success: bool
     error: str = ""
+    trace_id: str = ""
+    timings: Optional[List[Dict[str, Any]]] = None
+
+
+class HashRing:
+    """Consistent-hash ring mapping routing keys (meeting ids) to endpoints.
+
+    Each endpoint owns ``vnodes`` points on the ring and a key belongs to the
+    first point at or after its hash. Adding or removing an endpoint only
+    moves the keys of the arcs it gains or loses (about 1/N of them); every
+    other key keeps its endpoint, and with it the state held there.
+    """
+
+    def __init__(self, nodes: Tuple[str, ...] = (), vnodes: int = 100):
+        self.vnodes = max(1, vnodes)
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        self.nodes: Tuple[str, ...] = ()
+        self.set_nodes(nodes)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        # Stable across processes, unlike hash()
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def set_nodes(self, nodes) -> bool:
+        """Replace the ring's endpoints; returns False if they did not change."""
+        nodes = tuple(sorted(set(nodes)))
+        if nodes == self.nodes:
+            return False
+        ring = sorted(
+            (self._hash(f"{node}#{i}"), node) for node in nodes for i in range(self.vnodes)
+        )
+        self._points = [point for point, _ in ring]
+        self._owners = [node for _, node in ring]
+        self.nodes = nodes
+        return True
+
+    def get(self, key: str) -> Optional[str]:
+        """Endpoint owning a key, or None on an empty ring."""
+        if not self._points:
+            return None
+        i = bisect.bisect(self._points, self._hash(key)) % len(self._points)
+        return self._owners[i]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
 
 
 @dataclass
@@ -53,7 +153,63 @@ class ServiceConfig:
     """Service URL configuration."""
     url: str
     name: str
-    timeout: float = 5.0
+    timeout: float = 5.0       # Per call, further capped by the frame's remaining budget
+    max_concurrency: int = 16  # Max in-flight calls from this orchestrator
+    grpc_target: str = ""      # host:port of the service's gRPC API
+    key: str = ""              # registry key, e.g. "head-pose"
+    # Replicas of a stateful service, routed to by meeting id: replica
+    # host -> (REST URL, gRPC target). Empty = everything goes to url/grpc_target.
+    replicas: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    ring: HashRing = field(default_factory=HashRing)
+    replicas_dns: str = ""     # headless service name resolved to replica hosts
+
+    def set_replicas(self, hosts) -> bool:
+        """Route to these replica hosts; returns False if nothing changed."""
+        rest = urlsplit(self.url)
+        rest_port = rest.port or (443 if rest.scheme == 'https' else 80)
+        grpc_port = self.grpc_target.rsplit(':', 1)[-1]
+        hosts = [h for h in hosts if h]
+        if not self.ring.set_nodes(hosts):
+            return False
+        addresses = {host: f"[{host}]" if ':' in host else host for host in hosts}  # IPv6
+        self.replicas = {
+            host: (f"{rest.scheme}://{addr}:{rest_port}", f"{addr}:{grpc_port}")
+            for host, addr in addresses.items()
+        }
+        return True
+
+    def endpoint(self, route_key: str = "") -> Tuple[str, str]:
+        """(REST URL, gRPC target) for a routing key; keyless calls use the service address."""
+        if route_key and self.replicas:
+            host = self.ring.get(route_key)
+            if host is not None:
+                return self.replicas[host]
+        return self.url, self.grpc_target
+
+
+# Default gRPC ports of the microservices
+GRPC_PORTS = {
+    'face-detection': 50052,
+    'landmark-detection': 50053,
+    'head-pose': 50054,
+    'gaze-tracking': 50055,
+    'blink-detection': 50056,
+    'attention-scorer': 50057,
+}
+
+# Services reachable over gRPC: generated module and stub class. The
+# attention scorer has no proto definition and is always called over REST.
+GRPC_STUBS = {
+    'face-detection': ('face_detection', 'FaceDetectionServiceStub'),
+    'landmark-detection': ('landmark_detection', 'LandmarkDetectionServiceStub'),
+    'head-pose': ('head_pose', 'HeadPoseServiceStub'),
+    'gaze-tracking': ('gaze_tracking', 'GazeTrackingServiceStub'),
+    'blink-detection': ('blink_detection', 'BlinkDetectionServiceStub'),
+}
+
+# Services keeping per-track state between frames, so every frame of a
+# meeting must reach the same replica
+STATEFUL_SERVICES = ('blink-detection', 'attention-scorer')
 
 
 class ServiceRegistry:
@@ -87,13 +243,500 @@ class ServiceRegistry:
             )
         }
 
+        # Per-service concurrency limits and call timeouts, e.g. HEAD_POSE_MAX_CONCURRENCY=32,
+        # HEAD_POSE_TIMEOUT_SECONDS=2, and gRPC addresses from HEAD_POSE_HOST
+        # ("host" or "host:port") / HEAD_POSE_PORT
+        for key, config in self.services.items():
+            config.key = key
+            prefix = key.upper().replace('-', '_')
+            config.max_concurrency = int(os.getenv(f"{prefix}_MAX_CONCURRENCY", config.max_concurrency))
+            config.timeout = float(os.getenv(f"{prefix}_TIMEOUT_SECONDS", config.timeout))
+            host = os.getenv(f"{prefix}_HOST", 'localhost')
+            config.grpc_target = host if ':' in host else f"{host}:{os.getenv(f'{prefix}_PORT', GRPC_PORTS[key])}"
+
+        # Replicas of the stateful services, each meeting pinned to one of them
+        # by consistent hashing: a static host list (BLINK_DETECTION_REPLICAS=
+        # "blink-0.blink,blink-1.blink") or a headless service whose addresses
+        # are re-resolved every REPLICA_REFRESH_SECONDS (BLINK_DETECTION_REPLICAS_DNS)
+        vnodes = int(os.getenv('HASH_RING_VNODES', '100'))
+        for key in STATEFUL_SERVICES:
+            config = self.services[key]
+            prefix = key.upper().replace('-', '_')
+            config.ring = HashRing(vnodes=vnodes)
+            config.replicas_dns = os.getenv(f"{prefix}_REPLICAS_DNS", '')
+            hosts = os.getenv(f"{prefix}_REPLICAS", '')
+            if hosts:
+                config.set_replicas(h.strip() for h in hosts.split(','))
+
+        # Called with the service name whenever a service's replicas change
+        self.listeners: List[Callable[[str], None]] = []
+
+        self.refresh_interval = float(os.getenv('REPLICA_REFRESH_SECONDS', '30'))
+        self._refresh_stop = threading.Event()
+        if any(config.replicas_dns for config in self.services.values()):
+            self.refresh_replicas()
+            threading.Thread(target=self._refresh_loop, name='replica-refresh', daemon=True).start()
+
     def get(self, name: str) -> Optional[ServiceConfig]:
         return self.services.get(name)
 
+    def endpoint(self, name: str, route_key: str = "") -> Tuple[str, str]:
+        """(REST URL, gRPC target) of the replica serving a routing key."""
+        return self.services[name].endpoint(route_key)
+
+    def set_replicas(self, name: str, hosts) -> bool:
+        """Replace a service's replicas; only keys of added/removed replicas move."""
+        config = self.services[name]
+        changed = config.set_replicas(hosts)
+        if changed:
+            logger.info(f"{config.name} replicas: {list(config.ring.nodes)}")
+            for listener in self.listeners:
+                listener(name)
+        return changed
+
+    def refresh_replicas(self):
+        """Re-resolve the headless services of DNS-discovered replicas."""
+        for name, config in self.services.items():
+            if not config.replicas_dns:
+                continue
+            try:
+                infos = socket.getaddrinfo(config.replicas_dns, None, proto=socket.IPPROTO_TCP)
+            except OSError as e:
+                logger.warning(f"Could not resolve {config.name} replicas ({config.replicas_dns}): {e}")
+                continue
+            # Keep the last known replicas rather than routing nowhere
+            hosts = sorted({info[4][0] for info in infos})
+            if hosts:
+                self.set_replicas(name, hosts)
+
+    def _refresh_loop(self):
+        while not self._refresh_stop.wait(self.refresh_interval):
+            self.refresh_replicas()
+
     def all(self) -> dict:
         return self.services
 
 
+class FramePayload:
+    """A frame in each form the detection services accept, converted at most once."""
+
+    def __init__(self, frame_data: Union[str, bytes, np.ndarray]):
+        self._source = frame_data
+        self._encoded: Optional[bytes] = None
+        self._base64: Optional[str] = None
+        self._rgb: Optional[np.ndarray] = None
+        self.frame_ref = ""  # Key in the shared frame store, if published
+
+    def encoded(self) -> bytes:
+        """JPEG/PNG bytes of the frame."""
+        if self._encoded is None:
+            source = self._source
+            if isinstance(source, np.ndarray):
+                with metrics.time('encode'):
+                    _, buffer = cv2.imencode('.jpg', source, [cv2.IMWRITE_JPEG_QUALITY, 80])
+                    self._encoded = buffer.tobytes()
+            elif isinstance(source, bytes):
+                self._encoded = source
+            else:
+                if "," in source:
+                    source = source.split(",")[1]
+                with metrics.time('base64_decode'):
+                    self._encoded = base64.b64decode(source)
+        return self._encoded
+
+    def base64(self) -> str:
+        """Base64 string of the encoded frame."""
+        if self._base64 is None:
+            if isinstance(self._source, str):
+                self._base64 = self._source
+            else:
+                encoded = self.encoded()
+                with metrics.time('base64_encode'):
+                    self._base64 = base64.b64encode(encoded).decode('utf-8')
+        return self._base64
+
+    def rgb(self) -> Optional[np.ndarray]:
+        """Decoded RGB frame, or None if the data cannot be decoded."""
+        if self._rgb is None:
+            if isinstance(self._source, np.ndarray):
+                bgr = self._source
+            else:
+                encoded = self.encoded()
+                with metrics.time('decode'):
+                    bgr = cv2.imdecode(np.frombuffer(encoded, np.uint8), cv2.IMREAD_COLOR)
+                if bgr is None:
+                    return None
+            self._rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+
+# Results used for a face when a downstream service fails
+DEFAULT_HEAD_POSE = {'yaw': 0, 'pitch': 0, 'roll': 0}
+DEFAULT_GAZE = {'gaze_x': 0, 'gaze_y': 0, 'is_looking_at_camera': True}
+DEFAULT_BLINK = {'avg_ear': 0.25, 'perclos': 0, 'is_drowsy': False}
+DEFAULT_ATTENTION = {'attention_score': 75.0, 'alerts': []}
+
+
+# Meetings whose frame counts are kept for periodic face detection
+MAX_TRACKED_MEETINGS = 1024
+
+
+class AttentionDeltaEncoder:
+    """Turns per-frame results into keyframe/delta updates per meeting.
+
+    A keyframe carries every participant; a delta only the participants
+    whose attention score moved by more than ``epsilon`` or whose alerts,
+    gaze or drowsiness state changed since they were last sent, plus the
+    track ids that left. A keyframe goes out every ``keyframe_seconds`` so
+    late subscribers converge. Frames without any change produce nothing.
+
+    Messages: {"type": "keyframe"|"delta", "seq": n, "participants": [...],
+    "removed": [track_id, ...]}
+    """
+
+    def __init__(self, epsilon: float = 2.0, keyframe_seconds: float = 5.0,
+                 max_meetings: int = MAX_TRACKED_MEETINGS):
+        self.epsilon = epsilon
+        self.keyframe_seconds = keyframe_seconds
+        self.max_meetings = max_meetings
+        # meeting id -> (seq, last keyframe time, {track id: last sent participant})
+        self._meetings: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.keyframes_total = 0
+        self.deltas_total = 0
+        self.suppressed_total = 0
+
+    @classmethod
+    def from_env(cls) -> "AttentionDeltaEncoder":
+        return cls(
+            epsilon=float(os.getenv('DELTA_SCORE_EPSILON', '2.0')),
+            keyframe_seconds=float(os.getenv('DELTA_KEYFRAME_SECONDS', '5.0'))
+        )
+
+    @staticmethod
+    def _state(participant: Dict) -> tuple:
+        gaze = participant.get('gaze') or {}
+        blink = participant.get('blink') or {}
+        return (sorted(map(str, participant.get('alerts') or [])),
+                gaze.get('is_looking_at_camera'), blink.get('is_drowsy'))
+
+    def _changed(self, previous: Optional[Dict], participant: Dict) -> bool:
+        if previous is None:
+            return True
+        score_delta = abs(participant.get('attention_score', 0) - previous.get('attention_score', 0))
+        return score_delta > self.epsilon or self._state(participant) != self._state(previous)
+
+    def encode(self, meeting_id: str, results: List[Dict]) -> Optional[Dict]:
+        """Update for a meeting's latest results, or None when nothing changed."""
+        now = time.monotonic()
+        current = {str(p.get('track_id', i)): p for i, p in enumerate(results)}
+        with self._lock:
+            entry = self._meetings.pop(meeting_id, None)
+            if entry is None:
+                while len(self._meetings) >= self.max_meetings:
+                    self._meetings.popitem(last=False)
+                seq, last_keyframe, sent = 0, None, {}
+            else:
+                seq, last_keyframe, sent = entry
+
+            if last_keyframe is None or now - last_keyframe >= self.keyframe_seconds:
+                message = {'type': 'keyframe', 'seq': seq, 'participants': results, 'removed': []}
+                self._meetings[meeting_id] = (seq + 1, now, current)
+                self.keyframes_total += 1
+                return message
+
+            changed = {tid: p for tid, p in current.items() if self._changed(sent.get(tid), p)}
+            removed = [tid for tid in sent if tid not in current]
+            if not changed and not removed:
+                self._meetings[meeting_id] = (seq, last_keyframe, sent)
+                self.suppressed_total += 1
+                return None
+
+            # Unchanged participants keep their last sent values as the baseline,
+            # so slow drift still crosses epsilon eventually
+            sent = {tid: changed.get(tid, sent.get(tid)) for tid in current}
+            self._meetings[meeting_id] = (seq + 1, last_keyframe, sent)
+            self.deltas_total += 1
+            return {'type': 'delta', 'seq': seq, 'participants': list(changed.values()), 'removed': removed}
+
+    def forget(self, meeting_id: str) -> None:
+        with self._lock:
+            self._meetings.pop(meeting_id, None)
+
+
+class RedisPublisher:
+    """Publishes pipeline results to Redis from a background thread.
+
+    ``publish`` only appends to a bounded buffer, so Redis round-trips never
+    add to frame latency. The writer thread drains up to ``batch_size``
+    messages, from any number of meetings, into one pipelined round-trip.
+
+    Messages are queued per channel. A message that supersedes what is
+    queued on its channel (full results, a delta keyframe) replaces it, so a
+    backlog holds at most the latest full update per meeting. Only when the
+    buffer is full of messages that cannot be replaced (deltas) is the
+    oldest one dropped; ``on_drop`` is then called with its channel, as it
+    is for messages lost to Redis errors, so the sender can resynchronize.
+
+    Encodings: "json" (compact separators, what the API gateway decodes) or
+    "msgpack" (smaller and faster to encode, for msgpack-aware subscribers).
+    """
+
+    def __init__(self, client, max_pending: int = 1024, batch_size: int = 128, encoding: str = 'json',
+                 on_drop: Optional[Callable[[str], None]] = None):
+        self.client = client
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max(1, max_pending)
+        self.encoding = encoding
+        self.on_drop = on_drop
+        self._encode = self._encoder(encoding)
+        # channel -> queued payloads, channels in order of their oldest message
+        self._pending: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self._count = 0
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.published_total = 0
+        self.coalesced_total = 0
+        self.dropped_total = 0
+        self.failed_total = 0
+        self.batches_total = 0
+
+        self._thread = threading.Thread(target=self._run, name='redis-publisher', daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, client, on_drop: Optional[Callable[[str], None]] = None) -> "RedisPublisher":
+        """Create a publisher configured from PUBLISH_* environment variables."""
+        return cls(
+            client,
+            max_pending=int(os.getenv('PUBLISH_MAX_PENDING', '1024')),
+            batch_size=int(os.getenv('PUBLISH_BATCH_SIZE', '128')),
+            encoding=os.getenv('PUBLISH_ENCODING', 'json').lower(),
+            on_drop=on_drop
+        )
+
+    @staticmethod
+    def _encoder(encoding: str):
+        if encoding == 'msgpack':
+            try:
+                import msgpack
+                return lambda payload: msgpack.packb(payload, use_bin_type=True)
+            except ImportError:
+                logger.warning("msgpack not installed, publishing JSON")
+        return lambda payload: json.dumps(payload, separators=(',', ':'))
+
+    def publish(self, channel: str, payload: Any, supersedes: bool = True) -> None:
+        """Queue a message; never blocks on Redis.
+
+        Args:
+            supersedes: The message makes the ones queued on its channel
+                obsolete (False for deltas, which all must arrive)
+        """
+        dropped = None
+        with self._cond:
+            if self._closed:
+                return
+            queued = self._pending.get(channel)
+            if queued and supersedes:
+                self.coalesced_total += len(queued)
+                self._count -= len(queued)
+                queued.clear()
+            elif self._count >= self.max_pending:
+                dropped = next(iter(self._pending))
+                oldest = self._pending[dropped]
+                oldest.pop(0)
+                if not oldest:
+                    del self._pending[dropped]
+                self._count -= 1
+                self.dropped_total += 1
+            self._pending.setdefault(channel, []).append(payload)
+            self._count += 1
+            self._cond.notify()
+        if dropped is not None:
+            self._dropped(dropped)
+
+    def _dropped(self, channel: str):
+        if self.on_drop is not None:
+            try:
+                self.on_drop(channel)
+            except Exception as e:
+                logger.debug(f"on_drop failed for {channel}: {e}")
+
+    @property
+    def pending(self) -> int:
+        return self._count
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Whole channels, oldest first, so each channel's messages stay in order
+                batch = []
+                while self._pending and len(batch) < self.batch_size:
+                    channel, payloads = self._pending.popitem(last=False)
+                    batch += [(channel, payload) for payload in payloads]
+                self._count -= len(batch)
+            self._send(batch)
+
+    def _send(self, batch: List[Tuple[str, Any]]):
+        try:
+            pipe = self.client.pipeline(transaction=False)
+            with metrics.time('serialization'):
+                for channel, payload in batch:
+                    pipe.publish(channel, self._encode(payload))
+            with metrics.time('redis_publish'):
+                pipe.execute()
+            self.published_total += len(batch)
+        except Exception as e:
+            # Stale results are not worth retrying; the next frame supersedes them
+            self.failed_total += len(batch)
+            logger.warning(f"Redis publish of {len(batch)} messages failed: {e}")
+            for channel in dict.fromkeys(channel for channel, _ in batch):
+                self._dropped(channel)
+        self.batches_total += 1
+
+    def close(self, timeout: float = 2.0):
+        """Flush what is queued (up to ``timeout``) and stop the writer thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def prometheus_lines(self) -> List[str]:
+        return [
+            "# HELP pipeline_publish_messages_total Result messages published to Redis",
+            "# TYPE pipeline_publish_messages_total counter",
+            f"pipeline_publish_messages_total {self.published_total}",
+            "# HELP pipeline_publish_coalesced_total Queued result messages replaced by a newer one of the meeting",
+            "# TYPE pipeline_publish_coalesced_total counter",
+            f"pipeline_publish_coalesced_total {self.coalesced_total}",
+            "# HELP pipeline_publish_dropped_total Result messages dropped because the buffer was full",
+            "# TYPE pipeline_publish_dropped_total counter",
+            f"pipeline_publish_dropped_total {self.dropped_total}",
+            "# HELP pipeline_publish_failed_total Result messages lost to Redis errors",
+            "# TYPE pipeline_publish_failed_total counter",
+            f"pipeline_publish_failed_total {self.failed_total}",
+            "# HELP pipeline_publish_batches_total Pipelined Redis round-trips",
+            "# TYPE pipeline_publish_batches_total counter",
+            f"pipeline_publish_batches_total {self.batches_total}",
+            "# HELP pipeline_publish_pending Result messages waiting to be published",
+            "# TYPE pipeline_publish_pending gauge",
+            f"pipeline_publish_pending {self.pending}",
+        ]
+
+
+class LocalAnalysis:
+    """In-process head pose, gaze, blink and scoring while a service's circuit is open.
+
+    Answers the same request bodies as the services with the ai-processor
+    core estimators (loaded from AI_PROCESSOR_PATH on first use), so a frame
+    keeps real per-face results instead of defaults. Blink state is kept per
+    (meeting, track) like in the blink service; alerts need the scorer's
+    history and are left empty. Returns None where no local result can be
+    computed (unknown service, ai-processor not importable, estimator failed).
+    """
+
+    def __init__(self):
+        self._core: Optional[Dict[str, Any]] = None
+        self._unavailable = False
+        self._lock = threading.Lock()
+        self._blink = TrackStateStore.from_env(lambda: self._core['BlinkDetector']())
+
+    def _estimators(self) -> Optional[Dict[str, Any]]:
+        if self._core is None and not self._unavailable:
+            with self._lock:
+                if self._core is None and not self._unavailable:
+                    try:
+                        core = _load_core_estimators()
+                        self._core = {
+                            **core,
+                            'head_pose': core['HeadPoseEstimator'](640, 480),  # camera of the REST defaults
+                            'gaze': core['GazeTracker'](),
+                            'scorer': core['AttentionScorer'](),
+                        }
+                    except Exception as e:
+                        logger.warning(f"In-process fallback unavailable, using defaults: {e!r}")
+                        self._unavailable = True
+        return self._core
+
+    def respond(self, service_name: str, body: Dict) -> Optional[Dict]:
+        """Local result for a single-face request body of a service."""
+        core = self._estimators()
+        if core is None:
+            return None
+        try:
+            if service_name == 'head-pose':
+                face = self._face_landmarks(core, body['landmarks'], 468)
+                pose = core['head_pose'].estimate(face) if face is not None else None
+                if pose is None:
+                    return None
+                return {'yaw': pose.yaw, 'pitch': pose.pitch, 'roll': pose.roll, 'success': True, 'error': ''}
+            if service_name == 'gaze-tracking':
+                face = self._face_landmarks(core, body['landmarks'], 478)  # needs the iris points
+                gaze = core['gaze'].estimate(face) if face is not None else None
+                if gaze is None:
+                    return None
+                return {'gaze_x': gaze.gaze_x, 'gaze_y': gaze.gaze_y,
+                        'is_looking_at_camera': bool(core['gaze'].is_looking_at_camera(gaze)),
+                        'gaze_angle': math.degrees(math.atan(abs(gaze.gaze_x))), 'success': True, 'error': ''}
+            if service_name == 'blink-detection':
+                face = self._face_landmarks(core, body['landmarks'], 468)
+                if face is None:
+                    return None
+                detector = self._blink.get(body.get('meeting_id', ""), str(body.get('track_id', "")))
+                blink = detector.analyze(face)
+                return {'avg_ear': blink.avg_ear, 'perclos': blink.perclos * 100,  # service reports percent
+                        'is_drowsy': detector.is_drowsy(0), 'is_blinking': blink.is_blinking,
+                        'success': True, 'error': ''}
+            if service_name == 'attention-scorer':
+                return {'attention_score': self._score(core, body), 'alerts': [], 'success': True, 'error': ''}
+        except Exception as e:
+            logger.debug(f"In-process {service_name} failed: {e!r}")
+        return None
+
+    def respond_batch(self, service_name: str, body: Dict) -> List[Optional[Dict]]:
+        """Local results for a batch request body, one per face."""
+        if service_name == 'attention-scorer':
+            items = body.get('requests', [])
+        elif service_name == 'blink-detection':
+            items = [{**face, 'meeting_id': body.get('meeting_id', "")} for face in body.get('faces', [])]
+        else:
+            items = [{'landmarks': landmarks} for landmarks in body.get('faces', [])]
+        return [self.respond(service_name, item) for item in items]
+
+    @staticmethod
+    def _face_landmarks(core: Dict[str, Any], landmarks: List, required: int) -> Any:
+        """FaceLandmarks from REST dicts or protobuf messages (pixel coordinates).
+
+        None unless the first ``required`` FaceMesh points are all present.
+        """
+        tuples = PipelineOrchestrator._landmark_tuples(landmarks)
+        if len({i for i, _, _, _ in tuples if i < required}) < required:
+            return None
+        points = np.zeros((max([478] + [i + 1 for i, _, _, _ in tuples]), 3), dtype=np.float64)
+        for i, x, y, z in tuples:
+            points[i] = (x, y, z)
+        return core['FaceLandmarks'](landmarks=points)
+
+    @staticmethod
+    def _score(core: Dict[str, Any], body: Dict) -> float:
+        head_pose, gaze, blink = body.get('head_pose') or {}, body.get('gaze') or {}, body.get('blink') or {}
+        ear = blink.get('avg_ear', DEFAULT_BLINK['avg_ear'])
+        attention_metrics = core['scorer'].calculate(
+            core['HeadPose'](yaw=head_pose.get('yaw', 0), pitch=head_pose.get('pitch', 0),
+                             roll=head_pose.get('roll', 0)),
+            core['GazeInfo'](gaze_x=gaze.get('gaze_x', 0), gaze_y=gaze.get('gaze_y', 0)),
+            core['BlinkInfo'](left_ear=ear, right_ear=ear, avg_ear=ear,
+                              is_blinking=blink.get('is_blinking', False), blink_rate=0.0,
+                              perclos=blink.get('perclos', 0) / 100)
+        )
+        return core['scorer'].calculate_attention_score(attention_metrics)
+
+
 # Global orchestrator instance
 orchestrator_instance = None
 
@@ -103,22 +746,87 @@ class PipelineOrchestrator:
 
     def __init__(self):
         self.registry = ServiceRegistry()
+        self.registry.listeners.append(self._on_replicas_changed)
         self.redis_client = None
+        self.publisher: Optional[RedisPublisher] = None
+
+        # Async HTTP clients, one keep-alive pool per service (and replica),
+        # plus per-service concurrency limits
+        self.async_clients: Dict[str, httpx.AsyncClient] = {}
+        # Loop the clients and channels live on, and close tasks of retired ones
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: set = set()
+        self._async_limits = {
+            name: asyncio.Semaphore(config.max_concurrency)
+            for name, config in self.registry.all().items()
+        }
+        self.keepalive_expiry = float(os.getenv('KEEPALIVE_EXPIRY_SECONDS', '30'))
+
+        # Every frame gets a deadline of FRAME_TIMEOUT_SECONDS at ingress (or
+        # less, if the client sent X-Deadline-Ms); downstream calls get what
+        # is left of it. A failed connection or 503 is retried after an
+        # exponential backoff only if RETRY_MIN_BUDGET_SECONDS remain after it.
+        self.frame_timeout = float(os.getenv('FRAME_TIMEOUT_SECONDS', '10'))
+        self.retry_backoff = float(os.getenv('RETRY_BACKOFF_SECONDS', '0.05'))
+        self.retry_min_budget = float(os.getenv('RETRY_MIN_BUDGET_SECONDS', '0.25'))
+
+        # A circuit breaker per service (CIRCUIT_*): once too many recent calls
+        # failed or were slow, calls are skipped without waiting and per-face
+        # results come from the in-process estimators (CIRCUIT_FALLBACK=local)
+        # or the defaults ("defaults") until a probe call succeeds again
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        if os.getenv('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true':
+            self.breakers = {name: CircuitBreaker.from_env(name) for name in self.registry.all()}
+        self.local: Optional[LocalAnalysis] = (
+            LocalAnalysis() if os.getenv('CIRCUIT_FALLBACK', 'local').lower() == 'local' else None
+        )
 
-        # Connection pooling with optimized settings
-        from requests.adapters import HTTPAdapter
-        from urllib3.util.retry import Retry
-
-        self.session = requests.Session()
-
-        # Configure connection pooling
-        adapter = HTTPAdapter(
-            pool_connections=10,  # Number of connection pools
-            pool_maxsize=20,      # Max connections per pool
-            max_retries=Retry(total=2, backoff_factor=0.1)
+        # Protocol to the per-frame services: "rest" (JSON) or "grpc" (protobuf
+        # over a small pool of channels per service, with per-call deadlines)
+        self.service_protocol = os.getenv('SERVICE_PROTOCOL', 'rest').lower()
+        self.grpc_channels_per_service = int(os.getenv('GRPC_CHANNELS_PER_SERVICE', '2'))
+        self._grpc_modules: Dict[str, Any] = {}
+        self._grpc_channels: Dict[str, List[Any]] = {}
+        self._grpc_stubs: Dict[str, Tuple[List[Any], Any]] = {}
+        if self.service_protocol == 'grpc':
+            try:
+                for service_name, (proto_name, _) in GRPC_STUBS.items():
+                    self._grpc_modules[service_name] = load_stubs(proto_name)
+            except ImportError as e:
+                logger.warning(f"gRPC stubs unavailable, using REST: {e}")
+                self.service_protocol = 'rest'
+
+        # Send all faces of a frame to head-pose/gaze/blink/scorer as one
+        # batch request each; "false" falls back to per-face requests
+        self.downstream_batching = os.getenv('DOWNSTREAM_BATCHING', 'true').lower() == 'true'
+
+        # Frame transport to face/landmark detection:
+        # "json" posts base64 inside JSON, "binary" posts raw JPEG bytes
+        self.frame_transport = os.getenv('FRAME_TRANSPORT', 'json').lower()
+
+        # Shared-memory store for decoded frames, read by co-located
+        # face/landmark detection instead of decoding the JPEG again
+        self.frame_store: Optional[SharedFrameStore] = None
+        if os.getenv('FRAME_STORE_ENABLED', 'false').lower() == 'true':
+            self.frame_store = SharedFrameStore.from_env()
+            logger.info(f"Frame store enabled (prefix={self.frame_store.prefix})")
+
+        # "face-first" runs face detection on every frame, then landmarks;
+        # "landmarks-first" calls landmark detection directly and uses the
+        # landmark-derived boxes, running face detection only on every
+        # FACE_DETECTION_INTERVAL-th frame of a meeting (0 = never) and as a
+        # fallback when FaceMesh finds no face
+        self.pipeline_mode = os.getenv('PIPELINE_MODE', 'face-first').lower()
+        self.face_detection_interval = int(os.getenv('FACE_DETECTION_INTERVAL', '30'))
+        self._meeting_frames: OrderedDict = OrderedDict()
+        self._meeting_frames_lock = threading.Lock()  # frames of a meeting arrive on several threads
+
+        # Updates on meeting:{id}:attention: "full" publishes every frame's
+        # results, "delta" periodic keyframes plus only what changed in between
+        self.publish_mode = os.getenv('PUBLISH_MODE', 'full').lower()
+        self.delta_encoder: Optional[AttentionDeltaEncoder] = (
+            AttentionDeltaEncoder.from_env() if self.publish_mode == 'delta' else None
         )
-        self.session.mount('http://', adapter)
-        self.session.mount('https://', adapter)
 
         self._init_redis()
 
@@ -128,197 +836,821 @@ class PipelineOrchestrator:
             redis_url = os.getenv('REDIS_URL', 'redis://localhost:6379')
             self.redis_client = redis.from_url(redis_url)
             self.redis_client.ping()
-            logger.info("Connected to Redis")
+            self.publisher = RedisPublisher.from_env(self.redis_client, on_drop=self._publish_dropped)
+            logger.info(f"Connected to Redis (publishing {self.publisher.encoding})")
         except Exception as e:
             logger.warning(f"Redis connection failed: {e}")
             self.redis_client = None
 
-    def process_frame_rest(self, frame_data: str, meeting_id: str, request_id: str) -> Dict[str, Any]:
-        """Process frame via REST API calls to microservices."""
+    def close(self):
+        """Release any shared frames; flush queued results."""
+        if self.publisher is not None:
+            self.publisher.close()
+        if self.frame_store is not None:
+            self.frame_store.close()
+
+    def _share_frame(self, frame: FramePayload, meeting_id: str, request_id: str) -> None:
+        """Publish the decoded frame to the shared frame store.
+
+        The key is unique per call: request ids can repeat (client reuse,
+        timestamp fallbacks), and a put under an existing key replaces the
+        other frame's segment while it is still being read.
+        """
         try:
-            start_time = time.time()
+            rgb = frame.rgb()
+            if rgb is not None:
+                frame.frame_ref = self.frame_store.put(f"{meeting_id}/{request_id}/{uuid.uuid4().hex}", rgb)
+        except Exception as e:
+            logger.warning(f"Frame store unavailable, sending encoded frames: {e}")
+
+    @staticmethod
+    def _traced(result: Dict[str, Any], root: Span, spans: Optional[List[Span]]) -> Dict[str, Any]:
+        """Add the frame's trace id and, if recorded, its per-stage timings to a result."""
+        result['trace_id'] = root.trace_id
+        if spans is not None:
+            result['timings'] = timings(spans, root)
+        return result
+
+    def _face_detection_due(self, meeting_id: str) -> bool:
+        """Count a landmarks-first frame and tell whether it gets periodic face detection."""
+        with self._meeting_frames_lock:
+            count = self._meeting_frames.pop(meeting_id, 0)
+            self._meeting_frames[meeting_id] = count + 1
+            if len(self._meeting_frames) > MAX_TRACKED_MEETINGS:
+                self._meeting_frames.popitem(last=False)
+        return self.face_detection_interval > 0 and count % self.face_detection_interval == 0
+
+    @staticmethod
+    def _landmark_boxes(landmarks_result: Dict) -> List[Dict]:
+        """Face boxes derived from landmark detection, one per landmark face.
+
+        REST results carry a bbox per face; gRPC results only landmarks, so
+        the box is the landmarks' extent padded by 10% as in the service.
+        """
+        boxes = []
+        for face in landmarks_result.get('faces', []):
+            if face.get('bbox'):
+                boxes.append(face['bbox'])
+                continue
+            points = np.array([(x, y) for _, x, y, _ in PipelineOrchestrator._landmark_tuples(face['landmarks'])])
+            if not len(points):
+                boxes.append(None)
+                continue
+            (min_x, min_y), (max_x, max_y) = points.min(axis=0), points.max(axis=0)
+            pad_x, pad_y = (max_x - min_x) * 0.1, (max_y - min_y) * 0.1
+            boxes.append({
+                'x1': float(max(0, min_x - pad_x)), 'y1': float(max(0, min_y - pad_y)),
+                'x2': float(max_x + pad_x), 'y2': float(max_y + pad_y), 'confidence': 0.95
+            })
+        return boxes
+
+    @staticmethod
+    def _face_inputs(faces: List[Dict], landmarks_result: Dict) -> List[tuple]:
+        """Pair each face's landmarks with its track id and bbox."""
+        face_inputs = []
+        for face_idx, face_landmarks in enumerate(landmarks_result.get('faces', [])):
+            landmarks = face_landmarks.get('landmarks', [])
+            # Get bbox from landmark service (more accurate since it's the actual detected face)
+            face_bbox = face_landmarks.get('bbox', faces[face_idx] if face_idx < len(faces) else None)
+            logger.debug(f"Face {face_idx}: {len(landmarks)} landmarks, bbox: {face_bbox}")
+            face_inputs.append((str(face_idx), face_bbox, landmarks))
+        return face_inputs
+
+    @staticmethod
+    def _participant(track_id: str, face_bbox: Any, head_pose: Dict, gaze: Dict,
+                     blink: Dict, attention: Dict) -> Dict:
+        """Build the per-participant result published for a face."""
+        return {
+            'track_id': track_id,
+            'face': face_bbox,
+            'head_pose': head_pose,
+            'gaze': gaze,
+            'blink': blink,
+            'attention_score': attention.get('attention_score', 0),
+            'alerts': attention.get('alerts', [])
+        }
 
-            # Step 1: Face Detection
-            faces = self._detect_faces(frame_data, request_id)
-            logger.debug(f"Detected {len(faces)} faces")
+    def _admit(self, service_name: str) -> Optional[CircuitBreaker]:
+        """Claim a call on the service's breaker (None without breakers); its outcome must be recorded.
+
+        Raises:
+            CircuitOpen: If the circuit rejects the call
+        """
+        breaker = self.breakers.get(service_name)
+        if breaker is not None:
+            breaker.check()
+        return breaker
+
+    def _counts_against(self, service_name: str, error: BaseException, timeout: Optional[float]) -> Optional[bool]:
+        """True if a failed call counts against the service's circuit, None if it is neutral.
+
+        Cancelled calls (the frame gave up because of another stage) and
+        timeouts of calls whose budget was cut below the service's own
+        timeout are neutral: neither says anything about the service.
+        """
+        if isinstance(error, asyncio.CancelledError):
+            return None
+        if isinstance(error, grpc.RpcError) and error.code() == grpc.StatusCode.CANCELLED:
+            return None
+        timed_out = isinstance(error, httpx.TimeoutException) or (
+            isinstance(error, grpc.RpcError) and error.code() == grpc.StatusCode.DEADLINE_EXCEEDED
+        )
+        service_timeout = self.registry.get(service_name).timeout
+        if timed_out and timeout is not None and timeout < service_timeout - BUDGET_CAPPED_SLACK:
+            return None
+        return True
+
+    @staticmethod
+    def _settle(breaker: Optional[CircuitBreaker], failed: Optional[bool], seconds: float) -> None:
+        """Record a call's outcome on its breaker, or release the claim if the outcome is neutral (None)."""
+        if breaker is None:
+            return
+        if failed is None:
+            breaker.release()
+        else:
+            breaker.record(failed, seconds)
+
+    def _fallback(self, service_name: str, body: Dict, default: Dict) -> Dict:
+        """Result of a per-face call skipped by an open circuit: computed in-process, else the default."""
+        metrics.inc('circuit_fallbacks', service=service_name)
+        result = self.local.respond(service_name, body) if self.local is not None else None
+        return result if result is not None else dict(default)
+
+    def _fallback_batch(self, service_name: str, body: Dict, count: int, default: Dict) -> List[Dict]:
+        """Per-face results of a batch call skipped by an open circuit."""
+        metrics.inc('circuit_fallbacks', service=service_name)
+        results = self.local.respond_batch(service_name, body) if self.local is not None else []
+        if len(results) != count:
+            results = [None] * count
+        return [result if result is not None else dict(default) for result in results]
+
+    @staticmethod
+    def _binary_params(request_id: str, extra: Optional[Dict]) -> Dict[str, str]:
+        """Query parameters for /detect-binary; face boxes travel as a JSON list."""
+        params = {'request_id': request_id}
+        if extra and extra.get('faces'):
+            params['faces'] = json.dumps(extra['faces'])
+        return params
+
+    @staticmethod
+    def _blink_batch_body(faces: List[List], track_ids: List[str], request_id: str,
+                          meeting_id: str = "") -> Dict:
+        return {
+            'faces': [{'landmarks': landmarks, 'track_id': track_id}
+                      for landmarks, track_id in zip(faces, track_ids)],
+            'meeting_id': meeting_id,
+            'request_id': request_id
+        }
 
-            if not faces:
-                # Still publish empty result to Redis for real-time updates
-                if self.redis_client and meeting_id:
-                    self._publish_results(meeting_id, [])
-                return self._empty_response(request_id, meeting_id, start_time)
-
-            # Step 2: Landmark Detection
-            landmarks_result = self._detect_landmarks(frame_data, faces, request_id)
-            logger.debug(f"Landmark result: {len(landmarks_result.get('faces', []))} faces with landmarks")
-
-            results = []
-            from concurrent.futures import ThreadPoolExecutor, as_completed
-
-            for face_idx, face_landmarks in enumerate(landmarks_result.get('faces', [])):
-                landmarks = face_landmarks.get('landmarks', [])
-                # Get bbox from landmark service (more accurate since it's the actual detected face)
-                face_bbox = face_landmarks.get('bbox', faces[face_idx] if face_idx < len(faces) else None)
-                logger.debug(f"Face {face_idx}: {len(landmarks)} landmarks, bbox: {face_bbox}")
-
-                # Step 3-5: Head pose, gaze, blink - run in parallel for performance
-                with ThreadPoolExecutor(max_workers=3) as executor:
-                    head_pose_future = executor.submit(self._estimate_head_pose, landmarks, request_id)
-                    gaze_future = executor.submit(self._track_gaze, landmarks, request_id)
-                    blink_future = executor.submit(self._detect_blink, landmarks, str(face_idx), request_id)
-
-                    head_pose = head_pose_future.result()
-                    gaze = gaze_future.result()
-                    blink = blink_future.result()
-
-                logger.debug(f"Head pose: yaw={head_pose.get('yaw', 0):.1f}")
-                logger.debug(f"Gaze: {gaze}")
-                logger.debug(f"Blink: {blink}")
-
-                # Step 6: Attention Scoring
-                attention = self._score_attention(
-                    str(face_idx), head_pose, gaze, blink, request_id
-                )
-                logger.debug(f"Attention score: {attention.get('attention_score', 0)}")
-
-                results.append({
-                    'track_id': str(face_idx),
-                    'face': face_bbox,
-                    'head_pose': head_pose,
-                    'gaze': gaze,
-                    'blink': blink,
-                    'attention_score': attention.get('attention_score', 0),
-                    'alerts': attention.get('alerts', [])
-                })
-
-            total_time = (time.time() - start_time) * 1000
-
-            # Publish to Redis
-            if self.redis_client and meeting_id:
-                self._publish_results(meeting_id, results)
-
-            return {
-                'request_id': request_id,
-                'meeting_id': meeting_id,
-                'participants': results,
-                'processing_time_ms': total_time,
-                'success': True,
-                'error': ''
-            }
+    @staticmethod
+    def _score_batch_body(track_ids: List[str], head_poses: List[Dict], gazes: List[Dict],
+                          blinks: List[Dict], request_id: str, meeting_id: str = "") -> Dict:
+        return {
+            'requests': [
+                {'track_id': track_id, 'head_pose': head_pose, 'gaze': gaze,
+                 'blink': blink, 'request_id': request_id}
+                for track_id, head_pose, gaze, blink in zip(track_ids, head_poses, gazes, blinks)
+            ],
+            'meeting_id': meeting_id,
+            'request_id': request_id
+        }
 
-        except Exception as e:
-            logger.error(f"Pipeline error: {e}")
-            return {
-                'request_id': request_id,
-                'meeting_id': meeting_id,
-                'participants': [],
-                'processing_time_ms': 0,
-                'success': False,
-                'error': str(e)
-            }
-
-    def _detect_faces(self, frame_data: str, request_id: str) -> List[Dict]:
-        """Call face detection service via REST."""
-        try:
-            service = self.registry.get('face-detection')
-            response = self.session.post(
-                f"{service.url}/detect",
-                json={'frame_data': frame_data, 'request_id': request_id},
-                timeout=service.timeout
+    # ------------------------------------------------------------------
+    # Downstream calls: all run on the event loop, so in-flight frames
+    # wait there instead of holding a worker thread each
+    # ------------------------------------------------------------------
+
+    def _async_client(self, service_name: str, route_key: str = "") -> httpx.AsyncClient:
+        """Keep-alive HTTP client for the service replica serving a routing key, created on first use."""
+        service = self.registry.get(service_name)
+        url = service.endpoint(route_key)[0]
+        # The service address keeps the plain service name as its key
+        key = service_name if url == service.url else f"{service_name}@{url}"
+        client = self.async_clients.get(key)
+        if client is None:
+            self._loop = asyncio.get_running_loop()
+            limits = httpx.Limits(
+                max_connections=service.max_concurrency,
+                max_keepalive_connections=service.max_concurrency,
+                keepalive_expiry=self.keepalive_expiry
             )
-            if response.status_code == 200:
-                result = response.json()
-                return result.get('faces', [])
+            client = httpx.AsyncClient(
+                base_url=url,
+                timeout=service.timeout,
+                # Retried by _post_async within the frame's budget instead
+                transport=httpx.AsyncHTTPTransport(limits=limits)
+            )
+            self.async_clients[key] = client
+        return client
+
+    def _on_replicas_changed(self, service_name: str):
+        """Registry listener (any thread): retire the clients of removed replicas on the event loop."""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._retire_replicas, service_name)
+
+    def _retire_replicas(self, service_name: str):
+        """Stop using the clients and channels of replicas that left the service's hash ring.
+
+        They are closed once the calls already in flight on them are done:
+        every call is bounded by the service timeout, so that is the grace
+        period.
+        """
+        service = self.registry.get(service_name)
+        urls = {url for url, _ in service.replicas.values()}
+        targets = {target for _, target in service.replicas.values()}
+        clients = [
+            self.async_clients.pop(key) for key in list(self.async_clients)
+            if key.startswith(f"{service_name}@") and key.split('@', 1)[1] not in urls
+        ]
+        channels = []
+        for key in [k for k in self._grpc_channels if k.startswith(f"{service_name}@")]:
+            if key.split('@', 1)[1] not in targets:
+                del self._grpc_stubs[key]
+                channels += self._grpc_channels.pop(key)
+        if clients or channels:
+            task = asyncio.get_running_loop().create_task(self._close_drained(clients, channels, service.timeout))
+            # Keep a reference until done, or the task may be collected mid-way
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _close_drained(clients: List[httpx.AsyncClient], channels: List[Any], grace: float):
+        """Close retired clients and channels after their in-flight calls had ``grace`` seconds to finish."""
+        try:
+            await asyncio.sleep(grace)
+        finally:
+            for client in clients:
+                await client.aclose()
+            for channel in channels:
+                await channel.close()
+
+    async def aclose(self):
+        """Close the async HTTP clients and gRPC channels, retired ones without waiting."""
+        for task in list(self._closing):
+            task.cancel()
+        await asyncio.gather(*self._closing, return_exceptions=True)
+
+        clients, self.async_clients = self.async_clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+        channels, self._grpc_channels, self._grpc_stubs = self._grpc_channels, {}, {}
+        for pool in channels.values():
+            for channel in pool:
+                await channel.close()
+
+    async def _post_async(self, service_name: str, path: str, route_key: str = "",
+                          **kwargs) -> Optional[Dict]:
+        """POST to a service within its concurrency limit and the frame's deadline; None on non-200.
+
+        Each attempt's timeout is the service timeout capped by the budget
+        left, and is sent along as the service's deadline. Connection
+        failures and 503s are retried while the budget can afford it.
+
+        Raises:
+            CircuitOpen: If the service's circuit rejects the call
+        """
+        client = self._async_client(service_name, route_key)
+        with deadline.scope(self.registry.get(service_name).timeout):
+            attempt = 0
+            while True:
+                error = None
+                try:
+                    response = await self._async_attempt(client, service_name, path, kwargs)
+                    if response.status_code != 503:
+                        break
+                except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                    error = e
+                delay = deadline.retry_delay(attempt, self.retry_backoff, self.retry_min_budget)
+                if delay is None:
+                    if error is not None:
+                        raise error
+                    break
+                metrics.inc('downstream_retries', service=service_name)
+                await asyncio.sleep(delay)
+                attempt += 1
+        if response.status_code == 200:
+            return response.json()
+        return None
+
+    async def _async_attempt(self, client: httpx.AsyncClient, service_name: str, path: str,
+                             kwargs: Dict) -> httpx.Response:
+        """One POST within the service's concurrency limit, timed as the service's downstream stage and traced.
+
+        The circuit is checked before waiting for a slot; the timeout is
+        what is left of the budget once a slot is free.
+        """
+        breaker = self._admit(service_name)
+        sent = False
+        try:
+            async with self._async_limits[service_name]:
+                timeout = deadline.time_left()
+                sent = True
+                start = time.perf_counter()
+                outcome, failed = 'error', True
+                with tracer.span(f"{service_name} {path}", service=service_name) as span:
+                    headers = {**kwargs.get('headers', {}), TRACEPARENT: span.traceparent,
+                               **deadline.header(timeout)}
+                    try:
+                        response = await client.post(path, **{**kwargs, 'headers': headers, 'timeout': timeout})
+                        outcome = 'success' if response.status_code == 200 else 'error'
+                        failed = response.status_code >= 500
+                        return response
+                    except BaseException as e:
+                        failed = self._counts_against(service_name, e, timeout)
+                        raise
+                    finally:
+                        elapsed = time.perf_counter() - start
+                        self._settle(breaker, failed, elapsed)
+                        span.set(outcome=outcome)
+                        metrics.observe('downstream', elapsed, traced=False, service=service_name)
+                        metrics.inc('downstream_calls', service=service_name, outcome=outcome)
+        finally:
+            if breaker is not None and not sent:
+                breaker.release()
+
+    async def _call_async(self, service_name: str, path: str, body: Dict, default: Dict,
+                          route_key: str = "") -> Dict:
+        """POST a JSON body, returning the in-process result while the circuit is open and the default on failure."""
+        try:
+            result = await self._post_async(service_name, path, route_key, json=body)
+            if result is not None:
+                return result
+        except CircuitOpen:
+            return self._fallback(service_name, body, default)
         except Exception as e:
-            logger.error(f"Face detection error: {e}")
-        return []
+            logger.error(f"{service_name} error: {e!r}")
+        return dict(default)
 
-    def _detect_landmarks(self, frame_data: str, faces: List, request_id: str) -> Dict:
-        """Call landmark detection service via REST."""
+    async def _call_batch_async(self, service_name: str, path: str, body: Dict,
+                                count: int, default: Dict, route_key: str = "") -> List[Dict]:
+        """POST a batch body, returning per-face fallback results while the circuit is open and defaults on failure."""
         try:
-            service = self.registry.get('landmark-detection')
-            response = self.session.post(
-                f"{service.url}/detect",
-                json={'frame_data': frame_data, 'faces': faces, 'request_id': request_id},
-                timeout=service.timeout
-            )
-            if response.status_code == 200:
-                return response.json()
+            result = await self._post_async(service_name, path, route_key, json=body)
+            if result is not None:
+                responses = result.get('responses', [])
+                if len(responses) == count:
+                    return responses
+                logger.warning(f"{service_name} returned {len(responses)} results for {count} faces")
+        except CircuitOpen:
+            return self._fallback_batch(service_name, body, count, default)
         except Exception as e:
-            logger.error(f"Landmark detection error: {e}")
-        return {'faces': []}
+            logger.error(f"{service_name} batch error: {e!r}")
+        return [dict(default) for _ in range(count)]
+
+    async def _post_frame_async(self, service_name: str, frame: FramePayload,
+                                request_id: str, extra: Optional[Dict] = None) -> Optional[Dict]:
+        """POST a frame to a detection service and return the parsed result.
+
+        Uses the shared frame reference when available, falling back to the
+        configured transport if the service cannot read the frame store.
+        Frame encoding runs off the event loop.
+        """
+        if frame.frame_ref:
+            result = await self._post_async(
+                service_name, '/detect',
+                json={'frame_ref': frame.frame_ref, 'request_id': request_id, **(extra or {})}
+            )
+            if result is not None and result.get('success', True):
+                return result
+            logger.warning(f"{service_name} could not read the shared frame, sending encoded frame")
+
+        if self.frame_transport == 'binary':
+            return await self._post_async(
+                service_name, '/detect-binary',
+                content=await asyncio.to_thread(frame.encoded),
+                params=self._binary_params(request_id, extra),
+                headers={'Content-Type': 'image/jpeg'}
+            )
+        return await self._post_async(
+            service_name, '/detect',
+            json={'frame_data': await asyncio.to_thread(frame.base64),
+                  'request_id': request_id, **(extra or {})}
+        )
 
-    def _estimate_head_pose(self, landmarks: List, request_id: str) -> Dict:
-        """Call head pose service via REST."""
+    def _grpc_stub(self, service_name: str, route_key: str = "") -> Any:
+        """Next stub from the channel pool of the replica serving a routing key, created on first use."""
+        service = self.registry.get(service_name)
+        target = service.endpoint(route_key)[1]
+        key = service_name if target == service.grpc_target else f"{service_name}@{target}"
+        if key not in self._grpc_stubs:
+            self._loop = asyncio.get_running_loop()
+            pb2, pb2_grpc = self._grpc_modules[service_name]
+            stub_class = getattr(pb2_grpc, GRPC_STUBS[service_name][1])
+            channels = [
+                grpc.aio.insecure_channel(target, options=[
+                    ('grpc.max_receive_message_length', 50 * 1024 * 1024),
+                    ('grpc.max_send_message_length', 50 * 1024 * 1024),
+                    ('grpc.keepalive_time_ms', 30000),
+                    # Own subchannels, so each channel is a separate HTTP/2 connection
+                    ('grpc.use_local_subchannel_pool', 1),
+                ])
+                for _ in range(self.grpc_channels_per_service)
+            ]
+            self._grpc_channels[key] = channels
+            self._grpc_stubs[key] = ([stub_class(c) for c in channels], itertools.count())
+        stubs, counter = self._grpc_stubs[key]
+        return stubs[next(counter) % len(stubs)]
+
+    def _retire_grpc_channels(self, service_name: str):
+        """Close the channels of replicas that left the service's hash ring."""
+        service = self.registry.get(service_name)
+        current = {target for _, target in service.replicas.values()}
+        for key in [k for k in self._grpc_channels if k.startswith(f"{service_name}@")]:
+            if key.split('@', 1)[1] not in current:
+                del self._grpc_stubs[key]
+                for channel in self._grpc_channels.pop(key):
+                    asyncio.ensure_future(channel.close())
+
+    def _uses_grpc(self, frame: FramePayload) -> bool:
+        # A shared frame is only addressable through the REST frame_ref field
+        return self.service_protocol == 'grpc' and not frame.frame_ref
+
+    async def _call_grpc(self, service_name: str, method: str, request: Any, route_key: str = "") -> Any:
+        """Unary gRPC call within the service's concurrency limit and deadline.
+
+        The call deadline is the service timeout capped by the frame's
+        remaining budget. The circuit is checked like in _async_attempt.
+        """
+        stub = self._grpc_stub(service_name, route_key)
+        breaker = self._admit(service_name)
+        sent = False
+        try:
+            async with self._async_limits[service_name]:
+                with deadline.scope(self.registry.get(service_name).timeout):
+                    timeout = deadline.time_left()
+                sent = True
+                start = time.perf_counter()
+                outcome, failed = 'error', True
+                with tracer.span(f"{service_name} {method}", service=service_name) as span:
+                    try:
+                        response = await getattr(stub, method)(
+                            request, timeout=timeout, metadata=((TRACEPARENT, span.traceparent),)
+                        )
+                        outcome, failed = 'success', False
+                        return response
+                    except BaseException as e:
+                        failed = self._counts_against(service_name, e, timeout)
+                        raise
+                    finally:
+                        elapsed = time.perf_counter() - start
+                        self._settle(breaker, failed, elapsed)
+                        span.set(outcome=outcome)
+                        metrics.observe('downstream', elapsed, traced=False, service=service_name)
+                        metrics.inc('downstream_calls', service=service_name, outcome=outcome)
+        finally:
+            if breaker is not None and not sent:
+                breaker.release()
+
+    @staticmethod
+    def _landmark_tuples(landmarks: List) -> List[tuple]:
+        """(index, x, y, z) per landmark, from REST dicts or protobuf messages."""
+        if landmarks and isinstance(landmarks[0], dict):
+            return [(lm['index'], lm['x'], lm['y'], lm.get('z', 0)) for lm in landmarks]
+        return [(lm.index, lm.x, lm.y, lm.z) for lm in landmarks]
+
+    def _landmark_messages(self, service_name: str, landmarks: List) -> List[Any]:
+        landmark_class = self._grpc_modules[service_name][0].Landmark
+        return [landmark_class(index=i, x=x, y=y, z=z) for i, x, y, z in self._landmark_tuples(landmarks)]
+
+    async def _detect_grpc(self, service_name: str, frame: FramePayload, request_id: str,
+                           faces: Optional[List[Dict]] = None) -> Optional[Dict]:
+        """Face or landmark detection over gRPC with the encoded frame as bytes.
+
+        Landmarks are kept as protobuf messages and passed on without
+        converting them to dicts.
+        """
+        pb2 = self._grpc_modules[service_name][0]
+        frame_data = await asyncio.to_thread(frame.encoded)
+        if service_name == 'face-detection':
+            response = await self._call_grpc(service_name, 'DetectFaces', pb2.DetectRequest(
+                request_id=request_id, frame_data=frame_data, confidence_threshold=0.5
+            ))
+            if not response.success:
+                return None
+            return {'faces': [
+                {'x1': f.x1, 'y1': f.y1, 'x2': f.x2, 'y2': f.y2, 'confidence': f.confidence}
+                for f in response.faces
+            ]}
+
+        response = await self._call_grpc(service_name, 'DetectLandmarks', pb2.LandmarkRequest(
+            request_id=request_id, frame_data=frame_data,
+            faces=[pb2.BoundingBox(x1=f['x1'], y1=f['y1'], x2=f['x2'], y2=f['y2']) for f in faces or []]
+        ))
+        if not response.success:
+            return None
+        return {'faces': [{'landmarks': face.landmarks} for face in response.faces]}
+
+    async def _estimate_head_pose_grpc(self, faces: List[List], request_id: str) -> List[Dict]:
+        """One BatchEstimate call for all faces."""
+        try:
+            pb2 = self._grpc_modules['head-pose'][0]
+            response = await self._call_grpc('head-pose', 'BatchEstimate', pb2.BatchPoseRequest(requests=[
+                # Same camera model as the REST /estimate defaults
+                pb2.PoseRequest(request_id=request_id, landmarks=self._landmark_messages('head-pose', lms),
+                                frame_width=640, frame_height=480)
+                for lms in faces
+            ]))
+            return [
+                {'yaw': r.pose.yaw, 'pitch': r.pose.pitch, 'roll': r.pose.roll,
+                 'success': r.success, 'error': r.error}
+                for r in response.responses
+            ]
+        except CircuitOpen:
+            return self._fallback_batch('head-pose', {'faces': faces}, len(faces), DEFAULT_HEAD_POSE)
+        except grpc.RpcError as e:
+            logger.error(f"Head pose gRPC error: {e!r}")
+        return [dict(DEFAULT_HEAD_POSE) for _ in faces]
+
+    async def _track_gaze_grpc(self, faces: List[List], request_id: str) -> List[Dict]:
+        """One BatchEstimate call for all faces."""
+        try:
+            pb2 = self._grpc_modules['gaze-tracking'][0]
+            response = await self._call_grpc('gaze-tracking', 'BatchEstimate', pb2.BatchGazeRequest(requests=[
+                pb2.GazeRequest(request_id=request_id, landmarks=self._landmark_messages('gaze-tracking', lms))
+                for lms in faces
+            ]))
+            return [
+                {'gaze_x': r.gaze.gaze_x, 'gaze_y': r.gaze.gaze_y,
+                 'is_looking_at_camera': r.gaze.is_looking_at_camera if r.success else True,
+                 'gaze_angle': r.gaze.gaze_angle, 'success': r.success, 'error': r.error}
+                for r in response.responses
+            ]
+        except CircuitOpen:
+            return self._fallback_batch('gaze-tracking', {'faces': faces}, len(faces), DEFAULT_GAZE)
+        except grpc.RpcError as e:
+            logger.error(f"Gaze tracking gRPC error: {e!r}")
+        return [dict(DEFAULT_GAZE) for _ in faces]
+
+    async def _detect_blink_grpc(self, faces: List[List], track_ids: List[str], request_id: str,
+                                 meeting_id: str = "") -> List[Dict]:
+        """AnalyzeBlink per face, concurrently (the proto has no batch RPC)."""
+        pb2 = self._grpc_modules['blink-detection'][0]
+
+        async def analyze(landmarks: List, track_id: str) -> Dict:
+            try:
+                r = await self._call_grpc('blink-detection', 'AnalyzeBlink', pb2.BlinkRequest(
+                    request_id=request_id, track_id=track_id, meeting_id=meeting_id,
+                    landmarks=self._landmark_messages('blink-detection', landmarks)
+                ), meeting_id)
+                if r.success:
+                    return {'avg_ear': r.blink.avg_ear, 'perclos': r.blink.perclos,
+                            'is_drowsy': r.blink.is_drowsy, 'is_blinking': r.blink.is_blinking,
+                            'blink_count': r.blink.blink_count, 'success': True, 'error': ''}
+            except CircuitOpen:
+                return self._fallback('blink-detection', {'landmarks': landmarks, 'track_id': track_id,
+                                                          'meeting_id': meeting_id}, DEFAULT_BLINK)
+            except grpc.RpcError as e:
+                logger.error(f"Blink detection gRPC error: {e!r}")
+            return dict(DEFAULT_BLINK)
+
+        return list(await asyncio.gather(*(analyze(lms, tid) for lms, tid in zip(faces, track_ids))))
+
+    async def process_frame_async(self, frame_data: Union[str, bytes, np.ndarray], meeting_id: str,
+                                  request_id: str, traceparent: Optional[str] = None,
+                                  include_timings: bool = False, state_key: Optional[str] = None,
+                                  publish: bool = True) -> Dict[str, Any]:
+        """Process a frame on the event loop.
+
+        The whole frame is bounded by its deadline (FRAME_TIMEOUT_SECONDS, or
+        an earlier one set by the caller); when it passes all in-flight
+        downstream requests are cancelled. frame_data may be a base64
+        string, encoded image bytes or a BGR array. The frame is a trace
+        (continuing ``traceparent`` if given) whose context travels with
+        every downstream request; ``include_timings`` adds its spans to the
+        result.
+
+        Args:
+            state_key: Scope of the per-track state kept by the services
+                (blink history, score smoothing); defaults to meeting_id
+            publish: Publish the results on the meeting's Redis channel
+        """
+        with tracer.record() if include_timings else nullcontext() as spans, \
+                tracer.span('process_frame', traceparent, meeting_id=meeting_id, request_id=request_id) as root, \
+                deadline.scope(self.frame_timeout):
+            result = await self._run_frame_async(frame_data, meeting_id, request_id,
+                                                 state_key or meeting_id, publish)
+        return self._traced(result, root, spans)
+
+    async def _run_frame_async(self, frame_data: Union[str, bytes, np.ndarray], meeting_id: str,
+                               request_id: str, state_key: str, publish: bool) -> Dict[str, Any]:
+        start_time = time.time()
+        frame = FramePayload(frame_data)
         try:
-            service = self.registry.get('head-pose')
-            response = self.session.post(
-                f"{service.url}/estimate",
-                json={'landmarks': landmarks, 'request_id': request_id},
-                timeout=service.timeout
+            if deadline.expired():
+                # Ran out of budget before starting, e.g. waiting for admission
+                raise DeadlineExceeded()
+            if self.frame_store is not None:
+                await asyncio.to_thread(self._share_frame, frame, meeting_id, request_id)
+            return await asyncio.wait_for(
+                self._process_frame_async(frame, meeting_id, request_id, start_time, state_key, publish),
+                timeout=deadline.time_left()
             )
-            if response.status_code == 200:
-                return response.json()
+        except (asyncio.TimeoutError, DeadlineExceeded):
+            elapsed = time.time() - start_time
+            logger.warning(f"Frame {request_id} timed out after {elapsed:.3f}s")
+            error = f"Frame processing timed out after {elapsed:.3f}s (deadline exceeded)"
         except Exception as e:
-            logger.error(f"Head pose error: {e}")
-        return {'yaw': 0, 'pitch': 0, 'roll': 0}
+            logger.error(f"Pipeline error: {e}")
+            error = str(e)
+        finally:
+            if frame.frame_ref:
+                self.frame_store.release(frame.frame_ref)
 
-    def _track_gaze(self, landmarks: List, request_id: str) -> Dict:
-        """Call gaze tracking service via REST."""
-        try:
-            service = self.registry.get('gaze-tracking')
-            response = self.session.post(
-                f"{service.url}/track",
-                json={'landmarks': landmarks, 'request_id': request_id},
-                timeout=service.timeout
+        return {
+            'request_id': request_id,
+            'meeting_id': meeting_id,
+            'participants': [],
+            'processing_time_ms': (time.time() - start_time) * 1000,
+            'success': False,
+            'error': error
+        }
+
+    async def _process_frame_async(self, frame: FramePayload, meeting_id: str, request_id: str,
+                                   start_time: float, state_key: str, publish: bool) -> Dict[str, Any]:
+        # Step 1-2: Face and landmark detection
+        faces, landmarks_result = await self._locate_faces_async(frame, state_key, request_id)
+
+        if not faces:
+            if meeting_id and publish:
+                self._publish_results(meeting_id, [])
+            return self._empty_response(request_id, meeting_id, start_time)
+
+        # Step 3-6: Head pose, gaze, blink and attention scoring
+        results = await self._analyze_faces_async(self._face_inputs(faces, landmarks_result), request_id, state_key)
+
+        if meeting_id and publish:
+            self._publish_results(meeting_id, results)
+
+        return {
+            'request_id': request_id,
+            'meeting_id': meeting_id,
+            'participants': results,
+            'processing_time_ms': (time.time() - start_time) * 1000,
+            'success': True,
+            'error': ''
+        }
+
+    async def _locate_faces_async(self, frame: FramePayload, meeting_id: str,
+                                  request_id: str) -> Tuple[List[Dict], Dict]:
+        """Face boxes and landmarks for a frame, following the pipeline mode."""
+        if self.pipeline_mode != 'landmarks-first':
+            faces = await self._detect_faces_async(frame, request_id)
+            logger.debug(f"Detected {len(faces)} faces")
+            if not faces:
+                return [], {'faces': []}
+            return faces, await self._detect_landmarks_async(frame, faces, request_id)
+
+        detected = None
+        if self._face_detection_due(meeting_id):
+            landmarks_result, detected = await asyncio.gather(
+                self._detect_landmarks_async(frame, [], request_id),
+                self._detect_faces_async(frame, request_id)
             )
-            if response.status_code == 200:
-                return response.json()
+        else:
+            landmarks_result = await self._detect_landmarks_async(frame, [], request_id)
+
+        if detected is None and not landmarks_result.get('faces'):
+            detected = await self._detect_faces_async(frame, request_id)
+        if detected and len(detected) > len(landmarks_result.get('faces', [])):
+            # FaceMesh missed faces the detector found: retry with their boxes
+            landmarks_result = await self._detect_landmarks_async(frame, detected, request_id)
+        return self._landmark_boxes(landmarks_result), landmarks_result
+
+    async def _detect_faces_async(self, frame: FramePayload, request_id: str) -> List[Dict]:
+        """Call face detection over gRPC or REST."""
+        try:
+            if self._uses_grpc(frame):
+                result = await self._detect_grpc('face-detection', frame, request_id)
+            else:
+                result = await self._post_frame_async('face-detection', frame, request_id)
+            if result is not None:
+                return result.get('faces', [])
+        except CircuitOpen:
+            logger.debug("Face detection skipped, circuit open")
         except Exception as e:
-            logger.error(f"Gaze tracking error: {e}")
-        return {'gaze_x': 0, 'gaze_y': 0, 'is_looking_at_camera': True}
+            logger.error(f"Face detection error: {e!r}")
+        return []
 
-    def _detect_blink(self, landmarks: List, track_id: str, request_id: str) -> Dict:
-        """Call blink detection service via REST."""
+    async def _detect_landmarks_async(self, frame: FramePayload, faces: List, request_id: str) -> Dict:
+        """Call landmark detection over gRPC or REST."""
         try:
-            service = self.registry.get('blink-detection')
-            response = self.session.post(
-                f"{service.url}/detect",
-                json={'landmarks': landmarks, 'track_id': track_id, 'request_id': request_id},
-                timeout=service.timeout
-            )
-            if response.status_code == 200:
-                return response.json()
+            if self._uses_grpc(frame):
+                result = await self._detect_grpc('landmark-detection', frame, request_id, faces)
+            else:
+                result = await self._post_frame_async('landmark-detection', frame, request_id, {'faces': faces})
+            if result is not None:
+                return result
+        except CircuitOpen:
+            logger.debug("Landmark detection skipped, circuit open")
         except Exception as e:
-            logger.error(f"Blink detection error: {e}")
-        return {'avg_ear': 0.25, 'perclos': 0, 'is_drowsy': False}
+            logger.error(f"Landmark detection error: {e!r}")
+        return {'faces': []}
 
-    def _score_attention(self, track_id: str, head_pose: Dict, gaze: Dict, blink: Dict, request_id: str) -> Dict:
-        """Call attention scorer service via REST."""
-        try:
-            service = self.registry.get('attention-scorer')
-            response = self.session.post(
-                f"{service.url}/score",
-                json={
-                    'track_id': track_id,
-                    'head_pose': head_pose,
-                    'gaze': gaze,
-                    'blink': blink,
-                    'request_id': request_id
-                },
-                timeout=service.timeout
+    async def _analyze_faces_async(self, face_inputs: List[tuple], request_id: str,
+                                   meeting_id: str = "") -> List[Dict]:
+        """Analyze faces over gRPC, with one batch request per service, or per face.
+
+        Batches for head pose, gaze and blink run concurrently, followed by
+        a single scoring batch, so calls per frame do not grow with faces.
+        """
+        if not face_inputs:
+            return []
+
+        if self.service_protocol == 'grpc':
+            track_ids = [track_id for track_id, _, _ in face_inputs]
+            all_landmarks = [landmarks for _, _, landmarks in face_inputs]
+            head_poses, gazes, blinks = await asyncio.gather(
+                self._estimate_head_pose_grpc(all_landmarks, request_id),
+                self._track_gaze_grpc(all_landmarks, request_id),
+                self._detect_blink_grpc(all_landmarks, track_ids, request_id, meeting_id),
             )
-            if response.status_code == 200:
-                return response.json()
-        except Exception as e:
-            logger.error(f"Attention scoring error: {e}")
-        return {'attention_score': 75.0, 'alerts': []}
+            # The attention scorer is REST-only
+            attentions = await self._call_batch_async(
+                'attention-scorer', '/score-batch',
+                self._score_batch_body(track_ids, head_poses, gazes, blinks, request_id, meeting_id),
+                len(face_inputs), DEFAULT_ATTENTION, meeting_id
+            )
+            return [
+                self._participant(track_id, face_bbox, head_pose, gaze, blink, attention)
+                for (track_id, face_bbox, _), head_pose, gaze, blink, attention in zip(
+                    face_inputs, head_poses, gazes, blinks, attentions)
+            ]
+
+        if self.downstream_batching:
+            track_ids = [track_id for track_id, _, _ in face_inputs]
+            all_landmarks = [landmarks for _, _, landmarks in face_inputs]
+            count = len(face_inputs)
+            head_poses, gazes, blinks = await asyncio.gather(
+                self._call_batch_async('head-pose', '/estimate-batch',
+                                       {'faces': all_landmarks, 'request_id': request_id},
+                                       count, DEFAULT_HEAD_POSE),
+                self._call_batch_async('gaze-tracking', '/track-batch',
+                                       {'faces': all_landmarks, 'request_id': request_id},
+                                       count, DEFAULT_GAZE),
+                self._call_batch_async('blink-detection', '/detect-batch',
+                                       self._blink_batch_body(all_landmarks, track_ids, request_id, meeting_id),
+                                       count, DEFAULT_BLINK, meeting_id),
+            )
+            attentions = await self._call_batch_async(
+                'attention-scorer', '/score-batch',
+                self._score_batch_body(track_ids, head_poses, gazes, blinks, request_id, meeting_id),
+                count, DEFAULT_ATTENTION, meeting_id
+            )
+            return [
+                self._participant(track_id, face_bbox, head_pose, gaze, blink, attention)
+                for (track_id, face_bbox, _), head_pose, gaze, blink, attention in zip(
+                    face_inputs, head_poses, gazes, blinks, attentions)
+            ]
+
+        async def analyze_face(track_id: str, face_bbox: Any, landmarks: List) -> Dict:
+            head_pose, gaze, blink = await asyncio.gather(
+                self._call_async('head-pose', '/estimate',
+                                 {'landmarks': landmarks, 'request_id': request_id}, DEFAULT_HEAD_POSE),
+                self._call_async('gaze-tracking', '/track',
+                                 {'landmarks': landmarks, 'request_id': request_id}, DEFAULT_GAZE),
+                self._call_async('blink-detection', '/detect',
+                                 {'landmarks': landmarks, 'track_id': track_id, 'meeting_id': meeting_id,
+                                  'request_id': request_id},
+                                 DEFAULT_BLINK, meeting_id),
+            )
+            attention = await self._call_async(
+                'attention-scorer', '/score',
+                {'track_id': track_id, 'meeting_id': meeting_id, 'head_pose': head_pose, 'gaze': gaze,
+                 'blink': blink, 'request_id': request_id},
+                DEFAULT_ATTENTION, meeting_id
+            )
+            return self._participant(track_id, face_bbox, head_pose, gaze, blink, attention)
+
+        return list(await asyncio.gather(*(analyze_face(*face) for face in face_inputs)))
 
     def _publish_results(self, meeting_id: str, results: List):
-        """Publish results to Redis."""
+        """Queue results for the meeting's Redis channel (published off the request path)."""
+        if self.publisher is None:
+            return
         channel = f"meeting:{meeting_id}:attention"
         logger.debug(f"Publishing to Redis channel: {channel}, results count: {len(results)}")
-        self.redis_client.publish(channel, json.dumps(results))
+        if self.delta_encoder is None:
+            self.publisher.publish(channel, results)
+            return
+        update = self.delta_encoder.encode(meeting_id, results)
+        if update is not None:
+            # A keyframe makes the deltas still queued for the meeting obsolete
+            self.publisher.publish(channel, update, supersedes=update['type'] == 'keyframe')
+
+    def _publish_dropped(self, channel: str):
+        """A message of the channel never reached Redis: restart its meeting with a keyframe.
+
+        The delta encoder counts participants as sent when it encodes them, so
+        after a lost delta subscribers would keep stale values until the next
+        scheduled keyframe.
+        """
+        if self.delta_encoder is None:
+            return
+        prefix, suffix = 'meeting:', ':attention'
+        if channel.startswith(prefix) and channel.endswith(suffix):
+            self.delta_encoder.forget(channel[len(prefix):-len(suffix)])
 
     def _empty_response(self, request_id: str, meeting_id: str, start_time: float) -> Dict:
         return {
@@ -331,6 +1663,73 @@ class PipelineOrchestrator:
         }
 
 
+class MeetingAdmission:
+    """Latest-frame-wins admission of frames per meeting.
+
+    At most ``max_in_flight`` frames of a meeting run through the pipeline
+    at once. One more frame may wait for a slot; a newer frame replaces it,
+    and the replaced frame is dropped. Under overload a meeting therefore
+    gets results for its freshest frames instead of a growing backlog.
+    Used from the event loop only.
+    """
+
+    def __init__(self, max_in_flight: int = 2):
+        self.max_in_flight = max(1, max_in_flight)
+        self._in_flight: Dict[str, int] = {}
+        self._waiting: Dict[str, asyncio.Future] = {}
+        self.admitted_total = 0
+        self.dropped_total = 0
+
+    async def admit(self, meeting_id: str) -> bool:
+        """Wait for a slot; False if a newer frame superseded this one."""
+        if self._in_flight.get(meeting_id, 0) < self.max_in_flight and meeting_id not in self._waiting:
+            self._in_flight[meeting_id] = self._in_flight.get(meeting_id, 0) + 1
+            self.admitted_total += 1
+            return True
+
+        previous = self._waiting.pop(meeting_id, None)
+        if previous is not None and not previous.done():
+            previous.set_result(False)
+            self.dropped_total += 1
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting[meeting_id] = waiter
+        try:
+            admitted = await waiter
+        except asyncio.CancelledError:
+            if self._waiting.get(meeting_id) is waiter:
+                del self._waiting[meeting_id]
+            elif waiter.done() and not waiter.cancelled() and waiter.result():
+                # The slot was handed over just before cancellation
+                self.release(meeting_id)
+            raise
+        if admitted:
+            self.admitted_total += 1
+        return admitted
+
+    def release(self, meeting_id: str) -> None:
+        """Finish an admitted frame, handing its slot to the waiting frame."""
+        waiter = self._waiting.pop(meeting_id, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(True)
+            return
+        remaining = self._in_flight.get(meeting_id, 1) - 1
+        if remaining > 0:
+            self._in_flight[meeting_id] = remaining
+        else:
+            self._in_flight.pop(meeting_id, None)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(self._in_flight.values())
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiting)
+
+
+admission = MeetingAdmission(int(os.getenv('MEETING_MAX_IN_FLIGHT', '2')))
+
 # Metrics tracking
 metrics_data = {
     "requests_total": 0,
@@ -352,8 +1751,8 @@ def health():
     return {"healthy": True, "version": "1.0.0"}
 
 
-@app.get("/metrics")
-def metrics():
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
     """Prometheus metrics endpoint."""
     lines = [
         "# HELP pipeline_requests_total Total number of pipeline requests",
@@ -372,36 +1771,97 @@ def metrics():
         "# TYPE pipeline_processing_seconds summary",
         f"pipeline_processing_seconds_sum {metrics_data['processing_time_sum']}",
         f"pipeline_processing_seconds_count {metrics_data['processing_time_count']}",
+        "# HELP pipeline_frames_admitted_total Frames admitted by per-meeting admission control",
+        "# TYPE pipeline_frames_admitted_total counter",
+        f"pipeline_frames_admitted_total {admission.admitted_total}",
+        "# HELP pipeline_frames_dropped_total Frames dropped in favor of a newer frame of the same meeting",
+        "# TYPE pipeline_frames_dropped_total counter",
+        f"pipeline_frames_dropped_total {admission.dropped_total}",
+        "# HELP pipeline_frames_in_flight Frames of meetings currently in the pipeline",
+        "# TYPE pipeline_frames_in_flight gauge",
+        f"pipeline_frames_in_flight {admission.in_flight}",
+        "# HELP pipeline_frames_waiting Frames waiting for a slot of their meeting",
+        "# TYPE pipeline_frames_waiting gauge",
+        f"pipeline_frames_waiting {admission.waiting}",
     ]
-    return "\n".join(lines)
+    if orchestrator_instance is not None and orchestrator_instance.publisher is not None:
+        lines += orchestrator_instance.publisher.prometheus_lines()
+    if orchestrator_instance is not None and orchestrator_instance.delta_encoder is not None:
+        encoder = orchestrator_instance.delta_encoder
+        lines += [
+            "# HELP pipeline_publish_updates_total Attention updates published, by type",
+            "# TYPE pipeline_publish_updates_total counter",
+            f'pipeline_publish_updates_total{{type="keyframe"}} {encoder.keyframes_total}',
+            f'pipeline_publish_updates_total{{type="delta"}} {encoder.deltas_total}',
+            "# HELP pipeline_publish_suppressed_total Frames whose results did not change enough to publish",
+            "# TYPE pipeline_publish_suppressed_total counter",
+            f"pipeline_publish_suppressed_total {encoder.suppressed_total}",
+        ]
+    if orchestrator_instance is not None:
+        lines += [
+            "# HELP pipeline_service_replicas Replicas on the consistent-hash ring of a stateful service",
+            "# TYPE pipeline_service_replicas gauge",
+        ] + [
+            f'pipeline_service_replicas{{service="{name}"}} {len(orchestrator_instance.registry.get(name).ring)}'
+            for name in STATEFUL_SERVICES
+        ]
+        lines += circuit_breaker.prometheus_lines('pipeline', orchestrator_instance.breakers)
+    lines += metrics.prometheus_lines()
+    return "\n".join(lines) + "\n"
 
 
 @app.post("/process", response_model=ProcessResponse)
-def process_frame(request: FrameRequest):
-    """Process a video frame through the attention detection pipeline."""
-    global orchestrator_instance, metrics_data
+async def process_frame(request: FrameRequest):
+    """Process a video frame through the attention detection pipeline.
+
+    The frame's deadline starts here, so time spent waiting for admission
+    counts against it.
+    """
+    global orchestrator_instance
     if orchestrator_instance is None:
         raise HTTPException(status_code=503, detail="Service not ready")
 
+    with deadline.scope(orchestrator_instance.frame_timeout):
+        return await _process_frame_request(request)
+
+
+async def _process_frame_request(request: FrameRequest) -> ProcessResponse:
+    global orchestrator_instance, metrics_data
     start_time = time.time()
     metrics_data["requests_total"] += 1
 
+    # Frames of a meeting that is already at its in-flight limit wait for a
+    # slot; if a newer frame arrives meanwhile this one is dropped
+    if request.meeting_id and not await admission.admit(request.meeting_id):
+        return ProcessResponse(
+            request_id=request.request_id,
+            meeting_id=request.meeting_id,
+            participants=[],
+            processing_time_ms=(time.time() - start_time) * 1000,
+            success=False,
+            error="Frame dropped: superseded by a newer frame"
+        )
+
     try:
-        result = orchestrator_instance.process_frame_rest(
+        result = await orchestrator_instance.process_frame_async(
             request.frame_data,
             request.meeting_id,
-            request.request_id or str(time.time())
+            request.request_id or str(time.time()),
+            include_timings=request.include_timings
         )
         metrics_data["requests_success"] += 1
-        metrics_data["faces_detected_total"] += result.get("num_faces", 0)
+        metrics_data["faces_detected_total"] += len(result.get("participants", []))
         return ProcessResponse(**result)
     except Exception as e:
         metrics_data["requests_failed"] += 1
         raise e
     finally:
+        if request.meeting_id:
+            admission.release(request.meeting_id)
         elapsed = time.time() - start_time
         metrics_data["processing_time_sum"] += elapsed
         metrics_data["processing_time_count"] += 1
+        metrics.observe('frame', elapsed, traced=False)
 
 
 @app.post("/analyze-video")
@@ -412,14 +1872,147 @@ async def analyze_video(request: VideoAnalysisRequest):
         raise HTTPException(status_code=503, detail="Service not ready")
 
     # Start async processing in background
-    import asyncio
-    asyncio.create_task(process_video_async(request.analysis_id, request.video_path))
+    asyncio.create_task(process_video_async(
+        request.analysis_id, request.video_path, request.sample_interval_seconds
+    ))
 
     return {"status": "processing", "analysis_id": request.analysis_id}
 
 
-async def process_video_async(analysis_id: str, video_path: str):
-    """Process video file asynchronously."""
+# ----------------------------------------------------------------------
+# In-process video analysis: decoded frames go straight into ai-processor's
+# AttentionPipeline, without JPEG encoding, base64 or HTTP hops
+# ----------------------------------------------------------------------
+
+VIDEO_ANALYSIS_MODE = os.getenv('VIDEO_ANALYSIS_MODE', 'services').lower()
+
+# Alert types of the ai-processor scorer, as reported by the attention-scorer service
+ALERT_TYPES = {
+    'not_attentive': 'LOW_ATTENTION',
+    'drowsy': 'DROWSINESS',
+    'looking_away': 'LOOKING_AWAY',
+    'absent': 'ABSENT',
+}
+
+
+def _add_ai_processor_path():
+    """Make the ai-processor source tree (AI_PROCESSOR_PATH) importable as ``src``."""
+    path = os.getenv('AI_PROCESSOR_PATH', str(Path(__file__).resolve().parent.parent / 'ai-processor'))
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def _load_attention_pipeline():
+    """Import AttentionPipeline from the ai-processor source tree."""
+    _add_ai_processor_path()
+    from src.pipeline import AttentionPipeline
+    return AttentionPipeline
+
+
+def _load_core_estimators() -> Dict[str, Any]:
+    """Import the per-face estimators and their models from the ai-processor source tree."""
+    _add_ai_processor_path()
+    from src.core import AttentionScorer, BlinkDetector, GazeTracker, HeadPoseEstimator
+    from src.models.detection import BlinkInfo, FaceLandmarks, GazeInfo, HeadPose
+    return {
+        'HeadPoseEstimator': HeadPoseEstimator, 'GazeTracker': GazeTracker,
+        'BlinkDetector': BlinkDetector, 'AttentionScorer': AttentionScorer,
+        'FaceLandmarks': FaceLandmarks, 'HeadPose': HeadPose, 'GazeInfo': GazeInfo, 'BlinkInfo': BlinkInfo,
+    }
+
+
+class InProcessAnalyzer:
+    """Offline frame analysis with an in-process AttentionPipeline.
+
+    Offers the process_frame_async interface of PipelineOrchestrator and
+    returns participants in the same format, so video summaries are the
+    same in both modes. Tracking and per-track state live in the pipeline,
+    one per analysis.
+    """
+
+    def __init__(self):
+        self.pipeline = _load_attention_pipeline()()
+        self._lock = threading.Lock()
+
+    async def process_frame_async(self, frame: np.ndarray, meeting_id: str, request_id: str,
+                                  state_key: Optional[str] = None, publish: bool = True) -> Dict[str, Any]:
+        start_time = time.time()
+        try:
+            participants = await asyncio.to_thread(self._process_frame, frame, state_key or meeting_id)
+        except Exception as e:
+            logger.error(f"In-process pipeline error: {e!r}")
+            return {'request_id': request_id, 'meeting_id': meeting_id, 'participants': [],
+                    'processing_time_ms': 0, 'success': False, 'error': str(e)}
+        return {
+            'request_id': request_id,
+            'meeting_id': meeting_id,
+            'participants': participants,
+            'processing_time_ms': (time.time() - start_time) * 1000,
+            'success': True,
+            'error': ''
+        }
+
+    def _process_frame(self, frame: np.ndarray, meeting_id: str) -> List[Dict]:
+        with self._lock:
+            frame_result = self.pipeline.process_frame(frame, meeting_id)
+        return self.participants(frame_result)
+
+    @staticmethod
+    def participants(frame_result: Any) -> List[Dict]:
+        """Convert a FrameResult to the participant dicts built by _participant."""
+        alerts: Dict[int, List[Dict]] = {}
+        for alert in frame_result.alerts:
+            alerts.setdefault(alert.track_id, []).append({
+                'type': ALERT_TYPES.get(alert.alert_type.value, alert.alert_type.value.upper()),
+                'message': alert.message,
+                'severity': alert.severity.value
+            })
+
+        participants = []
+        for result in frame_result.attention_results:
+            m = result.metrics
+            participants.append(PipelineOrchestrator._participant(
+                str(result.track_id),
+                {'x1': result.bbox_x, 'y1': result.bbox_y,
+                 'x2': result.bbox_x + result.bbox_width, 'y2': result.bbox_y + result.bbox_height},
+                {'yaw': m.head_yaw, 'pitch': m.head_pitch, 'roll': m.head_roll, 'success': True} if m else {},
+                {'gaze_x': m.gaze_x, 'gaze_y': m.gaze_y, 'is_looking_at_camera': not m.is_looking_away,
+                 'success': True} if m else {},
+                {'avg_ear': m.eye_aspect_ratio, 'perclos': m.perclos, 'is_drowsy': m.is_drowsy,
+                 'success': True} if m else {},
+                {'attention_score': result.attention_score, 'alerts': alerts.get(result.track_id, [])}
+            ))
+        return participants
+
+    def reset(self) -> None:
+        with self._lock:
+            self.pipeline.reset()
+
+    def close(self) -> None:
+        self.pipeline.release()
+
+
+async def _frame_analyzer() -> Tuple[Any, bool]:
+    """Frame analyzer for a video analysis and whether it is in-process.
+
+    Falls back to the services when the ai-processor pipeline cannot be loaded.
+    """
+    if VIDEO_ANALYSIS_MODE == 'in-process':
+        try:
+            return await asyncio.to_thread(InProcessAnalyzer), True
+        except Exception as e:
+            logger.warning(f"In-process analysis unavailable, using services: {e!r}")
+    return orchestrator_instance, False
+
+
+async def process_video_async(analysis_id: str, video_path: str,
+                              sample_interval_seconds: Optional[float] = None):
+    """Process video file asynchronously.
+
+    Only the sampled frames (one per sample interval) are decoded. With
+    VIDEO_WORKERS > 1, videos longer than one segment are split into
+    VIDEO_SEGMENT_SECONDS segments analyzed in parallel worker processes.
+    """
     global orchestrator_instance
 
     api_gateway_url = os.getenv("API_GATEWAY_URL", "http://api-gateway:8080")
@@ -432,84 +2025,219 @@ async def process_video_async(analysis_id: str, video_path: str):
             logger.error(f"Failed to update progress: {e}")
 
     try:
-        update_progress(0, "processing")
+        await asyncio.to_thread(update_progress, 0, "processing")
 
-        # Open video
-        cap = cv2.VideoCapture(video_path)
-        if not cap.isOpened():
-            update_progress(0, "failed", error="Cannot open video file")
+        # Open video (blocking OpenCV calls run off the event loop)
+        sampler = await asyncio.to_thread(VideoFrameSampler.from_env, video_path, sample_interval_seconds)
+        if not sampler.is_opened():
+            await asyncio.to_thread(update_progress, 0, "failed", error="Cannot open video file")
             return
 
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS) or 30
-        duration = total_frames / fps if fps > 0 else 0
+        total_frames = sampler.total_frames
+        duration = sampler.duration
+        segments = video_segments(
+            duration, sampler.interval_seconds,
+            float(os.getenv('VIDEO_SEGMENT_SECONDS', '60')),
+            float(os.getenv('VIDEO_SEGMENT_WARMUP_SECONDS', '5'))
+        )
 
-        # Process at 1 fps to save time
-        frame_interval = max(1, int(fps))
+        if VIDEO_WORKERS > 1 and len(segments) > 1:
+            await asyncio.to_thread(sampler.release)
+            timeline, all_alerts = await _analyze_video_parallel(
+                analysis_id, video_path, sampler.interval_seconds, segments, update_progress
+            )
+        else:
+            async def on_sample(frame_idx: int, processed: int):
+                if processed % 10 == 0:
+                    progress = min(95, int((frame_idx / max(1, total_frames)) * 100))
+                    await asyncio.to_thread(update_progress, progress)
 
-        timeline = []
-        all_alerts = []
-        frame_idx = 0
-        processed = 0
+            analyzer, in_process = await _frame_analyzer()
+            try:
+                timeline, all_alerts = await analyze_video_frames(
+                    analyzer, sampler, analysis_id, on_sample=on_sample
+                )
+            finally:
+                await asyncio.to_thread(sampler.release)
+                if in_process:
+                    await asyncio.to_thread(analyzer.close)
 
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            if frame_idx % frame_interval == 0:
-                # Encode frame
-                _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-                frame_b64 = base64.b64encode(buffer).decode('utf-8')
-
-                # Process frame
-                result = orchestrator_instance.process_frame_rest(frame_b64, analysis_id, f"frame_{frame_idx}")
-
-                timestamp_ms = int((frame_idx / fps) * 1000)
-                avg_attention = 0
-                if result.get('participants'):
-                    scores = [p.get('attention_score', 0) for p in result['participants']]
-                    avg_attention = sum(scores) / len(scores) if scores else 0
-
-                    for p in result['participants']:
-                        for alert in p.get('alerts', []):
-                            all_alerts.append({**alert, 'timestamp_ms': timestamp_ms})
-
-                timeline.append({
-                    'timestamp_ms': timestamp_ms,
-                    'faces': result.get('participants', []),
-                    'avg_attention': avg_attention
-                })
-
-                processed += 1
-                progress = min(95, int((frame_idx / total_frames) * 100))
-                if processed % 10 == 0:
-                    update_progress(progress)
-
-            frame_idx += 1
-
-        cap.release()
-
-        # Calculate summary
-        avg_scores = [t['avg_attention'] for t in timeline if t['avg_attention'] > 0]
-        summary = {
-            'duration': duration,
-            'total_frames': total_frames,
-            'analyzed_frames': len(timeline),
-            'avg_attention': sum(avg_scores) / len(avg_scores) if avg_scores else 0,
-            'min_attention': min(avg_scores) if avg_scores else 0,
-            'max_attention': max(avg_scores) if avg_scores else 0,
-            'total_alerts': len(all_alerts),
-            'timeline': timeline,
-            'alerts': all_alerts
-        }
+        summary = video_summary(duration, total_frames, timeline, all_alerts)
 
-        update_progress(100, "completed", duration=duration, results=json.dumps(summary))
+        await asyncio.to_thread(update_progress, 100, "completed", duration=duration, results=json.dumps(summary))
         logger.info(f"Video analysis completed: {analysis_id}")
 
     except Exception as e:
         logger.error(f"Video analysis failed: {e}")
-        update_progress(0, "failed", error=str(e))
+        await asyncio.to_thread(update_progress, 0, "failed", error=str(e))
+
+
+async def analyze_video_frames(orchestrator: Any, sampler: VideoFrameSampler,
+                               analysis_id: str, emit_from_ms: int = 0,
+                               on_sample=None, state_key: Optional[str] = None) -> Tuple[List[Dict], List[Dict]]:
+    """Run every sampled frame through the pipeline and build the timeline.
+
+    ``orchestrator`` is a PipelineOrchestrator or an InProcessAnalyzer.
+
+    Frames before ``emit_from_ms`` only warm up per-track state in the
+    services (blink history, score smoothing); they are neither published
+    nor part of the timeline and alerts. ``state_key`` scopes that state
+    (defaults to ``analysis_id``).
+    """
+    timeline = []
+    all_alerts = []
+    processed = 0
+
+    while True:
+        sample = await asyncio.to_thread(sampler.read)
+        if sample is None:
+            break
+
+        # Process frame (encoded only if the frame store is not used)
+        timestamp_ms = sample.timestamp_ms
+        emit = timestamp_ms >= emit_from_ms
+        result = await orchestrator.process_frame_async(
+            sample.frame, analysis_id, f"frame_{sample.frame_idx}", state_key=state_key, publish=emit
+        )
+        if not emit:
+            continue
+
+        avg_attention = 0
+        if result.get('participants'):
+            scores = [p.get('attention_score', 0) for p in result['participants']]
+            avg_attention = sum(scores) / len(scores) if scores else 0
+
+            for p in result['participants']:
+                for alert in p.get('alerts', []):
+                    all_alerts.append({**alert, 'timestamp_ms': timestamp_ms})
+
+        timeline.append({
+            'timestamp_ms': timestamp_ms,
+            'faces': result.get('participants', []),
+            'avg_attention': avg_attention
+        })
+
+        processed += 1
+        if on_sample is not None:
+            await on_sample(sample.frame_idx, processed)
+
+    logger.debug(f"Video {analysis_id}: decoded {sampler.decoded_frames}, grabbed {sampler.skipped_frames}, "
+                 f"{sampler.seeks} seeks")
+    return timeline, all_alerts
+
+
+def video_summary(duration: float, total_frames: int, timeline: List[Dict], alerts: List[Dict]) -> Dict:
+    """Summary reported to the API gateway for a video analysis."""
+    avg_scores = [t['avg_attention'] for t in timeline if t['avg_attention'] > 0]
+    return {
+        'duration': duration,
+        'total_frames': total_frames,
+        'analyzed_frames': len(timeline),
+        'avg_attention': sum(avg_scores) / len(avg_scores) if avg_scores else 0,
+        'min_attention': min(avg_scores) if avg_scores else 0,
+        'max_attention': max(avg_scores) if avg_scores else 0,
+        'total_alerts': len(alerts),
+        'timeline': timeline,
+        'alerts': alerts
+    }
+
+
+# ----------------------------------------------------------------------
+# Parallel video analysis: time segments analyzed by worker processes,
+# each with its own orchestrator (connections, channels, event loop)
+# ----------------------------------------------------------------------
+
+VIDEO_WORKERS = int(os.getenv('VIDEO_WORKERS', '1'))
+
+_video_pool: Optional[futures.ProcessPoolExecutor] = None
+_worker_orchestrator: Optional[Any] = None
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def video_segments(duration: float, interval_seconds: float, segment_seconds: float,
+                   warmup_seconds: float) -> List[Tuple[float, float, float]]:
+    """Split a video into (warmup_start, start, end) segments in seconds.
+
+    Boundaries fall on the sampling grid, so the merged timeline has the
+    same timestamps as a sequential pass. Each segment after the first
+    starts sampling ``warmup_seconds`` early to rebuild per-track state.
+    """
+    step = max(1, round(segment_seconds / interval_seconds)) * interval_seconds
+    warmup = math.ceil(warmup_seconds / interval_seconds) * interval_seconds
+    segments = []
+    start = 0.0
+    while start < duration or not segments:
+        end = start + step
+        segments.append((max(0.0, start - warmup), start, end if end < duration else duration))
+        start = end
+    return segments
+
+
+def _video_executor() -> futures.Executor:
+    """Lazily created worker pool; spawned, since gRPC and event loops do not survive fork."""
+    global _video_pool
+    if _video_pool is None:
+        import multiprocessing
+        _video_pool = futures.ProcessPoolExecutor(
+            max_workers=VIDEO_WORKERS, mp_context=multiprocessing.get_context('spawn')
+        )
+    return _video_pool
+
+
+def analyze_video_segment(analysis_id: str, video_path: str, interval_seconds: float,
+                          segment: Tuple[float, float, float]) -> Tuple[List[Dict], List[Dict]]:
+    """Worker entry point: timeline and alerts of one segment."""
+    global _worker_orchestrator, _worker_loop
+    if _worker_loop is None:
+        _worker_loop = asyncio.new_event_loop()
+    if _worker_orchestrator is None:
+        _worker_orchestrator, _ = _worker_loop.run_until_complete(_frame_analyzer())
+        if _worker_orchestrator is None:
+            _worker_orchestrator = PipelineOrchestrator()
+    if isinstance(_worker_orchestrator, InProcessAnalyzer):
+        # Segments are independent; the warm-up rebuilds track state
+        _worker_orchestrator.reset()
+
+    warmup_start, start, end = segment
+    sampler = VideoFrameSampler.from_env(
+        video_path, interval_seconds, start_seconds=warmup_start, end_seconds=end
+    )
+    try:
+        # Results go out under the analysis id; a state key per segment keeps
+        # concurrent segments' track state apart in the services
+        return _worker_loop.run_until_complete(analyze_video_frames(
+            _worker_orchestrator, sampler, analysis_id, emit_from_ms=int(start * 1000),
+            state_key=f"{analysis_id}@{start:g}"
+        ))
+    finally:
+        sampler.release()
+
+
+async def _analyze_video_parallel(analysis_id: str, video_path: str, interval_seconds: float,
+                                  segments: List[Tuple[float, float, float]],
+                                  update_progress) -> Tuple[List[Dict], List[Dict]]:
+    """Analyze segments on the worker pool and merge them in time order."""
+    loop = asyncio.get_running_loop()
+    executor = _video_executor()
+    pending = [
+        loop.run_in_executor(executor, analyze_video_segment, analysis_id, video_path, interval_seconds, segment)
+        for segment in segments
+    ]
+    logger.info(f"Video {analysis_id}: {len(segments)} segments on {VIDEO_WORKERS} workers")
+
+    done = 0
+    for future in asyncio.as_completed(pending):
+        await future
+        done += 1
+        await asyncio.to_thread(update_progress, min(95, int(done / len(segments) * 100)))
+
+    timeline: List[Dict] = []
+    all_alerts: List[Dict] = []
+    for future in pending:
+        segment_timeline, segment_alerts = future.result()
+        timeline.extend(segment_timeline)
+        all_alerts.extend(segment_alerts)
+    return timeline, all_alerts
 
 
 def run_rest_server(port: int):
@@ -545,6 +2273,7 @@ def serve(grpc_port: int = 50051, rest_port: int = 8051):
     logger.info(f"   Services: {list(orchestrator_instance.registry.all().keys())}")
 
     server.wait_for_termination()
+    orchestrator_instance.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,1525 @@
+"""
+Unit tests for Pipeline Orchestrator Service
+"""
+import pytest
+import base64
+import time
+import threading
+import asyncio
+import json
+import httpx
+import grpc
+import numpy as np
+import cv2
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from unittest.mock import MagicMock
+
+from main import FramePayload, PipelineOrchestrator, GRPC_STUBS
+
+
+@pytest.fixture
+def test_frame():
+    """Create a BGR test frame."""
+    img = np.zeros((120, 160, 3), dtype=np.uint8)
+    img[:] = (200, 180, 160)
+    cv2.circle(img, (80, 60), 30, (50, 50, 50), -1)
+    return img
+
+
+@pytest.fixture
+def test_jpeg(test_frame):
+    """JPEG bytes of the test frame."""
+    _, buffer = cv2.imencode('.jpg', test_frame)
+    return buffer.tobytes()
+
+
+class TestFramePayload:
+    """Tests for FramePayload conversions."""
+
+    def test_base64_source_passes_through(self, test_jpeg):
+        """Test that a base64 source is sent unchanged and decoded once."""
+        b64 = base64.b64encode(test_jpeg).decode('utf-8')
+        payload = FramePayload(b64)
+        assert payload.base64() is b64
+        assert payload.encoded() == test_jpeg
+
+    def test_data_url_prefix_stripped(self, test_jpeg):
+        """Test that data URL prefixes are removed before decoding."""
+        b64 = "data:image/jpeg;base64," + base64.b64encode(test_jpeg).decode('utf-8')
+        assert FramePayload(b64).encoded() == test_jpeg
+
+    def test_bytes_source(self, test_jpeg):
+        """Test that encoded bytes are reused and base64 is derived from them."""
+        payload = FramePayload(test_jpeg)
+        assert payload.encoded() is test_jpeg
+        assert base64.b64decode(payload.base64()) == test_jpeg
+
+    def test_array_source_rgb_without_encoding(self, test_frame):
+        """Test that a decoded BGR array is converted to RGB without JPEG encoding."""
+        payload = FramePayload(test_frame)
+        rgb = payload.rgb()
+        assert rgb.shape == test_frame.shape
+        assert np.array_equal(rgb[..., 0], test_frame[..., 2])
+        assert payload._encoded is None
+
+    def test_rgb_invalid_data(self):
+        """Test that undecodable data yields None."""
+        assert FramePayload(b"invalid").rgb() is None
+
+
+@pytest.fixture
+def orchestrator():
+    """Create an orchestrator without Redis."""
+    orch = PipelineOrchestrator()
+    orch.redis_client = None
+    orch.publisher = None
+    return orch
+
+
+class TestFrameTransport:
+    """Tests for how frames are sent to detection services."""
+
+    def test_frame_ref_used_when_shared(self, orchestrator, test_jpeg):
+        """Test that a shared frame is sent by reference only."""
+        sent = []
+
+        async def handler(request):
+            sent.append(json.loads(request.content))
+            return httpx.Response(200, json={'success': True, 'faces': [{'x1': 1}]})
+
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+        frame = FramePayload(test_jpeg)
+        frame.frame_ref = "m/r"
+
+        faces = asyncio.run(orchestrator._detect_faces_async(frame, "r"))
+
+        assert faces == [{'x1': 1}]
+        assert sent == [{'frame_ref': "m/r", 'request_id': "r"}]
+
+    def test_falls_back_when_frame_not_shared(self, orchestrator, test_jpeg):
+        """Test fallback to the encoded frame when the service cannot read the store."""
+        sent = []
+
+        async def handler(request):
+            sent.append((request.url.path, request.content))
+            if request.url.path == '/detect':
+                return httpx.Response(200, json={'success': False, 'error': 'Frame not in frame store', 'faces': []})
+            return httpx.Response(200, json={'success': True, 'faces': [{'x1': 2}]})
+
+        orchestrator.frame_transport = 'binary'
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+        frame = FramePayload(test_jpeg)
+        frame.frame_ref = "m/r"
+
+        faces = asyncio.run(orchestrator._detect_faces_async(frame, "r"))
+
+        assert faces == [{'x1': 2}]
+        assert sent[-1] == ("/detect-binary", test_jpeg)
+
+    def test_shared_frames_with_same_request_id_do_not_collide(self, orchestrator):
+        """Test that frames sharing a request id get separate frame store segments."""
+        from common.frame_store import SharedFrameStore
+
+        orchestrator.frame_store = SharedFrameStore(prefix=f"test_orch_{time.monotonic_ns()}")
+        first = FramePayload(np.full((4, 4, 3), 10, dtype=np.uint8))
+        second = FramePayload(np.full((4, 4, 3), 200, dtype=np.uint8))
+
+        orchestrator._share_frame(first, "m", "r")
+        orchestrator._share_frame(second, "m", "r")
+        try:
+            assert first.frame_ref != second.frame_ref
+            # Releasing the first frame leaves the second readable
+            orchestrator.frame_store.release(first.frame_ref)
+            with orchestrator.frame_store.read(second.frame_ref) as rgb:
+                assert rgb is not None and rgb.max() == 200
+        finally:
+            orchestrator.frame_store.close()
+
+
+def _detection_handler(num_faces, respond, delay=0.0):
+    """Mock service handler: face and landmark detection find num_faces faces, respond(path, body) answers the rest."""
+    async def handler(request):
+        if request.url.port == 8052:
+            return httpx.Response(200, json={'faces': [{'x1': i} for i in range(num_faces)]})
+        if request.url.port == 8053:
+            return httpx.Response(200, json={'faces': [
+                {'landmarks': [{'index': 0, 'x': i}], 'bbox': {'x1': i}} for i in range(num_faces)
+            ]})
+        await asyncio.sleep(delay)
+        return respond(request.url.path, json.loads(request.content))
+    return handler
+
+
+class TestFanOut:
+    """Tests for the frame-wide per-face fan-out."""
+
+    @staticmethod
+    def _respond(path, body):
+        return httpx.Response(200, json={
+            '/estimate': {'yaw': 0}, '/track': {'gaze_x': 0}, '/detect': {'avg_ear': 0.3},
+            '/score': {'attention_score': 80.0, 'alerts': []}
+        }[path])
+
+    def test_faces_processed_concurrently(self, orchestrator, test_jpeg):
+        """Test that frame latency does not grow with the number of faces."""
+        orchestrator.frame_transport = 'binary'
+        orchestrator.downstream_batching = False
+        TestAsyncPipeline._mock_services(orchestrator, _detection_handler(10, self._respond, delay=0.05))
+
+        start = time.time()
+        result = asyncio.run(orchestrator.process_frame_async(test_jpeg, "", "r"))
+        elapsed = time.time() - start
+
+        assert result['success'] == True
+        assert [p['track_id'] for p in result['participants']] == [str(i) for i in range(10)]
+        # Sequential processing would take 10 faces x 2 stages x 50ms = 1s
+        assert elapsed < 0.5
+
+    def test_per_service_concurrency_limit(self, orchestrator, test_jpeg):
+        """Test that in-flight calls to a service never exceed its limit."""
+        in_flight = [0, 0]
+
+        async def handler(request):
+            if request.url.port != 8054:
+                return await _detection_handler(8, self._respond)(request)
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+            await asyncio.sleep(0.02)
+            in_flight[0] -= 1
+            return httpx.Response(200, json={'yaw': 0})
+
+        orchestrator.frame_transport = 'binary'
+        orchestrator.downstream_batching = False
+        orchestrator._async_limits['head-pose'] = asyncio.Semaphore(2)
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+
+        asyncio.run(orchestrator.process_frame_async(test_jpeg, "", "r"))
+
+        assert in_flight[1] == 2
+
+
+class TestDownstreamBatching:
+    """Tests for one batch request per service and frame."""
+
+    def test_one_call_per_service(self, orchestrator, test_jpeg):
+        """Test that calls per frame do not grow with the number of faces."""
+        paths = []
+
+        def respond(path, body):
+            paths.append(path.lstrip('/'))
+            count = len(body.get('faces', body.get('requests', [])))
+            if path == '/score-batch':
+                items = [{'attention_score': 50.0 + i, 'alerts': []} for i in range(count)]
+            else:
+                items = [{'success': True, 'index': i} for i in range(count)]
+            return httpx.Response(200, json={'responses': items})
+
+        orchestrator.frame_transport = 'binary'
+        TestAsyncPipeline._mock_services(orchestrator, _detection_handler(6, respond))
+
+        result = asyncio.run(orchestrator.process_frame_async(test_jpeg, "", "r"))
+
+        assert sorted(paths) == ['detect-batch', 'estimate-batch', 'score-batch', 'track-batch']
+        assert [p['attention_score'] for p in result['participants']] == [50.0 + i for i in range(6)]
+        assert [p['head_pose']['index'] for p in result['participants']] == list(range(6))
+
+    def test_failed_batch_uses_defaults(self, orchestrator, test_jpeg):
+        """Test that a failing batch service yields per-face defaults."""
+        orchestrator.frame_transport = 'binary'
+        TestAsyncPipeline._mock_services(
+            orchestrator, _detection_handler(2, lambda path, body: httpx.Response(500, json={}))
+        )
+
+        result = asyncio.run(orchestrator.process_frame_async(test_jpeg, "", "r"))
+
+        assert result['success'] == True
+        assert [p['attention_score'] for p in result['participants']] == [75.0, 75.0]
+        assert result['participants'][0]['head_pose'] == {'yaw': 0, 'pitch': 0, 'roll': 0}
+
+
+class TestAsyncPipeline:
+    """Tests for the event-loop processing path."""
+
+    @staticmethod
+    def _mock_services(orchestrator, handler):
+        for name, config in orchestrator.registry.all().items():
+            orchestrator.async_clients[name] = httpx.AsyncClient(
+                base_url=config.url, transport=httpx.MockTransport(handler)
+            )
+
+    @staticmethod
+    async def _service_handler(request):
+        path = request.url.path
+        if request.url.port == 8052:
+            return httpx.Response(200, json={'faces': [{'x1': 0}, {'x1': 1}]})
+        if request.url.port == 8053:
+            return httpx.Response(200, json={'faces': [{'landmarks': [], 'bbox': {'i': i}} for i in range(2)]})
+        body = json.loads(request.content)
+        if path == '/score-batch':
+            return httpx.Response(200, json={'responses': [
+                {'attention_score': 60.0 + i, 'alerts': []} for i in range(len(body['requests']))
+            ]})
+        if path.endswith('-batch'):
+            return httpx.Response(200, json={'responses': [{'success': True}] * len(body['faces'])})
+        if path == '/score':
+            return httpx.Response(200, json={'attention_score': 70.0, 'alerts': []})
+        return httpx.Response(200, json={'success': True})
+
+    def test_process_frame_async_batched(self, orchestrator, test_jpeg):
+        """Test that the async path returns ordered participants."""
+        orchestrator.frame_transport = 'binary'
+        self._mock_services(orchestrator, self._service_handler)
+
+        result = asyncio.run(orchestrator.process_frame_async(test_jpeg, "", "r"))
+
+        assert result['success'] == True
+        assert [p['attention_score'] for p in result['participants']] == [60.0, 61.0]
+        assert [p['face'] for p in result['participants']] == [{'i': 0}, {'i': 1}]
+
+    def test_meeting_id_scopes_stateful_services(self, orchestrator, test_jpeg):
+        """Blink and scorer batches carry the meeting id their track state is keyed by."""
+        bodies = {}
+
+        async def handler(request):
+            if request.url.path in ('/detect-batch', '/score-batch'):
+                bodies[request.url.path] = json.loads(request.content)
+            return await self._service_handler(request)
+
+        orchestrator.frame_transport = 'binary'
+        self._mock_services(orchestrator, handler)
+
+        asyncio.run(orchestrator.process_frame_async(test_jpeg, "meeting-1", "r"))
+
+        assert bodies['/detect-batch']['meeting_id'] == "meeting-1"
+        assert bodies['/score-batch']['meeting_id'] == "meeting-1"
+
+    def test_state_key_is_separate_from_channel(self, orchestrator, test_jpeg):
+        """A state key scopes track state only; results still go to the meeting's channel."""
+        bodies = {}
+
+        async def handler(request):
+            if request.url.path in ('/detect-batch', '/score-batch'):
+                bodies[request.url.path] = json.loads(request.content)
+            return await self._service_handler(request)
+
+        orchestrator.frame_transport = 'binary'
+        orchestrator.publisher = MagicMock()
+        self._mock_services(orchestrator, handler)
+
+        async def run():
+            await orchestrator.process_frame_async(test_jpeg, "a1", "r0", state_key="a1@0", publish=False)
+            await orchestrator.process_frame_async(test_jpeg, "a1", "r1", state_key="a1@0")
+
+        asyncio.run(run())
+
+        assert bodies['/detect-batch']['meeting_id'] == "a1@0"
+        assert bodies['/score-batch']['meeting_id'] == "a1@0"
+        assert [c.args[0] for c in orchestrator.publisher.publish.call_args_list] == ["meeting:a1:attention"]
+
+    def test_process_frame_async_per_face(self, orchestrator, test_jpeg):
+        """Test the async per-face path when batching is disabled."""
+        orchestrator.frame_transport = 'binary'
+        orchestrator.downstream_batching = False
+        self._mock_services(orchestrator, self._service_handler)
+
+        result = asyncio.run(orchestrator.process_frame_async(test_jpeg, "", "r"))
+
+        assert [p['attention_score'] for p in result['participants']] == [70.0, 70.0]
+
+    def test_timeout_cancels_in_flight_requests(self, orchestrator, test_jpeg):
+        """Test that a frame past its deadline fails fast and cancels its calls."""
+        cancelled = []
+
+        async def slow(request):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(request.url.path)
+                raise
+            return httpx.Response(200, json={})
+
+        orchestrator.frame_timeout = 0.1
+        self._mock_services(orchestrator, slow)
+
+        start = time.time()
+        result = asyncio.run(orchestrator.process_frame_async(test_jpeg, "", "r"))
+
+        assert time.time() - start < 1.0
+        assert result['success'] == False
+        assert 'timed out' in result['error']
+        assert cancelled == ['/detect']
+
+    def test_process_endpoint_does_not_block_loop(self, orchestrator, test_jpeg):
+        """Test that concurrent /process requests overlap on the event loop."""
+        import main
+        from fastapi.testclient import TestClient
+
+        async def delayed(request):
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, json={'faces': []})
+
+        self._mock_services(orchestrator, delayed)
+        main.orchestrator_instance = orchestrator
+        b64 = base64.b64encode(test_jpeg).decode('utf-8')
+
+        async def run_concurrently():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await asyncio.gather(*(
+                    client.post("/process", json={'frame_data': b64, 'request_id': str(i)})
+                    for i in range(10)
+                ))
+
+        start = time.time()
+        responses = asyncio.run(run_concurrently())
+
+        assert all(r.status_code == 200 for r in responses)
+        # Ten frames blocking a thread each would take 10 x 200ms serially
+        assert time.time() - start < 1.0
+
+
+class TestMeetingAdmission:
+    """Tests for latest-frame-wins admission control."""
+
+    def test_newer_frame_replaces_waiting_frame(self):
+        """Only the newest waiting frame gets the freed slot."""
+        from main import MeetingAdmission
+
+        async def scenario():
+            admission = MeetingAdmission(max_in_flight=1)
+            assert await admission.admit("m")
+            second = asyncio.ensure_future(admission.admit("m"))
+            await asyncio.sleep(0)
+            third = asyncio.ensure_future(admission.admit("m"))
+            assert await second == False
+
+            # Other meetings are not affected
+            assert await admission.admit("other")
+
+            admission.release("m")
+            assert await third == True
+            assert admission.in_flight == 2
+            admission.release("m")
+            admission.release("other")
+            return admission
+
+        admission = asyncio.run(scenario())
+        assert admission.dropped_total == 1 and admission.admitted_total == 3
+        assert admission.in_flight == 0 and admission._in_flight == {}
+
+    def test_process_drops_stale_frames(self, orchestrator, test_jpeg, monkeypatch):
+        """/process answers superseded frames as dropped and counts them in /metrics."""
+        import main
+
+        async def delayed(request):
+            await asyncio.sleep(0.1)
+            return httpx.Response(200, json={'faces': []})
+
+        TestAsyncPipeline._mock_services(orchestrator, delayed)
+        monkeypatch.setattr(main, 'orchestrator_instance', orchestrator)
+        monkeypatch.setattr(main, 'admission', main.MeetingAdmission(max_in_flight=1))
+        b64 = base64.b64encode(test_jpeg).decode('utf-8')
+
+        async def run():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                requests = []
+                for i in range(5):
+                    requests.append(asyncio.ensure_future(client.post(
+                        "/process", json={'frame_data': b64, 'meeting_id': "m", 'request_id': str(i)}
+                    )))
+                    await asyncio.sleep(0.01)
+                responses = [(await r).json() for r in requests]
+                return responses, (await client.get("/metrics")).text
+
+        responses, metrics = asyncio.run(run())
+
+        assert [r['success'] for r in responses] == [True, False, False, False, True]
+        assert 'superseded' in responses[1]['error']
+        assert "pipeline_frames_dropped_total 3" in metrics
+        assert "pipeline_frames_in_flight 0" in metrics
+
+
+class TestConsistentRouting:
+    """Tests for routing meetings to stateful service replicas."""
+
+    def test_ring_moves_few_keys(self):
+        """Adding or removing a replica only moves the keys it gains or loses."""
+        from main import HashRing
+
+        keys = [f"meeting-{i}" for i in range(2000)]
+        ring = HashRing(["a", "b", "c", "d"])
+        before = {key: ring.get(key) for key in keys}
+        assert set(before.values()) == {"a", "b", "c", "d"}
+
+        assert ring.set_nodes(["a", "b", "c", "d", "e"])
+        after = {key: ring.get(key) for key in keys}
+        moved = [key for key in keys if before[key] != after[key]]
+        assert all(after[key] == "e" for key in moved)
+        assert 0.1 < len(moved) / len(keys) < 0.3
+
+        ring.set_nodes(["a", "b", "d", "e"])
+        removed = {key: ring.get(key) for key in keys}
+        assert all(removed[key] == after[key] for key in keys if after[key] != "c")
+        assert not ring.set_nodes(["e", "d", "b", "a"])
+
+    def test_registry_replicas_from_env(self, monkeypatch):
+        """*_REPLICAS hosts get the service's REST and gRPC ports; keyless calls use the service URL."""
+        from main import ServiceRegistry
+
+        monkeypatch.setenv('BLINK_DETECTION_URL', "http://blink-detection:8056")
+        monkeypatch.setenv('BLINK_DETECTION_REPLICAS', "blink-0.blink, blink-1.blink")
+        registry = ServiceRegistry()
+        config = registry.get('blink-detection')
+
+        url, target = registry.endpoint('blink-detection', "meeting-1")
+        host = config.ring.get("meeting-1")
+        assert (url, target) == (f"http://{host}:8056", f"{host}:50056")
+        assert registry.endpoint('blink-detection') == ("http://blink-detection:8056", "localhost:50056")
+        # Stateless services are not routed
+        assert registry.endpoint('head-pose', "meeting-1")[0] == registry.get('head-pose').url
+
+    def test_meetings_stick_to_replicas(self, orchestrator, test_jpeg):
+        """Every blink/scorer call of a meeting reaches the replica the ring assigns it."""
+        hits = []
+
+        async def handler(request):
+            if request.url.path in ('/detect-batch', '/score-batch'):
+                hits.append((json.loads(request.content)['meeting_id'], request.url.host))
+            return await TestAsyncPipeline._service_handler(request)
+
+        orchestrator.frame_transport = 'binary'
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+        for name, port in (('blink-detection', 8056), ('attention-scorer', 8057)):
+            orchestrator.registry.set_replicas(name, ["replica-0", "replica-1", "replica-2"])
+            for url, _ in orchestrator.registry.get(name).replicas.values():
+                orchestrator.async_clients[f"{name}@{url}"] = httpx.AsyncClient(
+                    base_url=url, transport=httpx.MockTransport(handler)
+                )
+
+        async def run():
+            for i in range(12):
+                await orchestrator.process_frame_async(test_jpeg, f"meeting-{i % 4}", str(i))
+
+        asyncio.run(run())
+
+        ring = orchestrator.registry.get('blink-detection').ring
+        assert len(hits) == 24
+        assert all(host == ring.get(meeting) for meeting, host in hits)
+        assert len({host for _, host in hits}) > 1
+
+    def test_retired_replica_clients_closed(self, orchestrator):
+        """Clients of replicas removed from the ring are retired when the ring changes and closed once drained."""
+        orchestrator.registry.get('attention-scorer').timeout = 0.05
+
+        async def run():
+            orchestrator.registry.set_replicas('attention-scorer', ["replica-0", "replica-1"])
+            meeting = next(f"m{i}" for i in range(100)
+                           if orchestrator.registry.get('attention-scorer').ring.get(f"m{i}") == "replica-1")
+            old = orchestrator._async_client('attention-scorer', meeting)
+            # From the replica refresh thread, with no call on the service afterwards
+            thread = threading.Thread(target=orchestrator.registry.set_replicas,
+                                      args=('attention-scorer', ["replica-0", "replica-2"]))
+            thread.start()
+            thread.join()
+            await asyncio.sleep(0)
+            retired = "attention-scorer@http://replica-1:8057" not in orchestrator.async_clients
+            open_while_draining = not old.is_closed
+            await asyncio.sleep(0.1)
+            return old, retired, open_while_draining
+
+        old, retired, open_while_draining = asyncio.run(run())
+        assert retired and open_while_draining
+        assert old.is_closed
+        assert not orchestrator._closing
+
+
+class FakeRedis:
+    """Records pipelined publishes; execute() blocks while ``gate`` is cleared."""
+
+    def __init__(self, delay: float = 0.0):
+        self.batches = []
+        self.gate = threading.Event()
+        self.gate.set()
+        self.delay = delay
+
+    def pipeline(self, transaction=True):
+        client = self
+
+        class Pipeline:
+            def __init__(self):
+                self.messages = []
+
+            def publish(self, channel, message):
+                self.messages.append((channel, message))
+
+            def execute(self):
+                client.gate.wait(5)
+                time.sleep(client.delay)
+                client.batches.append(self.messages)
+
+        return Pipeline()
+
+
+class TestRedisPublisher:
+    """Tests for background, pipelined result publishing."""
+
+    @staticmethod
+    def _wait_for(condition, timeout=2.0):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.005)
+
+    def test_batches_meetings_and_coalesces_per_meeting(self):
+        """Messages queued behind a slow round-trip go out in one pipeline, only the latest per meeting."""
+        from main import RedisPublisher
+
+        client = FakeRedis()
+        client.gate.clear()
+        publisher = RedisPublisher(client, max_pending=4, batch_size=16)
+        publisher.publish("meeting:first:attention", [])
+        self._wait_for(lambda: publisher.pending == 0)  # writer is now blocked on Redis
+
+        for i in range(6):
+            publisher.publish(f"meeting:m{i % 3}:attention", [{'i': i}])
+        assert publisher.pending == 3
+        assert publisher.coalesced_total == 3 and publisher.dropped_total == 0
+        client.gate.set()
+        publisher.close()
+
+        assert len(client.batches) == 2
+        assert [(c, json.loads(m)) for c, m in client.batches[1]] == [
+            (f"meeting:m{i}:attention", [{'i': i + 3}]) for i in range(3)
+        ]
+        assert publisher.published_total == 4 and publisher.batches_total == 2
+
+    def test_deltas_kept_in_order_and_drops_reported(self):
+        """Deltas are never coalesced; when the buffer overflows the oldest goes and its channel is reported."""
+        from main import RedisPublisher
+
+        client = FakeRedis()
+        client.gate.clear()
+        dropped = []
+        publisher = RedisPublisher(client, max_pending=3, batch_size=16, on_drop=dropped.append)
+        publisher.publish("meeting:first:attention", [])
+        self._wait_for(lambda: publisher.pending == 0)
+
+        for i in range(4):
+            publisher.publish(f"meeting:m{i % 2}:attention", {'seq': i}, supersedes=False)
+        client.gate.set()
+        publisher.close()
+
+        assert dropped == ["meeting:m0:attention"] and publisher.dropped_total == 1
+        assert [(c, json.loads(m)['seq']) for c, m in client.batches[1]] == [
+            ("meeting:m0:attention", 2), ("meeting:m1:attention", 1), ("meeting:m1:attention", 3)
+        ]
+
+    def test_failed_publish_reported(self):
+        from main import RedisPublisher
+
+        class BrokenRedis(FakeRedis):
+            def pipeline(self, transaction=True):
+                raise ConnectionError("redis down")
+
+        dropped = []
+        publisher = RedisPublisher(BrokenRedis(), on_drop=dropped.append)
+        publisher.publish("meeting:m:attention", {'seq': 0}, supersedes=False)
+        publisher.close()
+
+        assert dropped == ["meeting:m:attention"] and publisher.failed_total == 1
+
+    def test_msgpack_encoding(self):
+        """PUBLISH_ENCODING=msgpack sends msgpack payloads."""
+        msgpack = pytest.importorskip("msgpack")
+        from main import RedisPublisher
+
+        client = FakeRedis()
+        publisher = RedisPublisher(client, encoding='msgpack')
+        publisher.publish("meeting:m:attention", [{'track_id': "t", 'attention_score': 80.5}])
+        publisher.close()
+
+        message = client.batches[0][0][1]
+        assert msgpack.unpackb(message) == [{'track_id': "t", 'attention_score': 80.5}]
+
+    def test_frame_does_not_wait_for_redis(self, orchestrator, test_jpeg):
+        """A slow Redis does not add to frame latency."""
+        from main import RedisPublisher
+
+        client = FakeRedis(delay=0.5)
+        orchestrator.publisher = RedisPublisher(client)
+        orchestrator.frame_transport = 'binary'
+        TestAsyncPipeline._mock_services(orchestrator, TestAsyncPipeline._service_handler)
+
+        start = time.time()
+        asyncio.run(orchestrator.process_frame_async(test_jpeg, "m", "r"))
+        assert time.time() - start < 0.4
+
+        orchestrator.publisher.close()
+        channel, message = client.batches[0][0]
+        assert channel == "meeting:m:attention" and len(json.loads(message)) == 2
+
+
+class TestDeltaUpdates:
+    """Tests for keyframe/delta attention updates."""
+
+    @staticmethod
+    def _participant(track_id, score, alerts=(), looking=True):
+        return {'track_id': track_id, 'attention_score': score, 'alerts': list(alerts),
+                'gaze': {'is_looking_at_camera': looking}, 'blink': {'is_drowsy': False}}
+
+    def test_only_changes_are_sent(self):
+        """Deltas carry participants that moved beyond epsilon or changed state, and removals."""
+        from main import AttentionDeltaEncoder
+
+        encoder = AttentionDeltaEncoder(epsilon=2.0, keyframe_seconds=60)
+        p = self._participant
+        first = encoder.encode("m", [p("a", 80), p("b", 60), p("c", 50)])
+        assert first['type'] == 'keyframe' and len(first['participants']) == 3
+
+        # Jitter below epsilon is suppressed entirely
+        assert encoder.encode("m", [p("a", 81), p("b", 59), p("c", 50)]) is None
+
+        update = encoder.encode("m", [p("a", 81.5), p("b", 60, alerts=["looking_away"], looking=False)])
+        assert update['type'] == 'delta' and update['seq'] == 1
+        assert [x['track_id'] for x in update['participants']] == ["b"]
+        assert update['removed'] == ["c"]
+
+        # Slow drift is measured against the last sent score, so it is eventually sent
+        drift = encoder.encode("m", [p("a", 82.5), p("b", 60, ["looking_away"], False)])
+        assert [x['track_id'] for x in drift['participants']] == ["a"]
+        assert encoder.suppressed_total == 1 and encoder.deltas_total == 2
+
+    def test_periodic_keyframes(self, monkeypatch):
+        """A full keyframe is sent once keyframe_seconds have passed."""
+        import main
+
+        clock = [100.0]
+        monkeypatch.setattr(main.time, 'monotonic', lambda: clock[0])
+        encoder = main.AttentionDeltaEncoder(keyframe_seconds=5)
+        results = [self._participant("a", 70), self._participant("b", 40)]
+
+        assert encoder.encode("m", results)['type'] == 'keyframe'
+        clock[0] += 4
+        assert encoder.encode("m", results) is None
+        clock[0] += 1
+        keyframe = encoder.encode("m", results)
+        assert keyframe['type'] == 'keyframe' and keyframe['participants'] == results
+        # Meetings are independent
+        assert encoder.encode("other", results)['seq'] == 0
+
+    def test_orchestrator_publishes_updates(self, orchestrator, test_jpeg):
+        """PUBLISH_MODE=delta publishes a keyframe, then nothing for unchanged frames."""
+        from main import AttentionDeltaEncoder, RedisPublisher
+
+        client = FakeRedis()
+        orchestrator.publisher = RedisPublisher(client)
+        orchestrator.delta_encoder = AttentionDeltaEncoder(keyframe_seconds=60)
+        orchestrator.frame_transport = 'binary'
+        TestAsyncPipeline._mock_services(orchestrator, TestAsyncPipeline._service_handler)
+
+        async def run():
+            for i in range(3):
+                await orchestrator.process_frame_async(test_jpeg, "m", str(i))
+
+        asyncio.run(run())
+        orchestrator.publisher.close()
+
+        messages = [json.loads(m) for batch in client.batches for _, m in batch]
+        assert len(messages) == 1
+        assert messages[0]['type'] == 'keyframe' and len(messages[0]['participants']) == 2
+
+    def test_lost_update_restarts_with_keyframe(self, orchestrator):
+        """A delta that never reaches Redis makes the meeting's next update a keyframe."""
+        from main import AttentionDeltaEncoder, RedisPublisher
+
+        class FailingRedis:
+            def pipeline(self, transaction=True):
+                raise ConnectionError("down")
+
+        p = self._participant
+        orchestrator.delta_encoder = AttentionDeltaEncoder(epsilon=2.0, keyframe_seconds=60)
+        orchestrator.publisher = RedisPublisher(FailingRedis(), on_drop=orchestrator._publish_dropped)
+        orchestrator._publish_results("m", [p("a", 80)])
+        orchestrator.publisher.close()
+        assert orchestrator.publisher.failed_total == 1
+
+        client = FakeRedis()
+        orchestrator.publisher = RedisPublisher(client, on_drop=orchestrator._publish_dropped)
+        orchestrator._publish_results("m", [p("a", 90)])
+        orchestrator.publisher.close()
+
+        messages = [json.loads(m) for batch in client.batches for _, m in batch]
+        assert [m['type'] for m in messages] == ['keyframe']
+        assert messages[0]['participants'][0]['attention_score'] == 90
+
+
+class TestStageMetrics:
+    """Tests for the Prometheus /metrics endpoint."""
+
+    def test_process_records_stages(self, orchestrator, test_jpeg, monkeypatch):
+        """/metrics is plain text with per-service downstream histograms and a real face count."""
+        import main
+
+        orchestrator.frame_transport = 'binary'
+        TestAsyncPipeline._mock_services(orchestrator, TestAsyncPipeline._service_handler)
+        monkeypatch.setattr(main, 'orchestrator_instance', orchestrator)
+        monkeypatch.setattr(main, 'metrics_data', dict(main.metrics_data, faces_detected_total=0))
+        b64 = base64.b64encode(test_jpeg).decode('utf-8')
+
+        async def run():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                await client.post("/process", json={'frame_data': b64, 'request_id': "r"})
+                return await client.get("/metrics")
+
+        response = asyncio.run(run())
+
+        assert response.headers['content-type'].startswith("text/plain")
+        text = response.text
+        assert "faces_detected_total 2" in text.splitlines()
+        for service in ('face-detection', 'landmark-detection', 'head-pose', 'gaze-tracking',
+                        'blink-detection', 'attention-scorer'):
+            assert f'pipeline_stage_duration_seconds_count{{stage="downstream",service="{service}"}}' in text
+        assert 'pipeline_stage_duration_seconds_count{stage="frame"}' in text
+        assert 'pipeline_stage_duration_seconds_count{stage="base64_decode"}' in text
+        assert 'pipeline_downstream_calls_total{outcome="success",service="head-pose"}' in text
+
+
+class TestTracing:
+    """Tests for trace context propagation and per-stage timings."""
+
+    def test_async_frame_propagates_trace(self, orchestrator, test_jpeg):
+        """Every downstream request carries the frame's trace; timings list its spans."""
+        headers = []
+
+        async def handler(request):
+            headers.append(request.headers.get('traceparent'))
+            return await TestAsyncPipeline._service_handler(request)
+
+        orchestrator.frame_transport = 'binary'
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+
+        result = asyncio.run(orchestrator.process_frame_async(test_jpeg, "", "r", include_timings=True))
+
+        assert len(headers) == 6
+        assert all(h.split('-')[1] == result['trace_id'] for h in headers)
+        names = [t['name'] for t in result['timings']]
+        assert names[0] == 'process_frame'
+        for name in ('face-detection /detect-binary', 'head-pose /estimate-batch',
+                     'attention-scorer /score-batch'):
+            assert name in names
+        root = result['timings'][0]
+        call = next(t for t in result['timings'] if t['name'] == 'head-pose /estimate-batch')
+        assert call['parent_id'] == root['span_id']
+        assert 0 <= call['start_ms'] <= root['duration_ms']
+
+    def test_timings_only_when_requested(self, orchestrator, test_jpeg):
+        orchestrator.frame_transport = 'binary'
+        TestAsyncPipeline._mock_services(orchestrator, TestAsyncPipeline._service_handler)
+
+        result = asyncio.run(orchestrator.process_frame_async(test_jpeg, "", "r"))
+
+        assert len(result['trace_id']) == 32
+        assert 'timings' not in result
+
+    def test_head_sampling(self):
+        """New traces are sampled at the tracer's rate; remote sampled flags are honoured."""
+        from common.tracing import InMemoryExporter, Tracer
+
+        tracer = Tracer('svc', InMemoryExporter(), sample_rate=0.0)
+        with tracer.span('unsampled') as span:
+            tracer.add_span('stage', 0.001)
+        assert span.traceparent.endswith('-00')
+        assert tracer.spans(span.trace_id) == []
+
+        with tracer.span('remote', "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01") as span:
+            pass
+        assert span.traceparent.endswith('-01')
+        assert len(tracer.spans(span.trace_id)) == 1
+
+        tracer.sample_rate = 1.0
+        with tracer.span('remote', "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-00") as span:
+            pass
+        assert not span.sampled
+
+    def test_per_face_calls_continue_incoming_trace(self, orchestrator, test_jpeg):
+        """Concurrent per-face calls stay in the caller's trace."""
+        trace_id = "4bf92f3577b34da6a3ce929d0e0e4736"
+        sent = []
+
+        async def handler(request):
+            sent.append(request.headers['traceparent'])
+            return await TestAsyncPipeline._service_handler(request)
+
+        orchestrator.frame_transport = 'binary'
+        orchestrator.downstream_batching = False
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+
+        result = asyncio.run(orchestrator.process_frame_async(
+            test_jpeg, "", "r", traceparent=f"00-{trace_id}-00f067aa0ba902b7-01"
+        ))
+
+        assert result['success'] == True
+        assert result['trace_id'] == trace_id
+        # Face and landmark detection, then four calls for each of the two faces
+        assert len(sent) == 10
+        assert all(h.split('-')[1] == trace_id for h in sent)
+
+
+class TestDeadlines:
+    """Tests for per-frame deadlines and budget-aware retries."""
+
+    @staticmethod
+    def _head_pose(orchestrator, handler, budget=None):
+        """One head pose call, within a frame budget if given."""
+        from common import deadline
+        from main import DEFAULT_HEAD_POSE
+
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+
+        async def call():
+            with deadline.scope(budget):
+                return await orchestrator._call_async('head-pose', '/estimate', {'landmarks': []}, DEFAULT_HEAD_POSE)
+
+        return asyncio.run(call())
+
+    def test_call_timeout_capped_by_frame_budget(self, orchestrator):
+        """A call gets the budget left of the frame, and tells the service about it."""
+        sent = []
+
+        async def handler(request):
+            sent.append((request.extensions['timeout']['read'], request.headers['X-Deadline-Ms']))
+            return httpx.Response(200, json={'yaw': 1.0})
+
+        self._head_pose(orchestrator, handler, budget=0.5)
+
+        timeout, header = sent[0]
+        assert 0 < timeout <= 0.5
+        assert 0 < int(header) <= 500
+
+    def test_no_deadline_means_no_timeout(self):
+        from common import deadline
+
+        assert deadline.time_left() is None
+        assert deadline.header(deadline.time_left()) == {}
+
+    def test_connection_error_retried_within_budget(self, orchestrator):
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            if len(calls) == 1:
+                raise httpx.ConnectError("refused", request=request)
+            return httpx.Response(200, json={'yaw': 2.0})
+
+        orchestrator.retry_backoff = 0.01
+        result = self._head_pose(orchestrator, handler)
+
+        assert result == {'yaw': 2.0}
+        assert len(calls) == 2
+
+    def test_no_retry_when_budget_too_small(self, orchestrator):
+        """A retry that could not finish within the frame's budget is not attempted."""
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            raise httpx.ConnectError("refused", request=request)
+
+        orchestrator.retry_min_budget = 0.25
+        result = self._head_pose(orchestrator, handler, budget=0.2)
+
+        assert result['yaw'] == 0
+        assert len(calls) == 1
+
+    def test_expired_frame_makes_no_calls(self, orchestrator, test_jpeg):
+        from common import deadline
+
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            return await TestAsyncPipeline._service_handler(request)
+
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+
+        async def run():
+            with deadline.scope(-1):
+                return await orchestrator.process_frame_async(test_jpeg, "", "r")
+
+        result = asyncio.run(run())
+
+        assert result['participants'] == []
+        assert calls == []
+
+    def test_process_refuses_expired_request(self, orchestrator, test_jpeg, monkeypatch):
+        """/process answers 504 without work when the client's budget is already spent."""
+        import main
+        from fastapi.testclient import TestClient
+
+        monkeypatch.setattr(main, 'orchestrator_instance', orchestrator)
+        client = TestClient(main.app)
+        b64 = base64.b64encode(test_jpeg).decode('utf-8')
+
+        response = client.post("/process", json={'frame_data': b64}, headers={'X-Deadline-Ms': '0'})
+
+        assert response.status_code == 504
+
+    def test_async_budget_sent_downstream(self, orchestrator, test_jpeg):
+        budgets = []
+
+        async def handler(request):
+            budgets.append(int(request.headers['X-Deadline-Ms']))
+            return await TestAsyncPipeline._service_handler(request)
+
+        orchestrator.frame_transport = 'binary'
+        orchestrator.frame_timeout = 1.0
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+
+        result = asyncio.run(orchestrator.process_frame_async(test_jpeg, "", "r"))
+
+        assert result['success'] == True
+        assert len(budgets) == 6
+        assert all(0 < b <= 1000 for b in budgets)
+        # Later calls get what earlier ones left
+        assert budgets == sorted(budgets, reverse=True)
+
+
+class TestCircuitBreaker:
+    """Tests for per-service circuit breakers and the in-process fallback."""
+
+    @staticmethod
+    def _breaker(now, **kwargs):
+        from common.circuit_breaker import CircuitBreaker
+        return CircuitBreaker('svc', clock=lambda: now[0], **{'window': 4, 'min_calls': 4, **kwargs})
+
+    def test_opens_on_failures_and_closes_after_probe(self):
+        from common.circuit_breaker import CLOSED, HALF_OPEN, OPEN
+
+        now = [0.0]
+        breaker = self._breaker(now, open_seconds=5.0)
+        for failed in (True, False, True, True):
+            assert breaker.allow()
+            breaker.record(failed, 0.01)
+
+        assert breaker.state == OPEN
+        assert not breaker.allow()
+        assert breaker.rejected_total == 1
+
+        now[0] = 5.0
+        assert breaker.state == HALF_OPEN
+        assert breaker.allow()
+        assert not breaker.allow()  # one probe at a time
+        breaker.record(False, 0.01)
+        assert breaker.state == CLOSED
+
+    def test_slow_calls_open_and_failed_probe_reopens(self):
+        from common.circuit_breaker import OPEN
+
+        now = [0.0]
+        breaker = self._breaker(now, slow_call_seconds=0.5, open_seconds=1.0)
+        for _ in range(4):
+            breaker.allow()
+            breaker.record(False, 2.0)
+        assert breaker.state == OPEN
+
+        now[0] = 1.0
+        assert breaker.allow()
+        breaker.record(False, 2.0)
+        assert breaker.state == OPEN
+        assert breaker.opened_total == 2
+
+    def test_released_probe_can_be_retried(self):
+        now = [0.0]
+        breaker = self._breaker(now, open_seconds=1.0)
+        for _ in range(4):
+            breaker.allow()
+            breaker.record(True, 0.01)
+
+        now[0] = 1.0
+        assert breaker.allow()
+        breaker.release()
+        assert breaker.allow()
+
+    def test_budget_capped_timeout_is_neutral(self, orchestrator):
+        """A timeout only counts against the service when it had its full timeout."""
+        from common import deadline
+        from common.circuit_breaker import CLOSED, OPEN, CircuitBreaker
+
+        async def handler(request):
+            raise httpx.ReadTimeout("timed out", request=request)
+
+        breaker = orchestrator.breakers['head-pose'] = CircuitBreaker('head-pose', min_calls=1)
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+        timeout = orchestrator.registry.get('head-pose').timeout
+
+        async def call(budget):
+            with deadline.scope(budget), pytest.raises(httpx.ReadTimeout):
+                await orchestrator._post_async('head-pose', '/estimate', json={})
+
+        asyncio.run(call(timeout / 2))
+        assert breaker.state == CLOSED
+
+        asyncio.run(call(None))
+        assert breaker.state == OPEN
+
+    def test_cancelled_call_is_neutral(self, orchestrator):
+        """A call cancelled because the frame gave up elsewhere is not a service failure."""
+        from common.circuit_breaker import CLOSED, CircuitBreaker
+
+        async def handler(request):
+            await asyncio.sleep(10)
+
+        breaker = orchestrator.breakers['head-pose'] = CircuitBreaker('head-pose', min_calls=1)
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+
+        async def run():
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(orchestrator._post_async('head-pose', '/estimate', json={}), 0.05)
+
+        asyncio.run(run())
+        assert breaker.state == CLOSED
+
+    def test_open_circuit_answered_in_process(self, orchestrator):
+        """With the circuit open, the call is skipped and head pose comes from the local estimator."""
+        import main
+
+        breaker = orchestrator.breakers['head-pose']
+        for _ in range(breaker.min_calls):
+            breaker.allow()
+            breaker.record(True, 0.01)
+        landmarks = [{'index': i, 'x': 320 + 80 * np.cos(i), 'y': 240 + 100 * np.sin(i), 'z': 0.0}
+                     for i in range(478)]
+
+        calls = []
+
+        async def handler(request):
+            calls.append(request)
+            return httpx.Response(200, json={})
+
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+
+        result = asyncio.run(orchestrator._call_async(
+            'head-pose', '/estimate', {'landmarks': landmarks, 'request_id': "r"}, main.DEFAULT_HEAD_POSE
+        ))
+
+        assert calls == []
+        assert result['success'] == True
+        assert {'yaw', 'pitch', 'roll'} <= set(result)
+        assert main.metrics.count('circuit_fallbacks', service='head-pose') >= 1
+
+    def test_sick_service_skipped_without_waiting(self, orchestrator, test_jpeg, monkeypatch):
+        """Once a slow service trips its breaker, frames stop waiting for it."""
+        import main
+        from common.circuit_breaker import CircuitBreaker
+
+        calls = []
+
+        async def handler(request):
+            if request.url.port == 8054:
+                calls.append(request.url.path)
+                await asyncio.sleep(0.3)
+            return await TestAsyncPipeline._service_handler(request)
+
+        orchestrator.frame_transport = 'binary'
+        orchestrator.breakers['head-pose'] = CircuitBreaker('head-pose', min_calls=2, slow_call_seconds=0.1,
+                                                            open_seconds=60)
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+
+        for _ in range(2):
+            asyncio.run(orchestrator.process_frame_async(test_jpeg, "", "r"))
+        start = time.perf_counter()
+        result = asyncio.run(orchestrator.process_frame_async(test_jpeg, "", "r"))
+
+        assert time.perf_counter() - start < 0.25
+        assert len(calls) == 2
+        assert [p['attention_score'] for p in result['participants']] == [60.0, 61.0]
+        assert result['participants'][0]['head_pose']['yaw'] == 0
+
+        monkeypatch.setattr(main, 'orchestrator_instance', orchestrator)
+        assert 'pipeline_circuit_state{service="head-pose"} 2' in main.metrics_endpoint()
+
+
+class TestLandmarksFirst:
+    """Tests for the landmarks-first pipeline mode."""
+
+    @staticmethod
+    def _run(orchestrator, test_jpeg, landmark_faces, detected_faces, frames=1, meeting_id="m"):
+        calls = []
+
+        async def handler(request):
+            body = json.loads(request.content)
+            if request.url.port == 8052:
+                calls.append(('faces', None))
+                return httpx.Response(200, json={'faces': detected_faces})
+            if request.url.port == 8053:
+                calls.append(('landmarks', body['faces']))
+                found = landmark_faces(body['faces'])
+                return httpx.Response(200, json={'faces': [
+                    {'landmarks': [{'index': 0, 'x': 10.0 * i, 'y': 20.0, 'z': 0.0},
+                                   {'index': 1, 'x': 10.0 * i + 10, 'y': 40.0, 'z': 0.0}]}
+                    for i in range(found)
+                ]})
+            if request.url.path == '/score-batch':
+                return httpx.Response(200, json={'responses': [
+                    {'attention_score': 50.0, 'alerts': []} for _ in body['requests']
+                ]})
+            return httpx.Response(200, json={'responses': [{'success': True}] * len(body['faces'])})
+
+        TestAsyncPipeline._mock_services(orchestrator, handler)
+
+        async def run():
+            return [await orchestrator.process_frame_async(test_jpeg, meeting_id, f"r{i}") for i in range(frames)]
+
+        return asyncio.run(run()), calls
+
+    def test_skips_face_detection(self, orchestrator, test_jpeg):
+        """Faces found by FaceMesh are analyzed without calling face detection."""
+        orchestrator.pipeline_mode = 'landmarks-first'
+        orchestrator.face_detection_interval = 0
+
+        results, calls = self._run(orchestrator, test_jpeg, lambda boxes: 2, [])
+
+        assert calls == [('landmarks', [])]
+        participants = results[0]['participants']
+        assert len(participants) == 2
+        assert participants[1]['face'] == pytest.approx(
+            {'x1': 9.0, 'y1': 18.0, 'x2': 21.0, 'y2': 42.0, 'confidence': 0.95}
+        )
+
+    def test_fallback_when_facemesh_finds_nothing(self, orchestrator, test_jpeg):
+        """Face detection runs when FaceMesh misses, and its boxes are retried."""
+        orchestrator.pipeline_mode = 'landmarks-first'
+        orchestrator.face_detection_interval = 0
+        box = {'x1': 1.0, 'y1': 2.0, 'x2': 30.0, 'y2': 40.0, 'confidence': 0.9}
+
+        results, calls = self._run(orchestrator, test_jpeg, lambda boxes: len(boxes), [box])
+
+        assert calls == [('landmarks', []), ('faces', None), ('landmarks', [box])]
+        assert len(results[0]['participants']) == 1
+
+    def test_no_faces_anywhere(self, orchestrator, test_jpeg):
+        """An empty frame costs one landmark and one face detection call."""
+        orchestrator.pipeline_mode = 'landmarks-first'
+        orchestrator.face_detection_interval = 0
+
+        results, calls = self._run(orchestrator, test_jpeg, lambda boxes: 0, [])
+
+        assert calls == [('landmarks', []), ('faces', None)]
+        assert results[0]['participants'] == [] and results[0]['success']
+
+    def test_periodic_face_detection(self, orchestrator, test_jpeg):
+        """Face detection runs on every Nth frame of a meeting."""
+        orchestrator.pipeline_mode = 'landmarks-first'
+        orchestrator.face_detection_interval = 3
+        box = {'x1': 0.0, 'y1': 0.0, 'x2': 5.0, 'y2': 5.0}
+
+        _, calls = self._run(orchestrator, test_jpeg, lambda boxes: 1, [box], frames=7)
+
+        assert [name for name, _ in calls].count('faces') == 3
+        assert [name for name, _ in calls].count('landmarks') == 7
+
+    def test_frame_counts_thread_safe(self, orchestrator):
+        """Concurrent frames of a meeting are all counted, so exactly 1 in N gets face detection."""
+        from concurrent.futures import ThreadPoolExecutor
+        orchestrator.face_detection_interval = 10
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            due = list(pool.map(lambda _: orchestrator._face_detection_due("m"), range(1000)))
+
+        assert orchestrator._meeting_frames["m"] == 1000
+        assert sum(due) == 100
+
+
+@pytest.fixture
+def test_video(tmp_path):
+    """10 fps MJPG video of 50 frames whose pixel value encodes the frame index."""
+    path = str(tmp_path / "video.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 10, (64, 48))
+    for i in range(50):
+        writer.write(np.full((48, 64, 3), i * 5, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+class TestVideoSampling:
+    """Tests for sampled video decoding."""
+
+    @pytest.mark.parametrize("seek_min_seconds", [-1, 0])
+    def test_sampler_decodes_only_samples(self, test_video, seek_min_seconds):
+        """Grabbing and seeking both return the sampled frames and nothing else."""
+        from common.video_sampling import VideoFrameSampler
+
+        with VideoFrameSampler(test_video, 1.5, seek_min_seconds=seek_min_seconds) as sampler:
+            samples = list(sampler)
+            assert sampler.expected_samples == 4
+            assert sampler.decoded_frames == 4
+            assert (sampler.seeks > 0) == (seek_min_seconds == 0)
+
+        assert [s.frame_idx for s in samples] == [0, 15, 30, 45]
+        assert [s.timestamp_ms for s in samples] == [0, 1500, 3000, 4500]
+        for s in samples:
+            assert abs(int(s.frame[0, 0, 0]) - s.frame_idx * 5) <= 3
+
+    def test_sampler_segment(self, test_video):
+        """start/end seconds restrict sampling to a segment."""
+        from common.video_sampling import VideoFrameSampler
+
+        with VideoFrameSampler(test_video, 1.0, start_seconds=2.0, end_seconds=4.0) as sampler:
+            assert [s.frame_idx for s in sampler] == [20, 30]
+
+    def test_process_video_uses_interval(self, orchestrator, test_video, monkeypatch):
+        """process_video_async analyzes one frame per sample interval."""
+        import main
+
+        seen = []
+
+        async def process_frame_async(frame, meeting_id, request_id, state_key=None, publish=True):
+            seen.append(request_id)
+            return {'participants': [{'attention_score': 80.0, 'alerts': []}]}
+
+        updates = []
+        monkeypatch.setattr(orchestrator, 'process_frame_async', process_frame_async)
+        monkeypatch.setattr(main, 'orchestrator_instance', orchestrator)
+        monkeypatch.setattr(main.requests, 'put', lambda url, json, timeout: updates.append(json))
+
+        asyncio.run(main.process_video_async("a1", test_video, 2.0))
+
+        assert seen == ["frame_0", "frame_20", "frame_40"]
+        summary = json.loads(updates[-1]['results'])
+        assert updates[-1]['status'] == "completed"
+        assert summary['analyzed_frames'] == 3 and summary['total_frames'] == 50
+        assert [t['timestamp_ms'] for t in summary['timeline']] == [0, 2000, 4000]
+
+
+class TestParallelVideo:
+    """Tests for segmented video analysis on a worker pool."""
+
+    def test_segments_on_sampling_grid(self):
+        """Segments cover the video on the sampling grid with aligned warm-up."""
+        import main
+
+        segments = main.video_segments(25.0, 1.5, 10.0, 2.0)
+
+        assert segments == [(0.0, 0.0, 10.5), (7.5, 10.5, 21.0), (18.0, 21.0, 25.0)]
+
+    def test_parallel_matches_sequential(self, orchestrator, test_video, monkeypatch):
+        """Merged segment timelines equal a sequential pass; warm-up frames are not emitted."""
+        import main
+        from concurrent.futures import ThreadPoolExecutor
+
+        calls = []
+
+        async def process_frame_async(frame, meeting_id, request_id, state_key=None, publish=True):
+            calls.append((request_id, meeting_id, state_key, publish))
+            score = float(frame[0, 0, 0])
+            return {'participants': [{'attention_score': score, 'alerts': [{'type': 'x'}] if score > 200 else []}]}
+
+        updates = []
+        monkeypatch.setattr(orchestrator, 'process_frame_async', process_frame_async)
+        monkeypatch.setattr(main, 'orchestrator_instance', orchestrator)
+        monkeypatch.setattr(main, '_worker_orchestrator', orchestrator)
+        monkeypatch.setattr(main, '_worker_loop', None)
+        monkeypatch.setattr(main.requests, 'put', lambda url, json, timeout: updates.append(json))
+        monkeypatch.setenv('VIDEO_SEGMENT_SECONDS', '2')
+        monkeypatch.setenv('VIDEO_SEGMENT_WARMUP_SECONDS', '0.5')
+
+        asyncio.run(main.process_video_async("seq", test_video, 0.5))
+        sequential = json.loads(updates[-1]['results'])
+
+        pool = ThreadPoolExecutor(max_workers=1)
+        monkeypatch.setattr(main, 'VIDEO_WORKERS', 2)
+        monkeypatch.setattr(main, '_video_executor', lambda: pool)
+        calls.clear()
+        asyncio.run(main.process_video_async("par", test_video, 0.5))
+        pool.shutdown()
+        parallel = json.loads(updates[-1]['results'])
+
+        assert updates[-1]['status'] == "completed"
+        assert parallel == sequential
+        assert parallel['analyzed_frames'] == 10 and parallel['total_alerts'] > 0
+        # Two later segments each re-run one warm-up sample, which is not published
+        assert len(calls) == 12
+        assert {meeting_id for _, meeting_id, _, _ in calls} == {"par"}
+        published = sorted(int(r.split('_')[1]) for r, _, _, publish in calls if publish)
+        assert published == [t['timestamp_ms'] // 100 for t in sequential['timeline']]
+        # Each segment keeps its per-track state under its own key
+        assert {state_key for _, _, state_key, _ in calls} == {"par@0", "par@2", "par@4"}
+
+
+class TestInProcessAnalysis:
+    """Tests for offline video analysis with the in-process AttentionPipeline."""
+
+    @staticmethod
+    def _frame_result(score):
+        sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'ai-processor'))
+        from src.models.attention import (
+            Alert, AlertSeverity, AlertType, AttentionMetrics, AttentionResult, FrameResult
+        )
+        from datetime import datetime
+
+        metrics = AttentionMetrics(
+            gaze_score=0.9, head_pose_score=0.8, eye_openness_score=1.0, presence_score=1.0,
+            head_yaw=5.0, head_pitch=-3.0, head_roll=1.0, eye_aspect_ratio=0.3, blink_rate=12.0,
+            perclos=0.1, gaze_x=0.05, gaze_y=-0.02
+        )
+        result = AttentionResult(track_id=7, attention_score=score, metrics=metrics,
+                                 bbox_x=10, bbox_y=20, bbox_width=30, bbox_height=40)
+        alerts = [Alert(AlertType.DROWSY, AlertSeverity.CRITICAL, track_id=7)] if score < 50 else []
+        return FrameResult(frame_id=1, meeting_id="m", timestamp=datetime.now(),
+                           attention_results=[result], alerts=alerts, processing_time_ms=1.0)
+
+    def test_participants_match_services_format(self):
+        """FrameResults convert to the participant dicts of the services path."""
+        from main import InProcessAnalyzer
+
+        participant = InProcessAnalyzer.participants(self._frame_result(40.0))[0]
+
+        assert set(participant) == {'track_id', 'face', 'head_pose', 'gaze', 'blink', 'attention_score', 'alerts'}
+        assert participant['track_id'] == "7"
+        assert participant['face'] == {'x1': 10, 'y1': 20, 'x2': 40, 'y2': 60}
+        assert participant['head_pose']['yaw'] == 5.0
+        assert participant['blink']['perclos'] == 0.1
+        assert participant['alerts'][0]['type'] == 'DROWSINESS'
+        assert participant['alerts'][0]['severity'] == 'critical'
+
+    def test_video_analysis_in_process(self, orchestrator, test_video, monkeypatch):
+        """Decoded frames go straight to the pipeline and the summary format is unchanged."""
+        import main
+
+        frames = []
+        test = self
+
+        class FakePipeline:
+            def process_frame(self, frame, meeting_id):
+                frames.append(frame)
+                return test._frame_result(float(frame[0, 0, 0]) / 2)
+
+            def reset(self):
+                pass
+
+            def release(self):
+                frames.append(None)
+
+        updates = []
+        monkeypatch.setattr(main, 'VIDEO_ANALYSIS_MODE', 'in-process')
+        monkeypatch.setattr(main, '_load_attention_pipeline', lambda: FakePipeline)
+        monkeypatch.setattr(main, 'orchestrator_instance', orchestrator)
+        monkeypatch.setattr(main.requests, 'put', lambda url, json, timeout: updates.append(json))
+        monkeypatch.setattr(orchestrator, 'process_frame_async', MagicMock(
+            side_effect=AssertionError("services must not be called")))
+
+        asyncio.run(main.process_video_async("v", test_video, 1.0))
+
+        summary = json.loads(updates[-1]['results'])
+        assert updates[-1]['status'] == "completed"
+        assert all(isinstance(f, np.ndarray) for f in frames[:-1]) and frames[-1] is None
+        assert summary['analyzed_frames'] == 5
+        assert summary['timeline'][0]['faces'][0]['track_id'] == "7"
+        assert summary['total_alerts'] == 2
+
+
+class TestGrpcDataPlane:
+    """Tests for the gRPC client mode against in-process gRPC services."""
+
+    @pytest.fixture
+    def stubs(self):
+        from common.grpc_support import load_stubs
+        try:
+            return {name: load_stubs(proto) for name, (proto, _) in GRPC_STUBS.items()}
+        except ImportError as e:
+            pytest.skip(f"gRPC stubs unavailable: {e}")
+
+    @staticmethod
+    def _add_fake_services(server, stubs):
+        fd_pb2, fd_grpc = stubs['face-detection']
+        lm_pb2, lm_grpc = stubs['landmark-detection']
+        hp_pb2, hp_grpc = stubs['head-pose']
+        gz_pb2, gz_grpc = stubs['gaze-tracking']
+        bl_pb2, bl_grpc = stubs['blink-detection']
+
+        class FaceDetection(fd_grpc.FaceDetectionServiceServicer):
+            async def DetectFaces(self, request, context):
+                assert request.frame_data[:2] == b'\xff\xd8'
+                return fd_pb2.DetectResponse(success=True, faces=[
+                    fd_pb2.BoundingBox(x1=i, y1=0, x2=10, y2=10, confidence=0.9) for i in range(2)
+                ])
+
+        class LandmarkDetection(lm_grpc.LandmarkDetectionServiceServicer):
+            async def DetectLandmarks(self, request, context):
+                return lm_pb2.LandmarkResponse(success=True, faces=[
+                    lm_pb2.FaceLandmarks(face_index=i, landmarks=[
+                        lm_pb2.Landmark(index=j, x=float(i), y=1.0, z=0.0) for j in range(478)
+                    ])
+                    for i in range(len(request.faces))
+                ])
+
+        class HeadPose(hp_grpc.HeadPoseServiceServicer):
+            async def BatchEstimate(self, request, context):
+                return hp_pb2.BatchPoseResponse(responses=[
+                    hp_pb2.PoseResponse(success=True, pose=hp_pb2.HeadPose(yaw=r.landmarks[0].x))
+                    for r in request.requests
+                ])
+
+        class GazeTracking(gz_grpc.GazeTrackingServiceServicer):
+            async def BatchEstimate(self, request, context):
+                return gz_pb2.BatchGazeResponse(responses=[
+                    gz_pb2.GazeResponse(success=True, gaze=gz_pb2.GazeInfo(gaze_x=0.1, is_looking_at_camera=True))
+                    for _ in request.requests
+                ])
+
+        class BlinkDetection(bl_grpc.BlinkDetectionServiceServicer):
+            async def AnalyzeBlink(self, request, context):
+                return bl_pb2.BlinkResponse(success=True, blink=bl_pb2.BlinkInfo(
+                    avg_ear=0.3, blink_count=int(request.track_id)
+                ))
+
+        fd_grpc.add_FaceDetectionServiceServicer_to_server(FaceDetection(), server)
+        lm_grpc.add_LandmarkDetectionServiceServicer_to_server(LandmarkDetection(), server)
+        hp_grpc.add_HeadPoseServiceServicer_to_server(HeadPose(), server)
+        gz_grpc.add_GazeTrackingServiceServicer_to_server(GazeTracking(), server)
+        bl_grpc.add_BlinkDetectionServiceServicer_to_server(BlinkDetection(), server)
+
+    def test_process_frame_over_grpc(self, orchestrator, stubs, test_jpeg):
+        """Test that detection and per-face analysis go over gRPC, scoring over REST."""
+        async def score(request):
+            body = json.loads(request.content)
+            return httpx.Response(200, json={'responses': [
+                {'attention_score': 80.0, 'alerts': []} for _ in body['requests']
+            ]})
+
+        async def run():
+            server = grpc.aio.server()
+            self._add_fake_services(server, stubs)
+            port = server.add_insecure_port('127.0.0.1:0')
+            await server.start()
+            try:
+                for config in orchestrator.registry.all().values():
+                    config.grpc_target = f"127.0.0.1:{port}"
+                orchestrator.service_protocol = 'grpc'
+                orchestrator._grpc_modules = stubs
+                orchestrator.async_clients['attention-scorer'] = httpx.AsyncClient(
+                    base_url="http://scorer", transport=httpx.MockTransport(score)
+                )
+                result = await orchestrator.process_frame_async(test_jpeg, "", "r")
+                await orchestrator.aclose()
+                return result
+            finally:
+                await server.stop(None)
+
+        result = asyncio.run(run())
+
+        assert result['success'] == True
+        participants = result['participants']
+        assert [p['head_pose']['yaw'] for p in participants] == [0.0, 1.0]
+        assert [p['blink']['blink_count'] for p in participants] == [0, 1]
+        assert [p['face']['x1'] for p in participants] == [0.0, 1.0]
+        assert all(p['attention_score'] == 80.0 for p in participants)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
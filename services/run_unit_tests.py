@@ -13,6 +13,7 @@ SERVICES = [
     "gaze-tracking",
     "blink-detection",
     "attention-scorer",
+    "pipeline-orchestrator",
 ]
 
 def run_tests():
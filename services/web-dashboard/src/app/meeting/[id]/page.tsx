@@ -90,6 +90,9 @@ export default function MeetingPage({ params }: { params: { id: string } }) {
   // Track alert cooldowns to avoid spamming
   const alertCooldowns = useRef<Record<string, number>>({});
 
+  // Latest result per track, rebuilt from keyframe/delta attention updates
+  const facesRef = useRef<Record<string, any>>({});
+
   // Calculate average attention
   useEffect(() => {
     if (participants.length === 0) {
@@ -109,8 +112,19 @@ export default function MeetingPage({ params }: { params: { id: string } }) {
     const unsubAttention = websocket.on('attention', (rawData) => {
       console.log('Received attention data:', rawData);
 
-      // Handle both {faces: [...]} and direct array format
-      const data = rawData?.faces || (Array.isArray(rawData) ? rawData : []);
+      // Handle both {faces: [...]} and direct array format. Keyframe/delta
+      // updates only carry changed participants: merge them into the last
+      // known faces so the rest of the handler sees every participant
+      let data: any[];
+      if (rawData?.type === 'keyframe' || rawData?.type === 'delta') {
+        const faces: Record<string, any> = rawData.type === 'keyframe' ? {} : { ...facesRef.current };
+        (rawData.removed || []).forEach((trackId: string) => delete faces[trackId]);
+        (rawData.faces || []).forEach((face: any) => { faces[face.track_id] = face; });
+        facesRef.current = faces;
+        data = Object.values(faces);
+      } else {
+        data = rawData?.faces || (Array.isArray(rawData) ? rawData : []);
+      }
 
       // Data is an array of participant results from pipeline
       if (Array.isArray(data) && data.length > 0) {